@@ -1,6 +1,5 @@
 # todo:
 #   Test: remap
-#   Add: clamp version of lerp - return v won't go beyound a or b
 #   Add: wrapper for sin, cosine, time.time, and atan
 #
 #
@@ -64,4 +63,19 @@ def invlerp(a, b, v: float) -> float:
 # Returns a value between iMin and iMax based on value, but the output (value) will be limited/capped
 # to the values given by oMin and oMax.
 def remap(iMin, iMax, oMin, oMax, value: float) -> float:
-    return lerp(oMin, oMax, invlerp(iMin, iMax, value))
\ No newline at end of file
+    return lerp(oMin, oMax, invlerp(iMin, iMax, value))
+
+
+# Returns value limited to between low and high
+def clamp(low, high, value: float) -> float:
+    return max(low, min(high, value))
+
+
+# Same as lerp, but for angles in degrees. It goes the shortest way round, so lerping
+# from 350 to 10 passes through 0 instead of 180.
+# Examples:
+#   lerp_angle(350, 10, 0.5) = 360
+#   lerp_angle(10, 350, 0.5) = 0
+def lerp_angle(a, b, t: float) -> float:
+    difference = ((b - a + 180) % 360) - 180
+    return a + difference * t
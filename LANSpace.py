@@ -2,52 +2,73 @@
 from pygame.locals import *
 import pygame
 
-# Networking Imports
-import network
-
 # Entity struct imports
-import entity
+import sprites, assets, telemetry, renderer, simulation, world
+import text as text_cache # Every message function has a local called text.
 
 # Other imports
-import random, math, sys, time, GMath
-
-display_size = display_width, display_height = 1080, 700
-
-
-# Setting up player object
-
-
-player = entity.Player(0, entity.Type.Actor, 0, random.randrange(0, display_width), random.randrange(0, display_height), random.randint(1, 4))
-player_alive = True
-player.find_id() # find_id must be called to give the player an available ID
-print(player.id)
-player.rotation = 90
-velocity = 10
-
-firerate = 0.05
-last_fired = time.time()
-projs_speed = 15 # If projectile speed is too low, the player will kill themself.
-proj_cur_count = 0
-proj_max_count = 5
-reload_time = 0.5
-last_reload = time.time()
+import sys, os, time, argparse
+
+parser = argparse.ArgumentParser(description='No-Host, local area network spaceship fighter game.')
+parser.add_argument('--receiver-thread', action='store_true', help='read the network on a background thread instead of polling it every frame')
+parser.add_argument('--compact', action='store_true', help='send quantized keyframes and deltas instead of the full player state every frame, every player must use it')
+parser.add_argument('--send-rate', type=int, help='times per second the player position is sent, every player must use the same rate (default: every tick)')
+parser.add_argument('--interpolate', action='store_true', help='draw enemy players smoothly a short delay behind, needed for send rates below 60')
+parser.add_argument('--interest', action='store_true', help='read and send far away players less often, every player must use it')
+parser.add_argument('--interest-radius', type=int, default=300, help='pixels within which players are read at the first --interest-rates, then at the second to twice that, then the third (default: 300)')
+parser.add_argument('--interest-rates', type=int, nargs=3, default=[1, 2, 4], metavar='N', help='every how many sends near, middle and far players are read and sent, each must divide the next (default: 1 2 4)')
+parser.add_argument('--fps', type=int, default=60, help='frames drawn per second, the simulation runs at the tick rate whatever it is (default: 60)')
+parser.add_argument('--tick-rate', type=int, default=60, help='simulation ticks per second, every player should use the same rate (default: 60)')
+parser.add_argument('--transport', choices=('multicast', 'broadcast'), default='multicast', help='how packets reach the other players, every player must use the same one (default: multicast)')
+parser.add_argument('--match', type=int, default=0, help='the match to join, 0 to 255, matches on the same network don\'t see each other (default: 0)')
+parser.add_argument('--port', type=int, default=8080, help='UDP port the match uses, broadcast uses this port plus the match so keep ports 256 apart (default: 8080)')
+parser.add_argument('--interface', default='0.0.0.0', help='IP address of the network interface to play on, 127.0.0.1 for this machine only (default: chosen by the OS)')
+parser.add_argument('--relay', metavar='HOST', help='play through a relay server (relay.py) instead of peer to peer, every player must use it')
+parser.add_argument('--ttl', type=int, default=1, help='routers multicast packets may cross, 1 keeps them on the LAN (default: 1)')
+parser.add_argument('--headless', action='store_true', help='run without a window, for load tests and CI')
+parser.add_argument('--duration', type=float, help='quit after this many seconds')
+parser.add_argument('--full-redraw', action='store_true', help='redraw and update the whole window every frame, instead of only what changed')
+parser.add_argument('--telemetry', action='store_true', help='show the frame timing overlay from the start, F3 toggles it')
+parser.add_argument('--record', metavar='PATH', help='record every packet received to a capture file, replay it with capture.py')
+parser.add_argument('--multiprocess', action='store_true', help='run the network and simulation in a worker process, this process only draws')
+parser.add_argument('--trace', metavar='PATH', help='write frame timings to a Chrome trace file, rolled over every minute')
+args = parser.parse_args()
+rates = args.interest_rates
+if rates[0] < 1 or rates[1] % rates[0] or rates[2] % rates[1]:
+    parser.error('each of --interest-rates must divide the next, got {}'.format(' '.join(map(str, rates))))
+
+# SDL's dummy video driver draws to memory instead of a window, it must be chosen before pygame.init().
+if args.headless:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+display_size = display_width, display_height = world.WIDTH, world.HEIGHT
+
+# The match: the network, the game state and the main player's simulation, see world.py. It's set up
+# before the window, since the transport must be ready before find_id.
+match = None
+if args.multiprocess:
+    match = world.start(args) # None if the worker can't start, the game runs in this process instead.
+if match is None:
+    match = world.World(args)
+print(match.id)
 
 
 # Creating game window
 pygame.init()
 pygame.display.set_caption('LANSpace')
-pygame.display.set_icon(pygame.image.load('assets/spaceship/2.png'))
+pygame.display.set_icon(assets.image('assets/spaceship/2.png'))
 
 display_surface = pygame.display.set_mode(display_size)
+window = renderer.Renderer(display_surface, dirty=not args.full_redraw) # Everything is drawn through the renderer.
+sprites.prebuild() # Renders every rotation of the sprites now, rather than mid game.
 fpsclock = pygame.time.Clock()
-FPS = 60
+FPS = args.fps
 
 
 # Custom cursor
 pygame.mouse.set_visible(False)
-cursor = pygame.image.load('assets/cursor.png')
 cursor_size = 29 # 42 is the original image size. I use size 29 because it's a better size and doesn't have weird scaling noise.
-cursor = pygame.transform.scale(cursor, (cursor_size, cursor_size))
+cursor = assets.image('assets/cursor.png', (cursor_size, cursor_size))
 
 
 def render_offset(position: tuple, size: tuple) -> tuple:
@@ -57,146 +78,109 @@ def render_offset(position: tuple, size: tuple) -> tuple:
     return (position[x]-(size[x]/2), position[y]-(size[y]/2))
 
 
-def collision(obj1, obj2: object) -> bool:
-    obj1_x, obj1_y = render_offset((obj1.x, obj1.y), (obj1.size, obj1.size))
-    obj2_x, obj2_y = render_offset((obj2.x, obj2.y), (obj2.size, obj2.size))
-    if (obj2_x > obj1_x and obj2_x < (obj1_x+obj1.size)) and (obj2_y > obj1_y and obj2_y < (obj1_y+obj1.size)):
-        return True
-    else:
-        return False
-
-
 def died_message():
     RED = 255, 0, 0,
     text = "You're DEAD!"
-    font = pygame.font.Font('assets/freesansbold.ttf', 115)
-    textSurface = font.render(text, True, RED)
+    textSurface = text_cache.render(text, 115, RED)
     TextRect = textSurface.get_rect()
     TextRect.center = ((display_width/2),(display_height/2))
-    display_surface.blit(textSurface, TextRect)
+    window.blit(textSurface, TextRect)
 
 def respawn_message():
     WHITE = 255, 255, 255,
     text = "Press R to respawn..."
-    font = pygame.font.Font('assets/freesansbold.ttf', 30)
-    textSurface = font.render(text, True, WHITE)
+    textSurface = text_cache.render(text, 30, WHITE)
     TextRect = textSurface.get_rect()
     TextRect.center = ((display_width/2), (display_height/2)+80)
-    display_surface.blit(textSurface, TextRect)
-
-    
-# Main game loop. network_manager never stops.
-for entities in entity.network_reader(player.id):
-
-    display_surface.fill((0, 0, 0)) # Fills the window black
+    window.blit(textSurface, TextRect)
 
-    # Event handler
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT: sys.exit()
-    
-    # Respawn player
-    keys = keys = pygame.key.get_pressed()
-    if keys[pygame.K_r]: player_alive = True
 
+# Telemetry, see telemetry.py. Spans and counters are only recorded while the overlay is shown or tracing.
+show_overlay = args.telemetry
+if args.trace:
+    telemetry.start_trace(args.trace)
+elif args.telemetry:
+    telemetry.enable()
 
-    # Player logic below! ----------------------------------------------------------------------------------------------------------------
-    if player_alive:
-        # The direction the player is to move in.
-        dir_x, dir_y = 0, 0
-
-        # Player controls
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_w]:
-            dir_y -= 1
-        if keys[pygame.K_s]:
-            dir_y += 1
-        if keys[pygame.K_a]:
-            dir_x -= 1
-        if keys[pygame.K_d]:
-            dir_x += 1
-
-        if dir_x != 0 or dir_y != 0:
-            dir_x, dir_y = GMath.normalize(dir_x, dir_y)
-            player.x += dir_x * velocity
-            player.y += dir_y * velocity
-
-        # Checks player position is not illegal, if it is then the player is moved back inside the window.
-        border_offset = (player.size/2)
-        if player.x < 0+border_offset:
-            player.x = 0+border_offset
-        if player.x > display_width-border_offset:
-            player.x = display_width-border_offset
-        if player.y < 0+border_offset:
-            player.y = 0+border_offset
-        if player.y > display_height-border_offset:
-            player.y = display_height-border_offset
-
-        # Player rotation based on mouse position
-        mx, my = pygame.mouse.get_pos()
-        rel_x = mx - player.x
-        rel_y = my - player.y
-        
-        # 180 is the offset angle to make the rotation between 0-360, otherwise it would be between -180 - 180
-        angle = math.degrees(-math.atan2(rel_y, rel_x))+180
-        # Offset to make player face cursor 270, can't use -90 because it could make a negative number.
-        player.rotation = int(angle)+270
+def quit_game():
+    telemetry.stop_trace()
+    for stats in match.stats():
+        print(stats)
+    sys.exit() # The main loop's finally closes the match.
 
+start_time = time.time()
+last_frame = time.perf_counter()
 
-    # End of player logic! --------------------------------------------------------------------------------------------------------------
+# Main game loop. However it ends, the match is closed, so a worker process never outlives the window.
+try:
+    while True:
 
-    # Render Logic Logic ----------------------------------------------------------------------------------------------------------------
-    
-    # Render enemy players & projectiels
-    for enemy in entities:
-        if enemy.type == entity.Type.Actor:
-            display_surface.blit(enemy.get_spaceship(), render_offset((enemy.x, enemy.y), (enemy.size, enemy.size)))
+        window.begin() # Clears last frame's sprites back to black
 
-        if enemy.type == entity.Type.Projectile:
-            dir_x = math.cos(math.radians(-enemy.rotation+90))
-            dir_y = math.sin(math.radians(-enemy.rotation+90))
-            enemy.x -= (dir_x * projs_speed)
-            enemy.y -= (dir_y * projs_speed)
-            display_surface.blit(enemy.get_projectile(), render_offset((enemy.x, enemy.y), (enemy.size, enemy.size)))
+        # Event handler
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT: quit_game()
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED): window.invalidate() # The window was covered up.
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                show_overlay = not show_overlay
+                if not args.trace: telemetry.enable(show_overlay) # A trace keeps recording with the overlay hidden.
+        if args.duration and (time.time()-start_time) > args.duration: quit_game()
 
-            # Findout if player has been hit
-            if collision(player, enemy):
-                player_alive = False
-
-    if player_alive:
-        # Broadcast player position.
-        network.BROADCAST(player.to_bytes())
-        # Using a delayed broadcast only inceases the player limit by about 3-5, it's not worth it.
-
-        # Render Player at postion x, y
-        display_surface.blit(player.get_spaceship(), render_offset((player.x, player.y), (player.size, player.size)))
-    else:
-        died_message()
-        respawn_message()
-
-    # Projectile Logic ------------------------------------------------------------------------------------------------------------------
-
-    if pygame.mouse.get_pressed()[0] and (time.time()-last_reload) > reload_time and (time.time()-last_fired) > firerate and player_alive:
-        last_fired = time.time()
-        proj_cur_count += 1
-
-        # Creates projectile
-        front_of_ship_x = player.x + (math.cos(math.radians(-player.rotation+90)) * 40)
-        front_of_ship_y = player.y + (math.sin(math.radians(-player.rotation+90)) * 40)
-        proj = entity.Projectile(player.rotation, front_of_ship_x, front_of_ship_y)
-        network.BROADCAST(proj.to_bytes())
-
-        if proj_cur_count == proj_max_count:
-            last_reload = time.time()
-            proj_cur_count = 0
-
-    # Projectile Logic ------------------------------------------------------------------------------------------------------------------
-
-
-    # Render custom mouse
-    mx, my = pygame.mouse.get_pos()
-    display_surface.blit(cursor, render_offset((mx, my), (cursor_size, cursor_size)))
-
-
-    # Updates the display
-    pygame.display.update()
-    fpsclock.tick(FPS)
\ No newline at end of file
+        # Player controls, read once a frame for every tick in it.
+        keys = pygame.key.get_pressed()
+        dir_x = keys[pygame.K_d] - keys[pygame.K_a] # The direction the player is to move in.
+        dir_y = keys[pygame.K_s] - keys[pygame.K_w]
+        mx, my = pygame.mouse.get_pos()
+        controls = simulation.Controls(dir_x, dir_y, mx, my, pygame.mouse.get_pressed()[0], keys[pygame.K_r])
+
+        # Reads the network and runs the simulation, once per tick, none or several times a frame. With
+        # --multiprocess the worker does that, and this gets its latest snapshot.
+        now = time.perf_counter()
+        elapsed, last_frame = now - last_frame, now
+        match.update(controls, elapsed)
+
+        # Render Logic Logic ----------------------------------------------------------------------------------------------------------------
+        # Things the simulation moves are drawn between the last two ticks, see world.py
+
+        # Render enemy players
+        with telemetry.span('render enemies'):
+            for x, y, rotation, shiptype in match.enemies():
+                window.blit(sprites.spaceship(shiptype, rotation), render_offset((x, y), (sprites.SPACESHIP_SIZE, sprites.SPACESHIP_SIZE)))
+
+        # Renders every projectile
+        with telemetry.span('render projectiles'):
+            for x, y, rotation in match.projectiles():
+                window.blit(sprites.projectile(rotation), render_offset((x, y), (sprites.PROJECTILE_SIZE, sprites.PROJECTILE_SIZE)))
+        telemetry.count('entities rendered', match.entity_count)
+
+        if match.alive:
+            # Render Player at postion x, y
+            x, y, rotation, shiptype = match.player()
+            window.blit(sprites.spaceship(shiptype, rotation), render_offset((x, y), (sprites.SPACESHIP_SIZE, sprites.SPACESHIP_SIZE)))
+        else:
+            died_message()
+            respawn_message()
+
+
+        # Render custom mouse
+        window.blit(cursor, render_offset((mx, my), (cursor_size, cursor_size)))
+
+
+        # Telemetry overlay, toggled with F3
+        if show_overlay:
+            telemetry.draw_overlay(window)
+
+        # Updates the display
+        with telemetry.span('display update'):
+            window.present()
+        telemetry.count('pixels pushed', window.pixels_pushed)
+        with telemetry.span('idle'):
+            fpsclock.tick(FPS)
+        telemetry.end_frame()
+
+        # The worker process quit or crashed.
+        if isinstance(match, world.RemoteWorld) and not match.running():
+            print('The worker process stopped.')
+            quit_game()
+finally:
+    match.close()
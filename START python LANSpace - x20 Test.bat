@@ -1,40 +0,0 @@
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
\ No newline at end of file
@@ -1,6 +0,0 @@
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
-START python LANSpace.py
-TIMEOUT 3
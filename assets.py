@@ -0,0 +1,55 @@
+# assets.py is a module used by sprites.py and LANSpace.py
+# Its purpose is to load every image exactly once per process and hand out the same shared surface
+# to everything that asks for it, so nothing on the game loop or packet path touches the disk.
+#
+# Surfaces are shared, so they must never be drawn on. Copy a surface first if it needs changing.
+#
+#
+#
+# Public Interface:
+#   image(path, size) -> Surface    Returns the shared image, scaled to size if size is given.
+#   stats() -> dict                 Returns the cache hits, misses (disk loads) and cached image count.
+#   clear()                         Empties the cache, so the next request for each image loads it again.
+
+import pygame
+
+
+_images = {} # (path, size): Surface
+_converted = set() # Keys of surfaces already converted to the display's pixel format.
+_hits = 0
+_misses = 0
+
+
+def image(path: str, size: tuple = None):
+    global _hits, _misses
+
+    key = (path, size)
+    surface = _images.get(key)
+
+    if surface is None:
+        _misses += 1
+        surface = pygame.image.load(path)
+        if size is not None:
+            surface = pygame.transform.scale(surface, size)
+        _images[key] = surface
+    else:
+        _hits += 1
+
+    # convert_alpha needs a display, so images loaded before the window is created are converted on
+    # the first request after it is.
+    if key not in _converted and pygame.display.get_surface() is not None:
+        surface = _images[key] = surface.convert_alpha()
+        _converted.add(key)
+
+    return surface
+
+
+def stats() -> dict:
+    return {'hits': _hits, 'misses': _misses, 'images': len(_images)}
+
+
+def clear() -> None:
+    global _hits, _misses
+    _images.clear()
+    _converted.clear()
+    _hits, _misses = 0, 0
@@ -0,0 +1,700 @@
+# benchmark.py measures the hot paths of LANSpace, so a change can be compared before and after.
+# It doesn't open a window, everything is drawn to an off screen surface.
+#
+# Usage:
+#   python benchmark.py                 Runs every benchmark.
+#   python benchmark.py atlas ...       Runs only the named benchmarks.
+
+import os, sys, time, math
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+
+display_size = display_width, display_height = 1080, 700
+
+
+def rate(func, seconds: float = 1.0) -> float:
+    # rate returns how many times per second func can be called.
+    calls = 0
+    start = time.perf_counter()
+    end = start + seconds
+    while time.perf_counter() < end:
+        func()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+# Sprite atlas --------------------------------------------------------------------------------------
+
+def bench_atlas() -> None:
+    import sprites
+
+    surface = pygame.display.get_surface()
+    images = {shiptype: pygame.image.load('assets/spaceship/{}.png'.format(shiptype)) for shiptype in range(1, 5)}
+
+    def before():
+        # The draw path get_spaceship used before the sprite atlas, with the image load cached like an Actor did.
+        spaceship = pygame.transform.scale(images[before.shiptype].copy(), (42, 42))
+        rect = spaceship.get_rect().copy()
+        rotated = pygame.transform.rotate(spaceship, before.rotation)
+        rect.center = rotated.get_rect().center
+        surface.blit(rotated.subsurface(rect), (500, 300))
+        before.rotation = (before.rotation + 7) % 360
+        before.shiptype = before.shiptype % 4 + 1
+    before.rotation, before.shiptype = 0, 1
+
+    def after():
+        surface.blit(sprites.spaceship(after.shiptype, after.rotation), (500, 300))
+        after.rotation = (after.rotation + 7) % 360
+        after.shiptype = after.shiptype % 4 + 1
+    after.rotation, after.shiptype = 0, 1
+
+    start = time.perf_counter()
+    sprites.prebuild()
+    build_time = time.perf_counter() - start
+
+    before_rate = rate(before)
+    after_rate = rate(after)
+    print('atlas: prebuild {:.0f}ms, {:.1f}MB at {} degree resolution'.format(build_time * 1000, sprites.memory_used() / 1024 / 1024, sprites.resolution))
+    print('atlas: copy/scale/rotate {:,.0f} draws/s, atlas {:,.0f} draws/s ({:.1f}x)'.format(before_rate, after_rate, after_rate / before_rate))
+
+
+# Asset cache ---------------------------------------------------------------------------------------
+
+def bench_assets() -> None:
+    import assets, entity
+
+    packets = [entity.Projectile(rotation, 500, 300).to_bytes() for rotation in range(360)]
+    surface = pygame.display.get_surface()
+
+    def decode():
+        projectile = entity.Projectile(0, 0, 0)
+        projectile.from_bytes(packets[decode.index])
+        surface.blit(projectile.get_projectile(), (projectile.x, projectile.y))
+        decode.index = (decode.index + 1) % len(packets)
+    decode.index = 0
+
+    decode() # The first draw may load the image, the rest must not.
+    before = assets.stats()
+    decode_rate = rate(decode)
+    after = assets.stats()
+    print('assets: {:,.0f} projectile packets decoded and drawn per second, {} images loaded from disk'.format(decode_rate, after['misses'] - before['misses']))
+
+
+# Network reader ------------------------------------------------------------------------------------
+
+def legacy_network_reader(main_player_id: int, catch) -> list:
+    # The network_reader used before GameState, a flat list searched once per Actor packet.
+    import entity, codec
+
+    game_state = []
+    while True:
+        for _ in range(255):
+            data = catch()
+            if data:
+                if codec.packet_type(data) == entity.Type.Actor:
+                    ent = entity.Avatar(0,0,0,0,0,0)
+                else:
+                    ent = entity.Projectile(0,0,0)
+                ent.from_bytes(data)
+
+                if ent.type == entity.Type.Actor and ent.id != main_player_id:
+                    for old in game_state:
+                        if old.type == entity.Type.Actor and ent.id == old.id:
+                            old.rotation, old.x, old.y = ent.rotation, ent.x, ent.y
+                            old.last_update = time.time()
+                            break
+                    else:
+                        ent.last_update = time.time()
+                        game_state.append(ent)
+
+                if ent.type == entity.Type.Projectile:
+                    ent.rotation += 180
+                    game_state.append(ent)
+
+        for x in range(len(game_state)-1, -1, -1):
+            if game_state[x].type == entity.Type.Actor:
+                if (time.time() - game_state[x].last_update) > 0.03:
+                    game_state.pop(x)
+                    continue
+            if game_state[x].type == entity.Type.Projectile:
+                if (time.time() - game_state[x].duration) > 2.0:
+                    game_state.pop(x)
+                    continue
+
+        yield game_state
+
+
+class SyntheticNetwork:
+    # SyntheticNetwork stands in for network.CATCH. Each frame every peer sends its position,
+    # and every 10th frame each peer fires a projectile. The packets are made ahead of time so
+    # only the reader is measured. If framed, each peer's tick is sent as one codec frame.
+    def __init__(self, peers: int, frames: int = 60, framed: bool = False) -> None:
+        import entity, codec
+
+        actors = [entity.Avatar(id, entity.Type.Actor, 0, 0, 0, id % 4 + 1) for id in range(1, peers + 1)]
+        self.frames = []
+        for frame in range(frames):
+            packets = []
+            for actor in actors:
+                actor.x = (actor.x + actor.id) % 1080
+                actor.y = (actor.y + frame) % 700
+                projectile = entity.Projectile(actor.rotation, actor.x, actor.y) if (frame + actor.id) % 10 == 0 else None
+                if framed:
+                    writer = codec.FrameWriter(actor.id, lambda view: packets.append(bytes(view)))
+                    writer.add_actor(actor)
+                    if projectile:
+                        writer.add_projectile(projectile)
+                    writer.flush()
+                else:
+                    packets.append(actor.to_bytes())
+                    if projectile:
+                        packets.append(projectile.to_bytes())
+            packets.reverse()
+            self.frames.append(packets)
+
+        self.frame = 0
+        self.queue = []
+
+    def next_frame(self) -> None:
+        self.queue = list(self.frames[self.frame])
+        self.frame = (self.frame + 1) % len(self.frames)
+
+    def catch(self) -> bytes:
+        return self.queue.pop() if self.queue else None
+
+
+def bench_reader() -> None:
+    import entity
+
+    for peers in (20, 50, 200):
+        results = []
+        for reader in (legacy_network_reader, entity.network_reader):
+            network = SyntheticNetwork(peers)
+            frames = reader(0, network.catch)
+
+            def frame():
+                network.next_frame()
+                next(frames)
+
+            results.append(1000 / rate(frame))
+        print('reader: {} peers, list {:.3f}ms per frame, GameState {:.3f}ms per frame ({:.1f}x)'.format(peers, results[0], results[1], results[0] / results[1]))
+
+
+# Wire codec ----------------------------------------------------------------------------------------
+
+def legacy_actor_to_bytes(actor) -> bytes:
+    # Actor.to_bytes before the codec module.
+    data = []
+    data.append(actor.type)
+    data.append(actor.id)
+    for x in actor.rotation.to_bytes(length=2, byteorder="big", signed=False):
+        data.append(x)
+    for x in int(actor.x).to_bytes(length=4, byteorder="big", signed=False):
+        data.append(x)
+    for x in int(actor.y).to_bytes(length=4, byteorder="big", signed=False):
+        data.append(x)
+    data.append(actor.shiptype)
+    return bytes(data)
+
+
+def legacy_actor_from_bytes(actor, data: bytes) -> None:
+    # Actor.from_bytes before the codec module.
+    actor.type =     data[0]
+    actor.id =       data[1]
+    actor.rotation = int.from_bytes(data[2:4], byteorder="big", signed=False)
+    actor.x =        int.from_bytes(data[4:8], byteorder="big", signed=False)
+    actor.y =        int.from_bytes(data[8:12], byteorder="big", signed=False)
+    actor.shiptype = data[12]
+
+
+def bench_codec() -> None:
+    import entity
+
+    actor = entity.Avatar(7, entity.Type.Actor, 270, 540, 350, 3)
+    legacy_packet = legacy_actor_to_bytes(actor)
+    packet = actor.to_bytes()
+
+    results = [
+        ('encode', rate(lambda: legacy_actor_to_bytes(actor)), rate(lambda: actor.to_bytes())),
+        ('decode', rate(lambda: legacy_actor_from_bytes(actor, legacy_packet)), rate(lambda: actor.from_bytes(packet))),
+    ]
+    for name, before, after in results:
+        print('codec: actor {} per-byte list {:,.0f} ops/s, struct {:,.0f} ops/s ({:.1f}x)'.format(name, before, after, after / before))
+
+
+# Frames --------------------------------------------------------------------------------------------
+
+def bench_frames() -> None:
+    import entity
+
+    for peers in (20, 50, 200):
+        results = []
+        for framed in (False, True):
+            network = SyntheticNetwork(peers, framed=framed)
+            datagrams = sum(len(packets) for packets in network.frames) / len(network.frames)
+            frames = entity.network_reader(0, network.catch)
+
+            def frame():
+                network.next_frame()
+                next(frames)
+
+            results.append((datagrams, 1000 / rate(frame)))
+        print('frames: {} peers, a datagram per entity {:.0f} datagrams {:.3f}ms per frame, a frame per peer {:.0f} datagrams {:.3f}ms per frame'.format(
+            peers, results[0][0], results[0][1], results[1][0], results[1][1]))
+
+
+# Compact actors ------------------------------------------------------------------------------------
+
+def bench_compact() -> None:
+    # A scripted player at 60 ticks a second for 60 seconds, that moves and turns for 2 seconds then
+    # sits still for 2 seconds. Bandwidth includes the 28 byte IP and UDP headers of each datagram.
+    import entity, codec
+
+    for idle_share, name in ((0.5, 'half idle'), (0.0, 'always moving')):
+        results = []
+        for compact in (False, True):
+            datagrams = 0
+            def send(view):
+                nonlocal datagrams
+                datagrams += 1
+
+            writer = codec.FrameWriter(1, send, compact=compact)
+            player = entity.Avatar(1, entity.Type.Actor, 0, 540, 350, 2)
+            ticks = 60 * 60
+            for tick in range(ticks):
+                if (tick % 240) >= 240 * idle_share:
+                    player.x = 540 + 300 * ((tick % 120) / 120)
+                    player.y = 350 + ((tick // 120) % 2) * 100
+                    player.rotation = (player.rotation + 2) % 360
+                writer.add_actor(player, now=tick / 60)
+                writer.flush()
+            results.append((writer.bytes_sent + datagrams * 28) / 60)
+
+        print('compact: {}, full actors {:,.0f} bytes/s per peer, compact {:,.0f} bytes/s per peer ({:.0f}% less), 50 peers {:,.0f} -> {:,.0f} bytes/s'.format(
+            name, results[0], results[1], 100 - results[1] / results[0] * 100, results[0] * 50, results[1] * 50))
+
+
+# Interpolation -------------------------------------------------------------------------------------
+
+def bench_interpolation() -> None:
+    # Replays a deterministic jittery packet trace: an enemy flies in a circle at 200 pixels a second
+    # and sends at 20Hz, each packet arrives 5-35ms late and 5% are lost. It's drawn at 60 FPS for 10s.
+    # A stutter is a frame where the ship didn't move, a jump is how far it moved in one frame.
+    import entity, random, math
+
+    rng = random.Random(1)
+    arrivals = []
+    for n in range(10 * 20):
+        sent = n / 20
+        if rng.random() >= 0.05:
+            arrivals.append((sent + 0.005 + rng.random() * 0.03, sent))
+    arrivals.sort()
+
+    def truth(t):
+        return 540 + 200 * math.cos(t), 350 + 200 * math.sin(t)
+
+    for interp_delay in (0.0, entity.INTERP_DELAY):
+        state = entity.GameState(actor_timeout=1.0, interp_delay=interp_delay)
+        pending = list(reversed(arrivals))
+        stutters, jumps, errors = 0, [], []
+        last = None
+        for frame in range(10 * 60):
+            now = frame / 60
+            while pending and pending[-1][0] <= now:
+                _, sent = pending.pop()
+                x, y = truth(sent)
+                state.update_actor(entity.Avatar(1, entity.Type.Actor, 0, x, y, 1), now)
+            state.expire(now)
+            state.interpolate(now)
+
+            avatar = state.actors.get(1)
+            if avatar is None: # Nothing has arrived yet.
+                continue
+            position = (avatar.x, avatar.y)
+            if last is not None:
+                jump = math.dist(position, last)
+                jumps.append(jump)
+                if jump < 0.01:
+                    stutters += 1
+            last = position
+            errors.append(math.dist(position, truth(now - interp_delay)))
+
+        print('interpolation: delay {:.0f}ms, {} stutters in {} frames, jumps max {:.1f}px, error from truth {}ms ago mean {:.1f}px max {:.1f}px'.format(
+            interp_delay * 1000, stutters, len(jumps), max(jumps), interp_delay * 1000, sum(errors) / len(errors), max(errors)))
+
+
+# Projectile simulation -----------------------------------------------------------------------------
+
+def legacy_projectile_frame(projectiles: list, player, speed: float) -> bool:
+    # The per projectile loop LANSpace ran before ProjectilePool, without the drawing.
+    hit = False
+    for enemy in projectiles:
+        dir_x = math.cos(math.radians(-enemy.rotation+90))
+        dir_y = math.sin(math.radians(-enemy.rotation+90))
+        enemy.x -= (dir_x * speed)
+        enemy.y -= (dir_y * speed)
+
+        obj1_x, obj1_y = (player.x-(player.size/2), player.y-(player.size/2))
+        obj2_x, obj2_y = (enemy.x-(enemy.size/2), enemy.y-(enemy.size/2))
+        if (obj2_x > obj1_x and obj2_x < (obj1_x+player.size)) and (obj2_y > obj1_y and obj2_y < (obj1_y+player.size)):
+            hit = True
+    return hit
+
+
+def bench_projectiles() -> None:
+    import entity, projectiles, random
+
+    rng = random.Random(1)
+    player = entity.Avatar(1, entity.Type.Actor, 0, 540, 350, 1)
+    pools = [('objects', None)]
+    if projectiles.numpy is not None:
+        pools.append(('numpy', True))
+    pools.append(('lists', False))
+
+    for count in (100, 1000, 10000):
+        spawns = [(rng.uniform(0, 1080), rng.uniform(0, 700), rng.uniform(0, 360)) for _ in range(count)]
+        results = []
+        for name, use_numpy in pools:
+            if use_numpy is None:
+                objects = [entity.Projectile(rotation, x, y) for x, y, rotation in spawns]
+                frame = lambda: legacy_projectile_frame(objects, player, 15)
+            else:
+                pool = projectiles.ProjectilePool(use_numpy=use_numpy)
+                for x, y, rotation in spawns:
+                    pool.spawn(x, y, rotation, 0)
+                def frame():
+                    pool.step(15)
+                    pool.expire(1)
+                    pool.hits(player.x, player.y, player.size)
+            results.append('{} {:.3f}ms'.format(name, 1000 / rate(frame, 0.5)))
+        print('projectiles: {:,} live, move and hit test per frame: {}'.format(count, ', '.join(results)))
+
+
+# Spatial hash --------------------------------------------------------------------------------------
+
+def bench_spatial() -> None:
+    # The relay's collision pass: ships and projectiles scattered over the window, every ship tested
+    # against every projectile. The grid is rebuilt from the projectiles, then queried once per ship.
+    import spatial, random
+
+    rng = random.Random(1)
+    for count in (100, 500, 2000):
+        ships = [spatial.box(rng.uniform(0, 1080), rng.uniform(0, 700), 42) for _ in range(count // 4)]
+        projectiles = [spatial.box(rng.uniform(0, 1080), rng.uniform(0, 700), 21) for _ in range(count - count // 4)]
+
+        def naive():
+            return sum(1 for ship in ships if any(spatial.hit(ship, projectile) for projectile in projectiles))
+
+        grid = spatial.SpatialHash()
+        def hashed():
+            grid.clear()
+            for n, projectile in enumerate(projectiles):
+                grid.insert(n, projectile)
+            return sum(1 for ship in ships if grid.query(ship))
+
+        seconds = 0.5 if count < 2000 else 2.0
+        print('spatial: {} ships and {} projectiles, naive {:.2f}ms, rebuilt grid {:.2f}ms ({} ships hit)'.format(
+            len(ships), len(projectiles), 1000 / rate(naive, seconds), 1000 / rate(hashed, seconds), hashed()))
+
+
+# Telemetry -----------------------------------------------------------------------------------------
+
+def bench_telemetry() -> None:
+    # The cost of one span and one counter per call, with telemetry off and on. A frame has about 10 of each.
+    import telemetry
+
+    def bare():
+        pass
+
+    def instrumented():
+        with telemetry.span('bench'):
+            pass
+        telemetry.count('bench')
+
+    baseline = 1e9 / rate(bare)
+    telemetry.enable(False)
+    disabled = 1e9 / rate(instrumented) - baseline
+    telemetry.enable(True)
+    enabled = 1e9 / rate(instrumented) - baseline
+    telemetry.enable(False)
+    print('telemetry: span + counter costs {:.0f}ns disabled, {:.0f}ns enabled ({:.4f}% of a 16.6ms frame at 10 per frame disabled)'.format(
+        disabled, enabled, disabled * 10 / 16.6e6 * 100))
+
+
+# Dirty rect rendering ------------------------------------------------------------------------------
+
+def bench_renderer() -> None:
+    # Spaceships and projectiles moving around the window. With the dummy video driver the display
+    # update itself is almost free, so the time is the clearing and drawing, on a real window the
+    # pixels pushed to the display matter more.
+    import renderer, sprites, random
+
+    surface = pygame.display.get_surface()
+    rng = random.Random(1)
+    for ships, shots in ((20, 50), (50, 200), (200, 1000)):
+        objects = [(rng.uniform(0, 1080), rng.uniform(0, 700), rng.uniform(-5, 5), rng.uniform(-5, 5), n < ships) for n in range(ships + shots)]
+        results = []
+        for dirty in (False, True):
+            window = renderer.Renderer(surface, dirty=dirty)
+            frame_count = [0]
+            def frame():
+                frame_count[0] += 1
+                t = frame_count[0]
+                window.begin()
+                for x, y, dx, dy, ship in objects:
+                    position = ((x + dx * t) % 1080, (y + dy * t) % 700)
+                    window.blit(sprites.spaceship(1, t) if ship else sprites.projectile(t), position)
+                window.present()
+            ms = 1000 / rate(frame, 0.5)
+            results.append((ms, window.pixels_pushed, window.full_updates, window.dirty_updates))
+        (full_ms, full_pixels, _, _), (dirty_ms, dirty_pixels, full_updates, dirty_updates) = results
+        print('renderer: {} ships {} projectiles, full {:.3f}ms {:,} pixels, dirty rects {:.3f}ms {:,} pixels ({} of {} frames fell back to full)'.format(
+            ships, shots, full_ms, full_pixels, dirty_ms, dirty_pixels, full_updates, full_updates + dirty_updates))
+
+
+# Text cache ----------------------------------------------------------------------------------------
+
+def bench_text() -> None:
+    # The death screen's two messages, drawn every frame while the player is dead.
+    import text
+
+    surface = pygame.display.get_surface()
+
+    def uncached():
+        for message, size in (("You're DEAD!", 115), ("Press R to respawn...", 30)):
+            font = pygame.font.Font('assets/freesansbold.ttf', size)
+            surface.blit(font.render(message, True, (255, 255, 255)), (0, 0))
+
+    def cached():
+        for message, size in (("You're DEAD!", 115), ("Press R to respawn...", 30)):
+            surface.blit(text.render(message, size, (255, 255, 255)), (0, 0))
+
+    before_rate = rate(uncached)
+    text.clear()
+    after_rate = rate(cached)
+    stats = text.stats()
+    print('text: load/render {:,.0f} frames/s, cached {:,.0f} frames/s ({:.0f}x), {} renders for {:,} draws'.format(
+        before_rate, after_rate, after_rate / before_rate, stats['misses'], stats['hits'] + stats['misses']))
+
+
+# Transports ----------------------------------------------------------------------------------------
+
+def bench_transport() -> None:
+    # Two matches side by side over loopback multicast: packets must reach every player in their own
+    # match and nobody in the other. Then a second of a 50 player match arrives while the game isn't
+    # reading, what the receive buffer holds is what survives the stall.
+    import network
+
+    def drain(transport) -> list:
+        packets = []
+        while True:
+            data = transport.catch()
+            if data is None:
+                return packets
+            packets.append(data)
+
+    a1 = network.MulticastTransport(network.multicast_group(1), 8090, interface='127.0.0.1')
+    a2 = network.MulticastTransport(network.multicast_group(1), 8090, interface='127.0.0.1')
+    b = network.MulticastTransport(network.multicast_group(2), 8090, interface='127.0.0.1')
+    a1.send(b'match 1')
+    b.send(b'match 2')
+    time.sleep(0.05)
+    print('transport: multicast match 1 got {}, match 1 got {}, match 2 got {}'.format(drain(a1), drain(a2), drain(b)))
+
+    frame = bytes(1000)
+    default = network.MulticastTransport(network.multicast_group(3), 8090, interface='127.0.0.1', rcvbuf=None, sndbuf=None)
+    for name, transport in (('multicast, OS buffers', default), ('multicast', a1), ('broadcast', network.BroadcastTransport(8091))):
+        drain(transport)
+        burst = 50 * 60 # A second of 50 players at 60 ticks, read all at once after a stall.
+        start = time.perf_counter()
+        for n in range(burst):
+            transport.send(frame)
+            if n % 100 == 0:
+                time.sleep(0.001) # Gives the OS time to empty the send buffer, it's 50 players sending not one.
+        elapsed = time.perf_counter() - start
+        time.sleep(0.05)
+        received = len(drain(transport))
+        stats = transport.stats()
+        print('transport: {} burst of {} frames in {:.0f}ms, {} received, {} dropped sending, buffers {:,}/{:,} bytes'.format(
+            name, burst, elapsed * 1000, received, stats['send dropped'], stats['rcvbuf'], stats['sndbuf']))
+        transport.close()
+    a2.close()
+    b.close()
+
+
+# Joining -------------------------------------------------------------------------------------------
+
+def bench_join() -> None:
+    # 100 players start at the same moment over loopback multicast, each with its own sockets, like
+    # separate processes would. tests/test_join.py checks the IDs on a simulated LAN, with loss and clashes.
+    # find_id used to take 1.5 seconds, whatever happened.
+    import join, network
+
+    transports = [network.MulticastTransport(network.multicast_group(254), 8092, interface='127.0.0.1') for _ in range(100)]
+    start = time.perf_counter()
+    joiners = [join.Joiner(transport.send, start) for transport in transports]
+    finished = {}
+    while len(finished) < len(joiners) and time.perf_counter() - start < 10:
+        now = time.perf_counter()
+        for n, (joiner, transport) in enumerate(zip(joiners, transports)):
+            data = transport.catch()
+            while data:
+                joiner.receive(data, now)
+                data = transport.catch()
+            if n not in finished and joiner.poll(now):
+                finished[n] = now - start
+    for transport in transports:
+        transport.close()
+    times = sorted(t * 1000 for t in finished.values())
+    print('join: loopback multicast, {} players, {} different IDs, join time p50 {:.0f}ms max {:.0f}ms, {} conflicts, {} claims sent'.format(
+        len(joiners), len({joiner.id for joiner in joiners}), times[len(times)//2], times[-1],
+        sum(joiner.conflicts for joiner in joiners), sum(joiner.claims_sent for joiner in joiners)))
+
+
+# Interest management -------------------------------------------------------------------------------
+
+def bench_interest() -> None:
+    # Peers drifting about the window, each firing every half second, read by a player in the middle.
+    # Without interest management everyone sends and reads every tick. With it, senders drop to their
+    # nearest enemy's tier, and the reader skips far frames it doesn't need this tick. 6 peers are
+    # spread out on a grid, 350 pixels apart, the rest are scattered at random.
+    import entity, codec, interest, random
+
+    for peers in (6, 50, 200):
+        results = []
+        for managed in (False, True):
+            rng = random.Random(peers)
+            manager = interest.Interest() if managed else None
+            if peers == 6:
+                positions = [(180 + 360 * (n % 3), 175 + 350 * (n // 3)) for n in range(peers)]
+            else:
+                positions = [(rng.uniform(0, 1080), rng.uniform(0, 700)) for _ in range(peers)]
+            actors = [entity.Avatar(id, entity.Type.Actor, 0, x, y, id % 4 + 1) for id, (x, y) in enumerate(positions, 1)]
+            frames = []
+            packets = []
+            writers = [codec.FrameWriter(actor.id, lambda view: packets.append(bytes(view))) for actor in actors]
+            for frame in range(240):
+                packets = []
+                for actor, writer in zip(actors, writers):
+                    actor.x = (actor.x + rng.uniform(-1, 1)) % 1080
+                    actor.y = (actor.y + rng.uniform(-1, 1)) % 700
+                    send_every = 1
+                    if manager:
+                        send_every = manager.send_every(actor.x, actor.y, (other for other in actors if other is not actor))
+                    if writer.tick % send_every == 0:
+                        writer.add_actor(actor)
+                    if (frame + actor.id) % 30 == 0:
+                        writer.add_projectile(entity.Projectile(actor.rotation, actor.x, actor.y))
+                    writer.flush()
+                frames.append(packets)
+            sent = sum(writer.bytes_sent for writer in writers) / 4 # Bytes per second, 240 frames is 4 seconds.
+
+            reader_interest = interest.Interest() if managed else None
+            if reader_interest:
+                reader_interest.position = (540, 350)
+            queue = []
+            reader = entity.network_reader(0, lambda: queue.pop() if queue else None, actor_timeout=1.0, interest=reader_interest)
+            frame_index = [0]
+            def read():
+                queue[:] = reversed(frames[frame_index[0] % len(frames)])
+                frame_index[0] += 1
+                next(reader)
+            ms = 1000 / rate(read)
+            stats = reader_interest.stats() if reader_interest else None
+            if stats:
+                stats['frames'] = frame_index[0]
+            results.append((sent, ms, stats))
+
+        (full_sent, full_ms, _), (sent, ms, stats) = results
+        frames_total = stats['frames read'] + stats['frames skipped']
+        print('interest: {} peers, sent {:,.0f} -> {:,.0f} bytes/s ({:.0%} less), read {:.3f}ms -> {:.3f}ms per frame, {:.0%} of frames, {:.0f} bytes and {:.0f} decodes per frame skipped'.format(
+            peers, full_sent, sent, 1 - sent / full_sent, full_ms, ms, stats['frames skipped'] / frames_total,
+            stats['bytes skipped'] / stats['frames'], stats['decodes skipped'] / stats['frames']))
+
+
+# Capture -------------------------------------------------------------------------------------------
+
+def bench_capture() -> None:
+    # What recording costs the game loop per packet, the writing happens on the recorder's thread.
+    import capture, tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.lscap')
+    recorder = capture.Recorder(path)
+    packet = bytes(60)
+    record_rate = rate(lambda: recorder.record(packet), 0.5)
+    recorder.close()
+    print('capture: {:.2f}us per packet recorded, {:,} packets in {:,} bytes'.format(1e6 / record_rate, recorder.recorded, os.path.getsize(path)))
+
+    replay = capture.Replay(path)
+    replay.advance(1e9)
+    start = time.perf_counter()
+    while replay.catch() is not None:
+        pass
+    print('capture: replayed {:,.0f} packets/s'.format(replay.replayed / (time.perf_counter() - start)))
+    os.remove(path)
+
+
+def bench_snapshot() -> None:
+    # What --multiprocess costs each side: the worker publishing a snapshot, and the window reading it.
+    import world, simulation, entity, codec, argparse, types
+    from multiprocessing import shared_memory
+
+    state = entity.GameState()
+    for i in range(50):
+        state.update_actor(entity.Avatar(i+1, entity.Type.Actor, i, i*20, i*10, 1), 0.0)
+    for i in range(500):
+        state.projectiles.spawn(i, i, i, 0.0)
+    player = entity.Player(1000, entity.Type.Actor, 0, 500, 300, 1)
+    fake = types.SimpleNamespace(entities=state, _player=player, game=simulation.Game(player, codec.FrameWriter(player.id, lambda data: None)))
+
+    shm = shared_memory.SharedMemory(create=True, size=world.SIZE)
+    world.PIN.pack_into(shm.buf, world.PIN_OFFSET, world.NO_PIN)
+    publisher = world._Publisher(shm.buf)
+    remote = world.RemoteWorld(shm, None, argparse.Namespace(tick_rate=60))
+
+    publish_rate = rate(lambda: publisher.publish(fake, time.perf_counter()), 0.5)
+    def read():
+        remote._acquire()
+        for _ in remote.enemies(): pass
+        for _ in remote.projectiles(): pass
+    read_rate = rate(read, 0.5)
+    print('snapshot: 50 players, 500 projectiles, {:.1f}us to publish, {:.1f}us to read, {:,} bytes of shared memory'.format(
+        1e6 / publish_rate, 1e6 / read_rate, world.SIZE))
+
+    publisher = remote = None
+    shm.close()
+    shm.unlink()
+
+
+# ---------------------------------------------------------------------------------------------------
+
+benchmarks = {
+    'atlas': bench_atlas,
+    'assets': bench_assets,
+    'reader': bench_reader,
+    'codec': bench_codec,
+    'frames': bench_frames,
+    'compact': bench_compact,
+    'interpolation': bench_interpolation,
+    'projectiles': bench_projectiles,
+    'spatial': bench_spatial,
+    'telemetry': bench_telemetry,
+    'renderer': bench_renderer,
+    'text': bench_text,
+    'transport': bench_transport,
+    'join': bench_join,
+    'interest': bench_interest,
+    'capture': bench_capture,
+    'snapshot': bench_snapshot,
+}
+
+
+if __name__ == '__main__':
+    pygame.init()
+    pygame.display.set_mode(display_size)
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        benchmarks[name]()
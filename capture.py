@@ -0,0 +1,220 @@
+# capture.py records the packets a player receives to a file, and plays them back.
+# It's for reproducing performance problems from real matches: record a match once, then run the
+# same packets through network_reader and the renderer as often as needed, on any version.
+#
+# Capture file layout (big endian):
+#   header      magic:b'LSCAP'  format:u8  player:u16 (the recording player's ID)  start:f64 (time.time() when recording started)
+#   records     time:u32 (microseconds since start)  length:u16  followed by length bytes of packet
+#
+# Captures can be up to 71 minutes long, after that the times don't fit in 32 bits and recording stops.
+#
+# Recording: network_reader hands every packet it reads to a Recorder (see LANSpace.py --record).
+# The recorder only timestamps it and puts it on a queue, a background thread writes it to disk, so a
+# slow disk never holds up the game loop.
+#
+# The recording player's own frames come back to it and are recorded too. network_reader skips them
+# live, so a replay reads them as the same player, rather than drawing them as an enemy ship.
+# Format 1 captures had no player ID, they replay as player 0.
+#
+# Replay: a Replay stands in for network.CATCH, handing out each packet once its time has come. In real
+# time the capture's clock follows the wall clock. Otherwise it only moves when advance() is called, so
+# a capture can be run as fast as the machine can go, and every run sees the same packets each frame.
+#
+# Usage:
+#   python capture.py CAPTURE                       Replays a capture headless as fast as possible, and
+#                                                   reports frame times.
+#   python capture.py CAPTURE --realtime            Replays it at the speed it was recorded.
+#   python capture.py CAPTURE --save times.json     Saves the frame times, to compare a later run with.
+#   python capture.py CAPTURE --baseline times.json Compares with a saved run, exits with an error if
+#                                                   the p95 frame time is over --tolerance (10%) slower.
+#
+#
+#
+# Public Interface:
+#   Recorder(path, player)  Writes packets to a capture file, call record(data) for each and close() at the end.
+#   Replay(path, realtime)  Reads a capture file, catch() is a drop in for network.CATCH. player is who recorded it.
+#   replay(path, ...)       Runs a capture through network_reader and the renderer, returns frame times.
+
+import os, sys, time, json, struct, argparse, threading, queue
+
+MAGIC = b'LSCAP'
+FORMAT = 2
+PREFIX = struct.Struct('!5sB') # magic, format
+HEADER = struct.Struct('!5sBHd')
+HEADER_V1 = struct.Struct('!5sBd')
+RECORD = struct.Struct('!IH')
+MAX_TIME = 0xFFFFFFFF # Microseconds.
+
+
+class Recorder:
+    def __init__(self, path: str, player: int = 0) -> None:
+        self.file = open(path, 'wb')
+        self.start = time.time()
+        self.perf_start = time.perf_counter()
+        self.file.write(HEADER.pack(MAGIC, FORMAT, player, self.start))
+
+        self.recorded = 0
+        self.full = False # True once the capture is too long to record any more.
+
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name='capture.Recorder', daemon=True)
+        self._thread.start()
+
+
+    def record(self, data) -> None:
+        microseconds = int((time.perf_counter() - self.perf_start) * 1e6)
+        if microseconds > MAX_TIME:
+            self.full = True
+            return
+        self._queue.put((microseconds, bytes(data)))
+        self.recorded += 1
+
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self.file.close()
+
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            microseconds, data = item
+            self.file.write(RECORD.pack(microseconds, len(data)))
+            self.file.write(data)
+
+
+class Replay:
+    def __init__(self, path: str, realtime: bool = False) -> None:
+        self.file = open(path, 'rb')
+        header = self.file.read(HEADER.size)
+        magic, format = PREFIX.unpack_from(header) if len(header) >= PREFIX.size else (None, None)
+        layout = {1: HEADER_V1, FORMAT: HEADER}.get(format)
+        if magic != MAGIC or layout is None or len(header) < layout.size:
+            raise ValueError('{} is not a LANSpace capture'.format(path))
+        if format == 1:
+            _, _, self.start = HEADER_V1.unpack_from(header)
+            self.player = 0
+            self.file.seek(HEADER_V1.size)
+        else:
+            _, _, self.player, self.start = HEADER.unpack(header)
+
+        self.realtime = realtime
+        self.offset = 0.0 # Seconds into the capture.
+        self.wall_start = None # When a real time replay started.
+        self.done = False # True once every packet has been handed out.
+        self.replayed = 0
+        self._next = self._read()
+
+
+    def time(self) -> float:
+        # time is the capture's clock, as time.time() was when it was recorded. Pass it to network_reader
+        # as its clock, so players expire and interpolate the same way every run.
+        if self.realtime:
+            if self.wall_start is None:
+                self.wall_start = time.perf_counter()
+            self.offset = time.perf_counter() - self.wall_start
+        return self.start + self.offset
+
+
+    def advance(self, seconds: float) -> None:
+        # advance moves the capture's clock on, when it isn't following the wall clock.
+        self.offset += seconds
+
+
+    def catch(self) -> bytes:
+        if self._next is None:
+            return None
+        microseconds, data = self._next
+        if self.realtime:
+            self.time()
+        if microseconds > self.offset * 1e6:
+            return None # Not arrived yet.
+        self._next = self._read()
+        self.replayed += 1
+        return data
+
+
+    def close(self) -> None:
+        self.file.close()
+
+
+    def _read(self) -> tuple:
+        header = self.file.read(RECORD.size)
+        if len(header) < RECORD.size:
+            self.done = True
+            return None
+        microseconds, length = RECORD.unpack(header)
+        return microseconds, self.file.read(length)
+
+
+def replay(path: str, realtime: bool = False, render: bool = True, fps: int = 60) -> list:
+    # replay returns how long every frame took, in seconds, from reading the network to updating the display.
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame, entity, sprites, renderer, simulation
+
+    pygame.init()
+    window = renderer.Renderer(pygame.display.set_mode((1080, 700)))
+    sprites.prebuild()
+
+    source = Replay(path, realtime)
+    reader = entity.network_reader(source.player, source.catch, clock=source.time)
+    frame_times = []
+    while not source.done:
+        frame_start = time.perf_counter()
+        state = next(reader)
+        state.projectiles.step(simulation.Game.projs_speed / fps)
+        if render:
+            window.begin()
+            for enemy in state.actors.values():
+                window.blit(enemy.get_spaceship(), (enemy.x - enemy.size/2, enemy.y - enemy.size/2))
+            for x, y, rotation in state.projectiles.positions():
+                window.blit(sprites.projectile(rotation), (x - state.projectiles.size/2, y - state.projectiles.size/2))
+            window.present()
+        frame_times.append(time.perf_counter() - frame_start)
+
+        if realtime:
+            time.sleep(max(0.0, 1 / fps - (time.perf_counter() - frame_start)))
+        else:
+            source.advance(1 / fps)
+    source.close()
+    return frame_times
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values)-1, int(round(p / 100 * (len(values)-1))))] if values else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replays a LANSpace capture headless, and reports frame times.')
+    parser.add_argument('capture', help='capture file, recorded with LANSpace.py --record')
+    parser.add_argument('--realtime', action='store_true', help='replay at the speed it was recorded, instead of as fast as possible')
+    parser.add_argument('--no-render', action='store_true', help="don't draw frames, only measure the network reader")
+    parser.add_argument('--save', metavar='JSON', help='save the frame times to a file')
+    parser.add_argument('--baseline', metavar='JSON', help='compare with frame times saved by an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='how much slower the p95 frame time can be than the baseline (default: 0.1)')
+    args = parser.parse_args()
+
+    frame_times = [t * 1000 for t in replay(args.capture, args.realtime, not args.no_render)]
+    result = {'frames': len(frame_times), 'mean': sum(frame_times) / len(frame_times) if frame_times else 0.0,
+              'p50': percentile(frame_times, 50), 'p95': percentile(frame_times, 95), 'p99': percentile(frame_times, 99)}
+    print('{frames} frames, mean {mean:.3f}ms, p50 {p50:.3f}ms, p95 {p95:.3f}ms, p99 {p99:.3f}ms'.format(**result))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(result, file)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        change = result['p95'] / baseline['p95'] - 1 if baseline['p95'] else 0.0
+        print('p95 {:.3f}ms against a baseline of {:.3f}ms ({:+.1%})'.format(result['p95'], baseline['p95'], change))
+        if change > args.tolerance:
+            sys.exit('Frame times regressed by more than {:.0%}'.format(args.tolerance))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+# codec.py is a module used by entity.py
+# Its purpose is to turn entities into packets and back using fixed layouts, compiled once with struct.
+#
+# Every packet starts with a version byte and a type byte, so a client can tell a packet
+# it doesn't understand from one it does, and skip it instead of misreading it.
+#
+#
+#
+# Packet layouts (big endian):
+#   Actor           version:u8  type:u8  id:u16  rotation:u16  x:i32  y:i32  shiptype:u8
+#   Projectile      version:u8  type:u8  rotation:u16  x:i32  y:i32
+#   Frame           version:u8  type:u8  sender:u16  tick:u32  cell_x:u8  cell_y:u8  flags:u8  count:u8
+#                   followed by count records
+#   ActorKey        version:u8  type:u8  id:u16  seq:u8  packed:u32 (x:11 y:10 rotation:8 shiptype-1:2 bits)
+#   ActorDelta      version:u8  type:u8  id:u16  seq:u8  dx:i8  dy:i8  drotation:i8
+#   Claim           version:u8  type:u8  id:u16  nonce:u32
+#   Kill            version:u8  type:u8  id:u16
+#
+# Positions are signed, since a projectile can spawn slightly outside the window.
+# Player IDs are 16 bits, and always right after the type byte, so a packet's ID can be read without
+# knowing its layout. A claim asks for an ID while joining, see join.py. A kill tells a player a relay
+# decided it was hit, see relay.py.
+# A frame's cell is where its sender is, in CELL_SIZE squares, so a receiver can tell how far away a
+# frame is from without reading its records, see interest.py. Frames with anything every player must
+# read (projectiles, claims, keyframes), or from a sender with no position yet, have flags ALWAYS_READ.
+# A frame holds everything one player sends in a tick, so a tick costs one datagram not one per entity.
+# Its records use the same layouts as single packets.
+#
+# Compact actors: instead of a full Actor record every tick, a player can send an ActorKey with its
+# position quantized to the window (1 pixel) and rotation to a byte (1.4 degrees), then ActorDeltas
+# against that keyframe. seq ties a delta to its keyframe, so a lost keyframe can't corrupt a position.
+# A new keyframe is sent every KEYFRAME_INTERVAL, or when a delta won't fit in a byte. A player that
+# hasn't moved sends nothing but a heartbeat every HEARTBEAT_INTERVAL. Heartbeats are keyframes, so
+# one lost keyframe can't hide an idle player until the next KEYFRAME_INTERVAL.
+#
+# Public Interface:
+#   VERSION                                 The version byte this client sends and understands.
+#   packet_type(data) -> int                Returns the packet's type, or None if it can't be read.
+#   encode_actor(actor) -> bytes            Packs an Actor into a packet.
+#   decode_actor(data) -> tuple             Unpacks (type, id, rotation, x, y, shiptype) from a packet.
+#   encode_projectile(projectile) -> bytes  Packs a Projectile into a packet.
+#   decode_projectile(data) -> tuple        Unpacks (type, rotation, x, y) from a packet.
+#   write_actor(buffer, offset, actor)      Packs an Actor into a bytearray at offset, returns the new offset.
+#   write_projectile(...)                   Same as write_actor, for a Projectile.
+#   records(data)                           Yields (type, offset) for every entity in a packet or frame.
+#   record_id(data, offset, type) -> int    Returns the player ID of a record, or None if it has none.
+#   frame_sender(data) -> int               Returns the sender ID of a frame, or None if it isn't one.
+#   frame_header(data) -> tuple             Returns (sender, tick, cell_x, cell_y, flags, count) of a frame, or None.
+#   cell(x, y) -> tuple                     Returns the cell a position is in.
+#   encode_claim(id, nonce) -> bytes        Packs a Claim into a packet.
+#   FrameWriter(sender, send, compact)      Collects a tick's entities into frames, and sends them.
+#                                           always_read sets ALWAYS_READ on every frame, for a relay's snapshots.
+#   ActorEncoder                            Turns a player's state into compact ActorKey/ActorDelta records.
+#   ActorDecoder                            Turns compact records back into (id, rotation, x, y, shiptype).
+
+import struct, time
+
+
+VERSION = 3
+
+HEADER = struct.Struct('!BB')
+ACTOR = struct.Struct('!BBHHiiB')
+PROJECTILE = struct.Struct('!BBHii')
+FRAME = struct.Struct('!BBHIBBBB')
+ACTOR_KEY = struct.Struct('!BBHBI')
+ACTOR_DELTA = struct.Struct('!BBHBbbb')
+CLAIM = struct.Struct('!BBHI')
+KILL = struct.Struct('!BBH')
+ID = struct.Struct('!H') # The ID after the header.
+
+# Packet types, they come after entity.Type's Projectile (0) and Actor (1).
+FRAME_TYPE = 2
+ACTOR_KEY_TYPE = 3
+ACTOR_DELTA_TYPE = 4
+CLAIM_TYPE = 5
+KILL_TYPE = 6
+
+RECORD_SIZES = {0: PROJECTILE.size, 1: ACTOR.size, ACTOR_KEY_TYPE: ACTOR_KEY.size, ACTOR_DELTA_TYPE: ACTOR_DELTA.size, CLAIM_TYPE: CLAIM.size,
+                KILL_TYPE: KILL.size}
+_ID_TYPES = (1, ACTOR_KEY_TYPE, ACTOR_DELTA_TYPE, CLAIM_TYPE, KILL_TYPE) # Record types with an ID.
+
+MAX_ID = 65535
+
+CELL_SIZE = 64 # Pixels.
+ALWAYS_READ = 1 # Frame flag.
+
+KEYFRAME_INTERVAL = 1.0 # Seconds.
+HEARTBEAT_INTERVAL = 0.1 # Seconds. Receivers must keep an idle player for longer than this.
+
+MAX_FRAME = 1400 # Fits in one ethernet packet (1500 byte MTU) with room for the IP and UDP headers.
+
+
+def packet_type(data) -> int:
+    if len(data) < HEADER.size:
+        return None
+    version, _type = HEADER.unpack_from(data)
+    if version != VERSION:
+        return None
+    return _type
+
+
+def encode_actor(actor) -> bytes:
+    return ACTOR.pack(VERSION, actor.type, actor.id, actor.rotation, int(actor.x), int(actor.y), actor.shiptype)
+
+
+def decode_actor(data, offset: int = 0) -> tuple:
+    return ACTOR.unpack_from(data, offset)[1:]
+
+
+def write_actor(buffer: bytearray, offset: int, actor) -> int:
+    ACTOR.pack_into(buffer, offset, VERSION, actor.type, actor.id, actor.rotation, int(actor.x), int(actor.y), actor.shiptype)
+    return offset + ACTOR.size
+
+
+def encode_projectile(projectile) -> bytes:
+    return PROJECTILE.pack(VERSION, projectile.type, projectile.rotation, int(projectile.x), int(projectile.y))
+
+
+def decode_projectile(data, offset: int = 0) -> tuple:
+    return PROJECTILE.unpack_from(data, offset)[1:]
+
+
+def write_projectile(buffer: bytearray, offset: int, projectile) -> int:
+    PROJECTILE.pack_into(buffer, offset, VERSION, projectile.type, projectile.rotation, int(projectile.x), int(projectile.y))
+    return offset + PROJECTILE.size
+
+
+def encode_claim(id: int, nonce: int) -> bytes:
+    return CLAIM.pack(VERSION, CLAIM_TYPE, id, nonce)
+
+
+def record_id(data, offset: int, record_type: int) -> int:
+    if record_type in _ID_TYPES:
+        return ID.unpack_from(data, offset + HEADER.size)[0]
+    return None
+
+
+def frame_sender(data) -> int:
+    if packet_type(data) == FRAME_TYPE and len(data) >= FRAME.size:
+        return ID.unpack_from(data, HEADER.size)[0]
+    return None
+
+
+def frame_header(data) -> tuple:
+    if packet_type(data) == FRAME_TYPE and len(data) >= FRAME.size:
+        return FRAME.unpack_from(data)[2:]
+    return None
+
+
+def cell(x: float, y: float) -> tuple:
+    return min(max(int(x) // CELL_SIZE, 0), 255), min(max(int(y) // CELL_SIZE, 0), 255)
+
+
+def records(data):
+    # records yields (type, offset) for every entity in a packet. A single entity packet has one
+    # record at offset 0. Packets from other versions, of unknown types or too short are skipped,
+    # and a frame is read up to its first bad record.
+    _type = packet_type(data)
+    if _type is None:
+        return
+
+    if _type != FRAME_TYPE:
+        size = RECORD_SIZES.get(_type)
+        if size is not None and size <= len(data):
+            yield _type, 0
+        return
+
+    if len(data) < FRAME.size:
+        return
+    count = FRAME.unpack_from(data)[-1]
+
+    offset = FRAME.size
+    for _ in range(count):
+        if offset + HEADER.size > len(data):
+            return
+        _type = data[offset + 1]
+        size = RECORD_SIZES.get(_type)
+        if size is None or offset + size > len(data):
+            return
+        yield _type, offset
+        offset += size
+
+
+# FrameWriter packs everything a player sends in one tick into as few datagrams as possible.
+# Records are packed straight into one reusable buffer, and send is given a view of it, so nothing is
+# copied. A frame is sent early if the next record won't fit in MAX_FRAME.
+class FrameWriter:
+    def __init__(self, sender: int, send, max_size: int = MAX_FRAME, compact: bool = False, always_read: bool = False) -> None:
+        self.sender = sender
+        self.send = send
+        self.tick = 0
+
+        self.buffer = bytearray(max_size)
+        self.view = memoryview(self.buffer)
+        self.offset = FRAME.size
+        self.count = 0
+        self.cell = None # Where the sender's player was last added, see interest.py.
+        self.flags = 0
+        self.always_read = always_read
+
+        # With compact on, add_actor sends ActorKey/ActorDelta records instead of Actor records.
+        self.encoder = ActorEncoder() if compact else None
+
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.started = time.time()
+
+
+    def add_actor(self, actor, now: float = None) -> None:
+        self.cell = cell(actor.x, actor.y)
+        if self.encoder is None:
+            self._reserve(ACTOR.size)
+            self.offset = write_actor(self.buffer, self.offset, actor)
+            self.count += 1
+            return
+
+        record = self.encoder.encode(actor, time.time() if now is None else now)
+        if record is not None: # None when the player is idle and no heartbeat is due.
+            layout, values = record
+            self._reserve(layout.size)
+            if layout is ACTOR_KEY: # Deltas can't be read without it.
+                self.flags |= ALWAYS_READ
+            layout.pack_into(self.buffer, self.offset, *values)
+            self.offset += layout.size
+            self.count += 1
+
+
+    def add_projectile(self, projectile) -> None:
+        self._reserve(PROJECTILE.size)
+        self.flags |= ALWAYS_READ # Projectiles fly across the whole window, every player needs them.
+        self.offset = write_projectile(self.buffer, self.offset, projectile)
+        self.count += 1
+
+
+    def add_claim(self, id: int, nonce: int) -> None:
+        self._reserve(CLAIM.size)
+        self.flags |= ALWAYS_READ
+        CLAIM.pack_into(self.buffer, self.offset, VERSION, CLAIM_TYPE, id, nonce)
+        self.offset += CLAIM.size
+        self.count += 1
+
+
+    def add_kill(self, id: int) -> None:
+        self._reserve(KILL.size)
+        KILL.pack_into(self.buffer, self.offset, VERSION, KILL_TYPE, id)
+        self.offset += KILL.size
+        self.count += 1
+
+
+    def flush(self) -> None:
+        # flush sends what's left of the tick, and starts the next tick.
+        self._send()
+        self.tick = (self.tick + 1) & 0xFFFFFFFF
+
+
+    def bandwidth(self, now: float = None) -> float:
+        # bandwidth returns the average bytes per second this peer has sent, without IP and UDP headers.
+        elapsed = (time.time() if now is None else now) - self.started
+        return self.bytes_sent / elapsed if elapsed > 0 else 0.0
+
+
+    def _reserve(self, size: int) -> None:
+        if self.offset + size > len(self.buffer) or self.count == 255:
+            self._send()
+
+
+    def _send(self) -> None:
+        if self.count == 0:
+            return
+
+        if self.cell is None or self.always_read:
+            cell_x, cell_y, flags = 0, 0, ALWAYS_READ
+        else:
+            (cell_x, cell_y), flags = self.cell, self.flags
+        FRAME.pack_into(self.buffer, 0, VERSION, FRAME_TYPE, self.sender, self.tick, cell_x, cell_y, flags, self.count)
+        self.send(self.view[:self.offset])
+
+        self.frames_sent += 1
+        self.bytes_sent += self.offset
+        self.offset = FRAME.size
+        self.count = 0
+        self.flags = 0
+
+
+def quantize(actor) -> tuple:
+    # quantize returns (x, y, rotation) in the units ActorKey and ActorDelta records use.
+    x = min(max(int(actor.x), 0), 2047)
+    y = min(max(int(actor.y), 0), 1023)
+    rotation = int(round((actor.rotation % 360) * 256 / 360)) & 255
+    return x, y, rotation
+
+
+def _fits(value: int) -> bool:
+    return -128 <= value <= 127
+
+
+# ActorEncoder is the sender's half of compact actors. It remembers the last keyframe it sent.
+class ActorEncoder:
+    def __init__(self) -> None:
+        self.seq = 0
+        self.key = None # (x, y, rotation, shiptype) of the last keyframe.
+        self.key_time = 0.0
+        self.last = None # What the last record sent said.
+        self.send_time = 0.0
+
+        self.keyframes = 0
+        self.deltas = 0
+        self.skipped = 0
+
+
+    def encode(self, actor, now: float):
+        # encode returns (layout, values) of the record to send for the actor, or None if nothing needs sending.
+        x, y, rotation = quantize(actor)
+        state = (x, y, rotation, actor.shiptype)
+
+        if self.key is not None:
+            dx, dy = x - self.key[0], y - self.key[1]
+            drotation = (rotation - self.key[2] + 128) % 256 - 128 # The shortest way round.
+
+        idle = state == self.last
+        if idle and now - self.send_time < HEARTBEAT_INTERVAL:
+            self.skipped += 1
+            return None
+
+        if (idle or self.key is None or now - self.key_time >= KEYFRAME_INTERVAL or actor.shiptype != self.key[3]
+                or not _fits(dx) or not _fits(dy)):
+            self.seq = (self.seq + 1) & 255
+            self.key = self.last = state
+            self.key_time = self.send_time = now
+            self.keyframes += 1
+            packed = (x << 21) | (y << 11) | (rotation << 3) | ((actor.shiptype - 1) & 3)
+            return ACTOR_KEY, (VERSION, ACTOR_KEY_TYPE, actor.id, self.seq, packed)
+
+        self.last = state
+        self.send_time = now
+        self.deltas += 1
+        return ACTOR_DELTA, (VERSION, ACTOR_DELTA_TYPE, actor.id, self.seq, dx, dy, drotation)
+
+
+# ActorDecoder is the receiver's half of compact actors. It remembers every player's last keyframe.
+class ActorDecoder:
+    def __init__(self) -> None:
+        self.keys = {} # id: (seq, x, y, rotation, shiptype)
+        self.missing_key = 0 # Deltas dropped because their keyframe was lost.
+
+
+    def decode(self, data, offset: int, record_type: int) -> tuple:
+        # decode returns (id, rotation, x, y, shiptype) from an ActorKey or ActorDelta record,
+        # or None if it's a delta for a keyframe that never arrived. The delta still shows the player is
+        # playing, record_id() gives its ID.
+        if record_type == ACTOR_KEY_TYPE:
+            version, _type, id, seq, packed = ACTOR_KEY.unpack_from(data, offset)
+            key = (seq, packed >> 21, (packed >> 11) & 1023, (packed >> 3) & 255, (packed & 3) + 1)
+            self.keys[id] = key
+            seq, x, y, rotation, shiptype = key
+        else:
+            version, _type, id, seq, dx, dy, drotation = ACTOR_DELTA.unpack_from(data, offset)
+            key = self.keys.get(id)
+            if key is None or key[0] != seq:
+                self.missing_key += 1
+                return None
+            x, y = key[1] + dx, key[2] + dy
+            rotation = (key[3] + drotation) & 255
+            shiptype = key[4]
+
+        return id, rotation * 360 / 256, x, y, shiptype
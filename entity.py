@@ -8,15 +8,17 @@
 #   Type            Used to identify the entity type.
 #   Player          The class used to create the main player that the user controls.
 #   Avatar          The class used to create representations of network clones of players.
+#   GameState       The avatars and projectiles on the network, indexed by id and arrival time.
+#   packet_key      Tells a network.Receiver which packets are the latest state of a player.
 #   network_reader  Generator used to provide the game state of the network for each game loop.
 
-import pygame, time, network
+import time, network, sprites, codec, projectiles, telemetry, GMath, join
 
 #from pygame.constants import GL_MULTISAMPLEBUFFERS
 
 
 # Available entity types --------------------------------------------------------------------
-from collections import namedtuple
+from collections import namedtuple, OrderedDict, deque
 
 entitytype = namedtuple("entitytype", "Projectile Actor")
 Type = entitytype(Projectile=0, Actor=1)
@@ -26,6 +28,17 @@ Type = entitytype(Projectile=0, Actor=1)
 Entity = namedtuple("Entity", "type object")
 # Entity Container --------------------------------------------------------------------------
 
+# Seconds an enemy player can go unheard before it's removed. Players sending compact actors only send a
+# heartbeat when idle, so they need the longer timeout. Everyone in a game should use the same mode.
+ACTOR_TIMEOUT = 0.03
+COMPACT_ACTOR_TIMEOUT = codec.HEARTBEAT_INTERVAL * 2.5
+
+# Interpolation of enemy players, see GameState. The delay should be about two send intervals, so a
+# late or lost packet still leaves a snapshot to interpolate towards.
+INTERP_DELAY = 0.1 # Seconds.
+MAX_EXTRAPOLATION = 0.1 # Seconds an avatar keeps moving after its last snapshot.
+SNAPSHOTS = 16 # Snapshots kept per avatar, enough for 0.1 seconds of 60Hz updates plus jitter.
+
 
 class Projectile:
     def __init__(self, rotation: int, x: int, y: int) -> None:
@@ -36,46 +49,19 @@ class Projectile:
 
         self.size = 21
         self.duration = time.time()
-        self.projectile_cache = pygame.image.load('assets/projectile.png')
 
 
     def to_bytes(self) -> bytes:
-        data = []
-
-        data.append(self.type)
-        for x in self.rotation.to_bytes(length=2, byteorder="big", signed=False):
-            data.append(x)
-        for x in int(self.x).to_bytes(length=4, byteorder="big", signed=False):
-            data.append(x)
-        for x in int(self.y).to_bytes(length=4, byteorder="big", signed=False):
-            data.append(x)
+        return codec.encode_projectile(self)
 
-        return bytes(data)
 
-
-    def from_bytes(self, data: bytes) -> None:
-        self.type =     data[0]
-        self.rotation = int.from_bytes(data[1:3], byteorder="big", signed=False)
-        self.x =        int.from_bytes(data[3:7], byteorder="big", signed=False)
-        self.y =        int.from_bytes(data[7:11], byteorder="big", signed=False)
+    def from_bytes(self, data: bytes, offset: int = 0) -> None:
+        self.type, self.rotation, self.x, self.y = codec.decode_projectile(data, offset)
 
 
     def get_projectile(self):
-        # get_spaceship gets a surface object of the spaceship at it's current position and rotation.
-
-        
-        # Sets the properties of the rendered version.
-        projectile = self.projectile_cache.copy() # Created a copy of the original cache to prevent noise damage on rerenders
-        projectile = pygame.transform.scale(projectile, (self.size, self.size))
-        
-        # To make the ship rotate on its center, I used a reference:
-        # https://www.pygame.org/wiki/RotateCenter?parent=CookBook
-        projectile_rect = projectile.get_rect().copy()
-        rot_projectile = pygame.transform.rotate(projectile, self.rotation)#+270) # 270 is the amount the ship must be rotated by to point toward the mouse.
-        projectile_rect.center = rot_projectile.get_rect().center
-        rot_projectile = rot_projectile.subsurface(projectile_rect)
-
-        return rot_projectile
+        # get_projectile gets a surface object of the projectile at it's current rotation.
+        return sprites.projectile(self.rotation, self.size)
 
 
 
@@ -89,148 +75,242 @@ class Actor:
         self.y =        y
         self.shiptype = shiptype # Ship type must be between and including 1-4
 
-        self.spaceship_cache = None
         self.size = 42
 
     def to_bytes(self) -> bytes:
-        data = []
-
-        data.append(self.type)
-        data.append(self.id)
-        for x in self.rotation.to_bytes(length=2, byteorder="big", signed=False):
-            data.append(x)
-        for x in int(self.x).to_bytes(length=4, byteorder="big", signed=False):
-            data.append(x)
-        for x in int(self.y).to_bytes(length=4, byteorder="big", signed=False):
-            data.append(x)
-        data.append(self.shiptype)
-
-        return bytes(data)
+        return codec.encode_actor(self)
 
 
-    def from_bytes(self, data: bytes) -> None:
-        self.type =     data[0]
-        self.id =       data[1]
-        self.rotation = int.from_bytes(data[2:4], byteorder="big", signed=False)
-        self.x =        int.from_bytes(data[4:8], byteorder="big", signed=False)
-        self.y =        int.from_bytes(data[8:12], byteorder="big", signed=False)
-        self.shiptype = data[12]
+    def from_bytes(self, data: bytes, offset: int = 0) -> None:
+        self.type, self.id, self.rotation, self.x, self.y, self.shiptype = codec.decode_actor(data, offset)
 
 
     def get_spaceship(self):
-        # get_spaceship gets a surface object of the spaceship at it's current position and rotation.
-
-        # Initializes the img cache, if not already done.
-        if not self.spaceship_cache:
-            self.spaceship_cache = pygame.image.load('assets/spaceship/{}.png'.format(self.shiptype))
-        
-        # Sets the properties of the rendered version.
-        spaceship = self.spaceship_cache.copy() # Created a copy of the original cache to prevent noise damage on rerenders
-        spaceship = pygame.transform.scale(spaceship, (self.size, self.size))
-        
-        # To make the ship rotate on its center, I used a reference:
-        # https://www.pygame.org/wiki/RotateCenter?parent=CookBook
-        spaceship_rect = spaceship.get_rect().copy()
-        rot_spaceship = pygame.transform.rotate(spaceship, self.rotation)#+270) # 270 is the amount the ship must be rotated by to point toward the mouse.
-        spaceship_rect.center = rot_spaceship.get_rect().center
-        rot_spaceship = rot_spaceship.subsurface(spaceship_rect)
-
-        return rot_spaceship
+        # get_spaceship gets a surface object of the spaceship at it's current rotation.
+        return sprites.spaceship(self.shiptype, self.rotation, self.size)
 
 
 # An abstract layer ontop of Actor that provides additional functions.
 class Player(Actor):
     def find_id(self) -> None:
-        # find_id finds a free ID between 0-255 on the network
-
-        # end_time is the time 1.5 seconds in the future
-        end_time = time.time() + 1.5
-
-        playersIDs = [] # List of used player IDs
-
-        # Collects all the currently used IDs on the network.
-        while time.time() < end_time:
-            random_player = Avatar(0,0,0,0,0,0)
-            data = network.CATCH() # Catch a player on the network
-            if data: # If data is not empty, then use it to create an Actor object
-                random_player.from_bytes(data)
-                playersIDs.append(random_player.id)
-
-        # Turning the list to a set removes the duplicate IDs
-        playersIDs = set(playersIDs)
-
-        # Searchs for an unused ID, and returns the first unused ID.
-        newID = 0
-        for ID in playersIDs:
-            if newID == ID:
-                newID += 1
-
-        self.id = newID
-        return
+        # find_id gives the player an ID nobody else on the network is using, see join.py
+        self.id = join.join()
 
 
 # An abstract layer ontop of Actor that provides additional functions.
 class Avatar(Actor):
     last_update = 0
+    snapshots = None # (time, x, y, rotation) of the latest updates, only used with interpolation.
+
+    def push(self, now: float, x: float, y: float, rotation: float) -> None:
+        # push adds an update from the network to the snapshot buffer.
+        if self.snapshots is None:
+            self.snapshots = deque(maxlen=SNAPSHOTS)
+        self.snapshots.append((now, x, y, rotation))
+
+
+    def interpolate(self, render_time: float, max_extrapolation: float) -> None:
+        # interpolate moves the avatar to where it was at render_time, between the two snapshots either
+        # side of it. If render_time is past the newest snapshot, the avatar carries on the way it was
+        # going for up to max_extrapolation seconds (dead reckoning), then stops.
+        snapshots = self.snapshots
+        if not snapshots:
+            return
+
+        if len(snapshots) == 1 or render_time <= snapshots[0][0]:
+            _, self.x, self.y, self.rotation = snapshots[0]
+            return
+
+        # Finds the pair of snapshots around render_time, they're in time order so search from the newest.
+        for i in range(len(snapshots) - 1, 0, -1):
+            if snapshots[i-1][0] <= render_time:
+                break
+        a, b = snapshots[i-1], snapshots[i]
+
+        render_time = min(render_time, b[0] + max_extrapolation)
+        t = GMath.invlerp(a[0], b[0], render_time) if b[0] > a[0] else 1.0 # t > 1 extrapolates.
+        self.x = GMath.lerp(a[1], b[1], t)
+        self.y = GMath.lerp(a[2], b[2], t)
+        self.rotation = GMath.lerp_angle(a[3], b[3], t)
+
+
+# The state of every other entity on the network, indexed so a packet never has to search for its entity.
+class GameState:
+    def __init__(self, actor_timeout: float = 0.03, interp_delay: float = 0.0) -> None:
+        self.actor_timeout = actor_timeout # Seconds an enemy player can go unheard before it's removed.
+        # Seconds behind the network avatars are drawn, so there's always a snapshot either side to
+        # interpolate between. 0 draws avatars where their last update put them.
+        self.interp_delay = interp_delay
+
+        # Avatars by id, in the order they were last updated, so the longest silent are always first.
+        self.actors = OrderedDict()
+        # Projectiles in the order they arrived, which is also the order they expire in.
+        self.projectiles = projectiles.ProjectilePool(lifetime=2.0)
+        # True when a joining player claimed the main player's ID, the main player must defend it with
+        # a claim of its own, see join.py. Whoever defends it sets it back to False.
+        self.challenged = False
+        # True when a relay decided the main player was hit, see relay.py. Whoever kills it sets it back to False.
+        self.killed = False
+
+
+    def __len__(self) -> int:
+        return len(self.actors) + len(self.projectiles)
+
+
+    def update_actor(self, entity: Actor, now: float) -> None:
+        ent = self.actors.get(entity.id)
+        if ent is None:
+            ent = self.actors[entity.id] = entity
+        elif not self.interp_delay:
+            # Don't need to update type or id since the never change.
+            ent.rotation = entity.rotation
+            ent.x = entity.x
+            ent.y = entity.y
+
+        if self.interp_delay:
+            ent.push(now, entity.x, entity.y, entity.rotation)
+
+        ent.last_update = now
+        # ent = entity - Don't do this... it causes a weird jumping glitch because of how
+        # python processes the action.
+        self.actors.move_to_end(entity.id)
+
+
+    def add_projectile(self, entity: Projectile) -> None:
+        self.projectiles.spawn(entity.x, entity.y, entity.rotation, entity.duration)
+
+
+    def interpolate(self, now: float) -> None:
+        # interpolate moves every avatar to where it was interp_delay seconds ago.
+        if not self.interp_delay:
+            return
+        for ent in self.actors.values():
+            ent.interpolate(now - self.interp_delay, MAX_EXTRAPOLATION)
+
+
+    def touch(self, id: int, now: float) -> None:
+        # touch marks a player as still playing, without updating it, for when its packet was skipped.
+        ent = self.actors.get(id)
+        if ent is not None:
+            ent.last_update = now
+            self.actors.move_to_end(id)
+
+
+    def expire(self, now: float) -> int:
+        # expire returns how many entities were removed. Only the expired entities at the front are
+        # looked at, everything behind them is newer.
+        expired = 0
+
+        # Removes enemy players that have quit playing.
+        while self.actors and (now - next(iter(self.actors.values())).last_update) > self.actor_timeout:
+            self.actors.popitem(last=False)
+            expired += 1
+
+        # Removes projectiles that have been in the world for over 2 seconds.
+        return expired + self.projectiles.expire(now)
+
+
+# packet_key is the network.Receiver key for entity packets. Only the newest packet from each
+# player is needed, but every projectile is kept, and so is every frame with a projectile in it.
+def packet_key(data: bytes):
+    packet_type = codec.packet_type(data) if data else None
+    if packet_type == Type.Actor:
+        return codec.record_id(data, 0, Type.Actor) # The player's ID.
+    if packet_type == codec.FRAME_TYPE:
+        records = list(codec.records(data))
+        if len(records) == 1 and records[0][0] == Type.Actor:
+            return codec.frame_sender(data)
+    return None
 
 
 # A generator used for reading the game network before each game loop.
-def network_reader(main_player_id: int) -> list:
-    
-    game_state = []
+# catch is where packets are read from, it returns a packet or None when there are no more.
+# If a running network.Receiver is given, packets are taken from it instead of catch.
+# If an interest.Interest is given, frames from far away players are only read some of the time.
+# If a capture.Recorder is given, every packet read is recorded. clock is where the time comes from,
+# a capture.Replay's clock makes a replay run the same way every time.
+def network_reader(main_player_id: int, catch=network.CATCH, receiver=None, actor_timeout: float = ACTOR_TIMEOUT,
+                   interp_delay: float = 0.0, interest=None, recorder=None, clock=time.time) -> GameState:
 
-    while True:
-        for _ in range(255): # Can handle up to 20 players on a network.
-            
-            # Gets an entity from the network
-            data = network.CATCH()
-            if data:
-                entity = object()
-                if data[0] == Type.Actor:
-                    entity = Avatar(0,0,0,0,0,0)
-                elif data[0] == Type.Projectile:
-                    entity = Projectile(0,0,0)
-                else:
-                    print(data)
-                
-                entity.from_bytes(data)
-
-                # Updates enemy player on the game_state
-                if entity.type == Type.Actor and entity.id != main_player_id:
-                    for ent in game_state:
-                        if ent.type == Type.Actor:
-                            if entity.id == ent.id:
-                                # Don't need to update type or id since the never change.
-                                ent.rotation = entity.rotation
-                                ent.x = entity.x
-                                ent.y = entity.y
-                                ent.last_update = time.time()
-                                # ent = entity - Don't do this... it causes a weird jumping glitch because of how
-                                # python processes the action.
-                                break
-
-                    else:
-                        entity.last_update = time.time()
-                        game_state.append(entity)
-
-                if entity.type == Type.Projectile:
-                    entity.rotation += 180
-                    game_state.append(entity)
-
-
-        # Removes enemies that have stopped playing for more than 1 second.
-        for x in range(len(game_state)-1, -1, -1):
-
-            # Remoevs enemy players that have quit playing.
-            if game_state[x].type == Type.Actor:
-                if (time.time() - game_state[x].last_update) > 0.03:
-                    game_state.pop(x)
-                    continue
+    game_state = GameState(actor_timeout, interp_delay)
+    actor_decoder = codec.ActorDecoder()
 
-            # Removes projectiles that have been in the world for over 2 seconds. Updates the position of others
-            if game_state[x].type == Type.Projectile:
-                if (time.time()-game_state[x].duration) > 2.0:
-                    game_state.pop(x)
-                    continue
+    coalesced = 0
 
-        yield game_state
\ No newline at end of file
+    while True:
+        with telemetry.span('network read'):
+            if receiver is not None:
+                packets = receiver.snapshot()
+            else:
+                packets = (catch() for _ in range(255)) # Can handle up to 20 players on a network.
+
+            received, decoded, skipped = 0, 0, 0
+            now = clock()
+            for data in packets:
+
+                # Gets an entity from the network
+                if not data:
+                    continue
+                received += 1
+                if recorder is not None:
+                    recorder.record(data)
+
+                if interest is not None:
+                    sender = interest.skip(data)
+                    if sender is not None:
+                        game_state.touch(sender, now)
+                        skipped += 1
+                        continue
+
+                # A packet can be one entity, or a frame of entities. Packets from other versions of the
+                # game, or that aren't entities, have no records and are skipped.
+                for record_type, offset in codec.records(data):
+                    if record_type == codec.CLAIM_TYPE:
+                        # Someone joining wants the main player's ID. Nonce 0 is a player defending its own.
+                        _, _, id, nonce = codec.CLAIM.unpack_from(data, offset)
+                        if id == main_player_id and nonce != 0:
+                            game_state.challenged = True
+                        continue
+                    if record_type == codec.KILL_TYPE:
+                        if codec.record_id(data, offset, record_type) == main_player_id:
+                            game_state.killed = True
+                        continue
+                    if record_type == Type.Actor:
+                        entity = Avatar(0,0,0,0,0,0)
+                        entity.from_bytes(data, offset)
+                    elif record_type == Type.Projectile:
+                        entity = Projectile(0,0,0)
+                        entity.from_bytes(data, offset)
+                    else: # A compact actor record.
+                        state = actor_decoder.decode(data, offset, record_type)
+                        if state is None: # Its keyframe was lost, keeps the player until the next one.
+                            game_state.touch(codec.record_id(data, offset, record_type), now)
+                            continue
+                        id, rotation, x, y, shiptype = state
+                        entity = Avatar(id, Type.Actor, rotation, x, y, shiptype)
+                    decoded += 1
+
+                    # Updates enemy player on the game_state
+                    if entity.type == Type.Actor and entity.id != main_player_id:
+                        game_state.update_actor(entity, now)
+
+                    if entity.type == Type.Projectile:
+                        entity.rotation += 180
+                        entity.duration = now # Projectiles expire by the reader's clock.
+                        game_state.add_projectile(entity)
+
+            now = clock()
+            expired = game_state.expire(now)
+            game_state.interpolate(now)
+
+        # Counted once per frame rather than per packet, so there's no cost per packet when telemetry is off.
+        if telemetry.enabled:
+            telemetry.count('packets received', received)
+            telemetry.count('records decoded', decoded)
+            telemetry.count('frames skipped', skipped)
+            telemetry.count('entities expired', expired)
+            if receiver is not None:
+                telemetry.count('packets coalesced', receiver.coalesced - coalesced)
+                coalesced = receiver.coalesced
+
+        yield game_state
@@ -0,0 +1,115 @@
+# interest.py is a module used by entity.py and LANSpace.py
+# Its purpose is to spend less time and bandwidth on players far from the main player. A player on
+# the other side of the window can't hit you any sooner than its projectiles get to you, so its
+# position doesn't need to be read, or sent, every tick.
+#
+# Distances are split into tiers, each with a rate: a tier of (300, 1) means players within 300 pixels
+# are read every tick, (600, 2) every 2nd tick up to 600 pixels, and so on. Each tier's rate must
+# divide the next one's, so the ticks a receiver keeps are always ticks the sender sent. With a send
+# rate below the tick rate, every tier's rate is a multiple of the send interval (see world.py), so a
+# player sending every 3rd tick has tiers of 3, 6 and 12 ticks rather than 1, 2 and 4.
+#
+# Receivers: every frame's header says which cell its sender is in (see codec.py). A frame from a far
+# tier is only read on that tier's ticks, the rest are skipped without reading their records, and the
+# sender is only marked as still playing. Frames flagged ALWAYS_READ (projectiles, claims, keyframes)
+# are always read.
+#
+# Senders: a player whose nearest enemy is in a far tier only sends its position on that tier's
+# ticks, since nobody needs it more often. Every player in a match should use the same tiers.
+#
+#
+#
+# Public Interface:
+#   TIERS                                   The default tiers, ((pixels, every nth tick), ...).
+#   Interest(tiers)                         Decides which frames to read and how often to send.
+#   Interest.position                       The main player's (x, y), set it every frame.
+#   Interest.skip(data) -> int              Returns the sender of a frame that can be skipped this tick, or None.
+#   Interest.send_every(x, y, enemies)      Returns every how many ticks the main player should be sent.
+#   Interest.stats() -> dict                Frames, bytes and records read and skipped.
+
+import math, codec
+
+
+TIERS = ((300, 1), (600, 2), (math.inf, 4))
+
+_FRAME_SIZE = codec.FRAME.size
+_FRAME_UNPACK = codec.FRAME.unpack_from
+
+
+class Interest:
+    def __init__(self, tiers: tuple = TIERS) -> None:
+        self.tiers = tuple(sorted(tiers))
+        rates = [rate for _, rate in self.tiers]
+        if any(later % earlier for earlier, later in zip(rates, rates[1:])):
+            raise ValueError('each tier\'s rate must divide the next one\'s, got {}'.format(rates))
+        self._rates = {} # cell_y * 256 + cell_x: rate
+        self._rates_cell = None
+        self.position = None # None reads everything, until the main player has a position.
+
+        self.read = 0
+        self.read_bytes = 0
+        self.skipped = 0
+        self.skipped_bytes = 0
+        self.skipped_records = 0 # Records that didn't need decoding.
+
+
+    def rate(self, distance: float) -> int:
+        # rate returns every how many ticks something distance pixels away is needed.
+        for tier_distance, rate in self.tiers:
+            if distance <= tier_distance:
+                return rate
+        return self.tiers[-1][1]
+
+
+    @property
+    def position(self) -> tuple:
+        return self._position
+
+
+    @position.setter
+    def position(self, position: tuple) -> None:
+        # The rate of every cell is kept until the main player moves to another cell.
+        self._position = position
+        cell = None if position is None else codec.cell(*position)
+        if cell != self._rates_cell:
+            self._rates.clear()
+            self._rates_cell = cell
+
+
+    def skip(self, data) -> int:
+        # skip returns the sender of a frame that isn't needed this tick, or None if it must be read.
+        # It's called for every packet, so it only reads the frame header, and only once.
+        if self._position is None or len(data) < _FRAME_SIZE or data[1] != codec.FRAME_TYPE or data[0] != codec.VERSION:
+            return None
+
+        version, _type, sender, tick, cell_x, cell_y, flags, count = _FRAME_UNPACK(data)
+        if not flags & codec.ALWAYS_READ:
+            rate = self._rates.get(cell_y * 256 + cell_x)
+            if rate is None:
+                rate = self._rates[cell_y * 256 + cell_x] = self._cell_rate(cell_x, cell_y)
+            if tick % rate:
+                self.skipped += 1
+                self.skipped_bytes += len(data)
+                self.skipped_records += count
+                return sender
+
+        self.read += 1
+        self.read_bytes += len(data)
+        return None
+
+
+    def _cell_rate(self, cell_x: int, cell_y: int) -> int:
+        # The distance to the middle of the sender's cell.
+        x = (cell_x + 0.5) * codec.CELL_SIZE
+        y = (cell_y + 0.5) * codec.CELL_SIZE
+        return self.rate(math.hypot(x - self._position[0], y - self._position[1]))
+
+
+    def send_every(self, x: float, y: float, enemies) -> int:
+        nearest = min((math.hypot(enemy.x - x, enemy.y - y) for enemy in enemies), default=0.0)
+        return self.rate(nearest)
+
+
+    def stats(self) -> dict:
+        return {'frames read': self.read, 'frames skipped': self.skipped, 'bytes read': self.read_bytes,
+                'bytes skipped': self.skipped_bytes, 'decodes skipped': self.skipped_records}
@@ -0,0 +1,125 @@
+# join.py is a module used by entity.py
+# Its purpose is to give a player joining the network an ID nobody else has, in well under a second,
+# even when lots of players start at once.
+#
+# It works like the probing IPv4 link-local addresses use:
+#   1. Listen for LISTEN seconds, noting every ID in use (players, frame senders and other claims).
+#   2. Pick a random unused ID, and send PROBES claims for it about PROBE_INTERVAL apart.
+#   3. If nobody objects for DEFEND_WAIT after the last claim, the ID is taken.
+#
+# The ID is lost if another player is seen using it, or another joiner claims it with a lower nonce.
+# The nonce is a random number each joiner picks, so when two joiners want the same ID exactly one
+# of them backs off. The loser waits a random backoff and goes back to step 2 with a new ID.
+#
+# Players already in the game defend their ID by claiming it with nonce 0 when someone else claims
+# it (see entity.network_reader), since a dead player sends nothing else that shows its ID is taken.
+#
+# IDs are random rather than the lowest free one, so players starting together rarely want the same
+# one: out of 65535 IDs, 100 players starting at once have about a 7% chance of any clash at all.
+#
+#
+#
+# Public Interface:
+#   Joiner(send, now, rng=random, max_id=codec.MAX_ID)
+#                               The join protocol for one player, driven by receive() and poll(). IDs
+#                               are picked from 1 to max_id, a test can make it small to force clashes.
+#   join(send, catch) -> int    Runs the join protocol on the network, and returns the ID.
+
+import time, random, network, codec
+
+
+LISTEN = 0.02 # Seconds.
+PROBES = 3
+PROBE_INTERVAL = 0.01 # Seconds between claims, give or take half.
+DEFEND_WAIT = 0.05 # Seconds. A player in the game must have time to read a claim and defend, even at 30 FPS.
+BACKOFF = 0.02 # Seconds, the longest wait after losing an ID.
+
+
+class Joiner:
+    def __init__(self, send, now: float, rng=random, max_id: int = codec.MAX_ID) -> None:
+        self.send = send
+        self.rng = rng
+        self.max_id = max_id
+        self.nonce = rng.randint(1, 0xFFFFFFFF) # 0 is kept for players defending their ID.
+
+        self.used = set() # IDs seen on the network.
+        self.id = None # The ID being claimed, then the ID won.
+        self.done = False
+        self.probes_left = 0
+        self.next_time = now + LISTEN # When poll has something to do next.
+
+        self.claims_sent = 0
+        self.conflicts = 0
+
+
+    def receive(self, data, now: float) -> None:
+        # receive notes the IDs in a packet from the network, and gives up the ID being claimed if it's taken.
+        sender = codec.frame_sender(data)
+        if sender is not None:
+            self._used(sender, now)
+
+        for record_type, offset in codec.records(data):
+            if record_type == codec.CLAIM_TYPE:
+                _, _, id, nonce = codec.CLAIM.unpack_from(data, offset)
+                if nonce == self.nonce:
+                    continue # Our own claim, sent back to us.
+                if id == self.id and nonce > self.nonce:
+                    continue # They back off.
+                self._used(id, now)
+            else:
+                id = codec.record_id(data, offset, record_type)
+                if id is not None:
+                    self._used(id, now)
+
+
+    def poll(self, now: float) -> bool:
+        # poll sends the next claim when it's due, and returns True once the ID is won.
+        if self.done or now < self.next_time:
+            return self.done
+
+        if self.id is None:
+            self.id = self._pick()
+            self.probes_left = PROBES
+
+        if self.probes_left > 0:
+            self.send(codec.encode_claim(self.id, self.nonce))
+            self.claims_sent += 1
+            self.probes_left -= 1
+            if self.probes_left > 0:
+                self.next_time = now + PROBE_INTERVAL * self.rng.uniform(0.5, 1.5)
+            else:
+                self.next_time = now + DEFEND_WAIT
+            return False
+
+        self.done = True
+        return True
+
+
+    def _used(self, id: int, now: float) -> None:
+        self.used.add(id)
+        if id == self.id and not self.done:
+            self.conflicts += 1
+            self.id = None
+            self.next_time = now + self.rng.uniform(0, BACKOFF)
+
+
+    def _pick(self) -> int:
+        if sum(1 for id in self.used if 0 < id <= self.max_id) >= self.max_id:
+            raise RuntimeError('every player ID is in use')
+        while True:
+            id = self.rng.randint(1, self.max_id) # 0 is the ID of a player that hasn't joined.
+            if id not in self.used:
+                return id
+
+
+def join(send=network.BROADCAST, catch=network.CATCH) -> int:
+    joiner = Joiner(send, time.perf_counter())
+    while True:
+        now = time.perf_counter()
+        data = catch()
+        while data:
+            joiner.receive(data, now)
+            data = catch()
+        if joiner.poll(now):
+            return joiner.id
+        time.sleep(0.001) # Sleeps instead of spinning on the socket.
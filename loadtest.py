@@ -0,0 +1,253 @@
+# loadtest.py runs a LANSpace match of simulated players on one machine, with no windows.
+# It replaces opening 20 or 50 real game windows with the "START python LANSpace - x50 Test" batch files.
+#
+# Every bot is its own process running the real entity, simulation and network code over the real
+# network: a simulation.Game with scripted Controls steers it round a circle and clicks fire 4 times a
+# second, with the same fixed timestep, collisions and sending as a player. It reads everyone else's
+# packets, draws the frame to SDL's dummy video driver, and respawns as soon as it's hit. Bots get
+# their IDs from the harness instead of find_id, so they can all start at once.
+#
+# For each player count it reports:
+#   frame time      How long a frame's work took (reading, simulating, sending, drawing), as percentiles.
+#   packets         Datagrams sent and received per second, per bot.
+#   bandwidth       Bytes received per second, per bot, without IP and UDP headers.
+#   cpu             How much of a CPU each bot used, and with --relay how much the relay used.
+#   drop rate       Frames missed from other bots, found from the ticks each sender sent a frame in.
+#   staleness       How old the enemy players on screen were, in milliseconds since their last update.
+#
+# Usage:
+#   python loadtest.py                          20 and 50 players for 10 seconds.
+#   python loadtest.py --players 5 100 --duration 20
+#   python loadtest.py --players 50 --record match.lscap     Also records a 50 player match, see capture.py.
+#   python loadtest.py --players 20 50 100 --no-render --relay    Plays through a relay server, see relay.py.
+#
+# The bots play in match 255 over multicast on 127.0.0.1, so they stay on this machine and out of real games.
+# With --transport broadcast they use port 8080 + match, don't run that on a network with a real game going.
+# With --relay the relay runs in this process, on 127.0.0.1 port RELAY_PORT, while it waits for the bots.
+
+import os, sys, time, math, bisect, argparse, multiprocessing, threading, asyncio
+
+display_size = display_width, display_height = 1080, 700
+FPS = 60
+RELAY_PORT = 8079
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values)-1, int(round(p / 100 * (len(values)-1))))]
+
+
+def bot(id: int, ready, start_at, duration: float, render: bool, transport: dict, record: str, results) -> None:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+    import pygame, network, entity, codec, sprites, capture, simulation
+
+    network.configure(**transport)
+    if hasattr(os, 'nice'):
+        # A real relay has a machine to itself, here it shares one with every bot. Bots are niced peer
+        # to peer too, so both modes are measured the same way.
+        os.nice(10)
+    pygame.init()
+    surface = pygame.display.set_mode(display_size)
+
+    stats = {'in': 0, 'out': 0, 'bytes in': 0}
+    ticks = {} # sender: [first tick, last tick, ticks received]
+    sent_ticks = set() # A tick a bot died in sends nothing, so it isn't a drop.
+
+    def send(data) -> None:
+        network.BROADCAST(data)
+        stats['out'] += 1
+        sent_ticks.add(writer.tick)
+
+    def catch() -> bytes:
+        data = network.CATCH()
+        if data:
+            if codec.packet_type(data) == codec.FRAME_TYPE and len(data) >= codec.FRAME.size:
+                sender, tick, _, _, _, _ = codec.frame_header(data)
+                if sender == id: # Broadcasts come back to the sender too.
+                    return data
+                stats['in'] += 1
+                stats['bytes in'] += len(data)
+                seen = ticks.setdefault(sender, [tick, tick - 1, 0])
+                if tick != seen[1]: # A relay's snapshot can take several frames, a tick counts once.
+                    seen[2] += 1
+                seen[0], seen[1] = min(seen[0], tick), max(seen[1], tick)
+        return data
+
+    # Scripted player: chases a point going round a circle of radius 150 at the game's top speed,
+    # somewhere in the window, with a different start for each bot.
+    centre_x = 200 + (id * 137) % (display_width - 400)
+    centre_y = 200 + (id * 89) % (display_height - 400)
+    player = entity.Player(id, entity.Type.Actor, 0, centre_x + math.cos(id) * 150, centre_y + math.sin(id) * 150, id % 4 + 1)
+    writer = codec.FrameWriter(id, send)
+    game = simulation.Game(player, writer, FPS, width=display_width, height=display_height, relay=transport['kind'] == 'relay')
+    recorder = capture.Recorder(record, id) if record else None
+    reader = entity.network_reader(id, catch, recorder=recorder)
+
+    # The harness sets start_at once every bot is ready, starting 100 processes can take a while.
+    ready.put(id)
+    while start_at.value == 0.0:
+        time.sleep(0.01)
+    time.sleep(max(0.0, start_at.value - time.time()))
+    # Nobody counts until everyone is running, so start up doesn't look like dropped packets.
+    next(reader)
+    stats['in'] = stats['out'] = stats['bytes in'] = 0
+    ticks.clear()
+    sent_ticks.clear()
+
+    frame_times, staleness = [], []
+    peers = 0
+    start = time.time()
+    cpu_start = time.process_time()
+    last_fired = start
+    last_frame = next_frame = time.perf_counter()
+    while time.time() - start < duration:
+        frame_start = time.perf_counter()
+        state = next(reader)
+        now = time.time()
+
+        angle = (now - start) * simulation.Game.velocity / 150 + id
+        target_x = centre_x + math.cos(angle) * 150
+        target_y = centre_y + math.sin(angle) * 150
+        firing = now - last_fired > 0.25
+        if firing:
+            last_fired = now
+        controls = simulation.Controls(target_x - player.x, target_y - player.y, centre_x, centre_y, firing, True)
+        elapsed, last_frame = frame_start - last_frame, frame_start
+        game.update(state, controls, elapsed)
+
+        if render:
+            surface.fill((0, 0, 0))
+            for enemy in state.actors.values():
+                surface.blit(enemy.get_spaceship(), (enemy.x - enemy.size/2, enemy.y - enemy.size/2))
+            for x, y, rotation in state.projectiles.positions():
+                surface.blit(sprites.projectile(rotation), (x - 10.5, y - 10.5))
+            surface.blit(player.get_spaceship(), (player.x - player.size/2, player.y - player.size/2))
+            pygame.display.update()
+
+        frame_times.append(time.perf_counter() - frame_start)
+        peers = max(peers, len(state.actors))
+        if state.actors:
+            staleness.append(sum(now - enemy.last_update for enemy in state.actors.values()) / len(state.actors))
+
+        next_frame += 1 / FPS
+        time.sleep(max(0.0, next_frame - time.perf_counter()))
+
+    elapsed = time.time() - start
+    cpu = (time.process_time() - cpu_start) / elapsed
+    if recorder:
+        recorder.close()
+    results.put({
+        'id': id,
+        'frame_times': frame_times,
+        'staleness': staleness,
+        'in': stats['in'] / elapsed,
+        'out': stats['out'] / elapsed,
+        'bytes in': stats['bytes in'] / elapsed,
+        'cpu': cpu,
+        'ticks': ticks,
+        'sent ticks': sent_ticks,
+        'peers': peers,
+    })
+
+
+def relay_thread(start_at, duration: float, report: dict) -> None:
+    # Runs a relay server until the bots are done, and reports the CPU this process used while they played.
+    import relay
+
+    async def run() -> None:
+        server = relay.Relay(FPS)
+        task = asyncio.ensure_future(relay.serve(server, '127.0.0.1', RELAY_PORT))
+        while start_at.value == 0.0:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(max(0.0, start_at.value - time.time()))
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.sleep(duration)
+        report['cpu'] = (time.process_time() - cpu) / (time.perf_counter() - wall)
+        task.cancel()
+
+    asyncio.run(run())
+
+
+def run(players: int, duration: float, render: bool, transport: dict = {'kind': 'multicast'}, record: str = None) -> dict:
+    # Spawned processes don't inherit the parent's sockets, and it works the same on Windows.
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    ready = context.Queue()
+    start_at = context.Value('d', 0.0)
+
+    relay = {}
+    if transport['kind'] == 'relay':
+        relay_runner = threading.Thread(target=relay_thread, args=(start_at, duration, relay), daemon=True)
+        relay_runner.start()
+
+    processes = [context.Process(target=bot, args=(id, ready, start_at, duration, render, transport, record if id == 1 else None, results)) for id in range(1, players+1)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+    start_at.value = time.time() + 0.5
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if transport['kind'] == 'relay':
+        relay_runner.join()
+
+    frame_times = [t * 1000 for report in reports for t in report['frame_times']]
+    staleness = [s * 1000 for report in reports for s in report['staleness']]
+    # A receiver expects every tick its sender sent a frame in, between the first and last it got.
+    sent_ticks = {report['id']: sorted(report['sent ticks']) for report in reports}
+    expected = received = 0
+    for report in reports:
+        for sender, (first, last, count) in report['ticks'].items():
+            if sender in sent_ticks:
+                sent = bisect.bisect_right(sent_ticks[sender], last) - bisect.bisect_left(sent_ticks[sender], first)
+            else: # The relay, it sends every tick.
+                sent = last - first + 1
+            expected += sent
+            received += min(count, sent)
+    return {
+        'players': players,
+        'frame p50': percentile(frame_times, 50),
+        'frame p95': percentile(frame_times, 95),
+        'frame p99': percentile(frame_times, 99),
+        'in/s': sum(report['in'] for report in reports) / len(reports),
+        'out/s': sum(report['out'] for report in reports) / len(reports),
+        'bytes in/s': sum(report['bytes in'] for report in reports) / len(reports),
+        'cpu': sum(report['cpu'] for report in reports) / len(reports),
+        'relay cpu': relay.get('cpu'),
+        'drop': 1 - received / expected if expected else 0.0,
+        'stale mean': sum(staleness) / len(staleness) if staleness else 0.0,
+        'stale p95': percentile(staleness, 95),
+        'peers seen': min(report['peers'] for report in reports),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Runs a LANSpace match of simulated players, with no windows.')
+    parser.add_argument('--players', type=int, nargs='+', default=[20, 50], help='player counts to test (default: 20 50)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to run each player count for (default: 10)')
+    parser.add_argument('--no-render', action='store_true', help="don't draw frames, only measure the network and simulation")
+    parser.add_argument('--transport', choices=('multicast', 'broadcast'), default='multicast', help='how the bots send packets (default: multicast)')
+    parser.add_argument('--match', type=int, default=255, help="match the bots play in, so they don't join a real game (default: 255)")
+    parser.add_argument('--interface', default='127.0.0.1', help='network interface the bots use (default: 127.0.0.1, this machine only)')
+    parser.add_argument('--relay', action='store_true', help='play through a relay server instead of peer to peer, see relay.py')
+    parser.add_argument('--record', metavar='PATH', help='record what the first bot receives to a capture file, for capture.py (the last player count overwrites the others)')
+    args = parser.parse_args()
+    transport = {'kind': args.transport, 'match': args.match, 'port': 8080, 'interface': args.interface}
+    if args.relay:
+        transport = {'kind': 'relay', 'port': RELAY_PORT, 'interface': '127.0.0.1', 'host': '127.0.0.1'}
+
+    print('players  frame p50  frame p95  frame p99  packets in/s  packets out/s  bytes in/s  drop rate  stale mean  stale p95  peers seen  bot cpu  relay cpu')
+    for players in args.players:
+        r = run(players, args.duration, not args.no_render, transport, args.record)
+        print('{:>7}  {:>7.2f}ms  {:>7.2f}ms  {:>7.2f}ms  {:>12.0f}  {:>13.0f}  {:>10.0f}  {:>8.2%}  {:>8.1f}ms  {:>7.1f}ms  {:>10}  {:>7.1%}  {:>9}'.format(
+            r['players'], r['frame p50'], r['frame p95'], r['frame p99'], r['in/s'], r['out/s'], r['bytes in/s'], r['drop'], r['stale mean'],
+            r['stale p95'], r['peers seen'], r['cpu'], '-' if r['relay cpu'] is None else '{:.1%}'.format(r['relay cpu'])))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,32 @@
-# network.py is custom networking wrapper that provides a simplified API 
+# network.py is custom networking wrapper that provides a simplified API
 # for broadcasting and receiving broadcasts.
 #
+# Packets go out over a transport, either IP multicast or broadcast:
+#   multicast   Sent to a multicast group, only hosts that joined the group get them, and they don't
+#               leave the LAN (TTL 1). Every match has its own group, so several matches can run side
+#               by side without seeing each other's packets. This is the default.
+#   broadcast   Sent to 255.255.255.255, every host on the network gets them whether it plays or not.
+#               It's kept for networks where multicast doesn't work, every match has its own port:
+#               match n uses port + n. So a port's matches take up port to port + 255, and two ports
+#               less than 256 apart share ports, e.g. --port 8081 --match 0 is --port 8080 --match 1.
+#   relay       Sent to a relay server (see relay.py), which sends every player one snapshot of the
+#               match a tick. There's one socket, so the relay can reply to where packets came from.
+#
+# configure() picks the transport, it must be called before the first packet is sent or received,
+# otherwise multicast with the default settings is used. If multicast can't be set up, e.g. there's
+# no network interface it can use, broadcast is used instead.
+#
 # Public API:
-#   network.BROADCAST(byte_list)                Broadcasts the byte list to all devices on teh network, including self.
-#   network.CATCH() -> byte_list      Returns a byte list from a broadcast on the network.
+#   network.BROADCAST(byte_list)                Sends the byte list to every player in the match, including self.
+#   network.CATCH() -> byte_list      Returns a byte list sent by a player in the match, or None.
+#   network.Receiver(key)             Receives packets on a background thread, see Receiver below.
+#   network.configure(...)            Chooses the transport, match, port and network interface.
+#   network.transport() -> Transport  Returns the transport in use.
+#   network.MulticastTransport        Sends to and receives from a multicast group.
+#   network.BroadcastTransport        Sends and receives broadcasts.
+#   network.RelayTransport            Sends to and receives from a relay server.
 #
-import socket
+import socket, select, threading, struct
 
 __60FPS_timeout = 0
 # I set the timeout so low that it wouldn't affect FPS
@@ -15,28 +36,261 @@ socket.setdefaulttimeout(__60FPS_timeout) # The socket will timeout after x seco
 
 
 _PORT = 8080
+_MAX_PACKET = 2048 # Bigger than the largest packet the game sends, a frame of up to 1400 bytes.
+_MULTICAST_PREFIX = '239.255.80.' # Organisation local multicast, match n uses group 239.255.80.n
+_RCVBUF = 1024 * 1024 # A big receive buffer holds several times more frames while the game is busy than the OS default.
+_SNDBUF = 256 * 1024
+
+_transport = None
+
+
+def multicast_group(match: int) -> str:
+    if not 0 <= match <= 255:
+        raise ValueError('match must be between 0 and 255, got {}'.format(match))
+    return _MULTICAST_PREFIX + str(match)
+
+
+# Transport holds the pair of sockets packets are sent and received with. The receive socket is
+# non-blocking, catch() returns None when nothing is waiting.
+class Transport:
+    kind = None
+
+    def __init__(self, address: str, port: int, rcvbuf: int = _RCVBUF, sndbuf: int = _SNDBUF) -> None:
+        self.address = address # Where packets are sent to.
+        self.port = port
+        self.send_dropped = 0 # Packets dropped because the send buffer was full.
+
+        self.send_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM, proto=socket.IPPROTO_UDP)
+        if sndbuf: # None leaves the OS default.
+            self.send_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+
+        self.receive_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM, proto=socket.IPPROTO_UDP)
+        self.receive_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Allows multiple applications to use the same socket.
+        if rcvbuf:
+            self.receive_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+
+
+    def send(self, data: bytes) -> None:
+        try:
+            self.send_socket.sendto(data, (self.address, self.port))
+        except BlockingIOError: # The socket doesn't wait, a full send buffer drops the packet like the network would.
+            self.send_dropped += 1
+
+
+    def catch(self) -> bytes:
+        try:
+            data, address = self.receive_socket.recvfrom(_MAX_PACKET)
+        except: # An exception is needed encase there is a timeout error
+            data = None
+
+        return data # We ignore returning the sending address because it's irrelevant.
+
+
+    def close(self) -> None:
+        self.send_socket.close()
+        self.receive_socket.close()
+
+
+    def stats(self) -> dict:
+        # The buffer sizes are what the OS actually gave, it may cap them (Linux: net.core.rmem_max) or double them.
+        return {'transport': self.kind, 'address': self.address, 'port': self.port,
+                'rcvbuf': self.receive_socket.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+                'sndbuf': self.send_socket.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), 'send dropped': self.send_dropped}
+
+
+class BroadcastTransport(Transport):
+    kind = 'broadcast'
+
+    # address can be a subnet's broadcast address, like 192.168.1.255, to keep to one network.
+    # interface is the IP address of the network interface to send from, 0.0.0.0 lets the OS choose.
+    def __init__(self, port: int = _PORT, address: str = '255.255.255.255', interface: str = '0.0.0.0', rcvbuf: int = _RCVBUF, sndbuf: int = _SNDBUF) -> None:
+        super().__init__(address, port, rcvbuf, sndbuf)
+        self.send_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1) # Sets the socket binding to broadcats mode.
+        if interface != '0.0.0.0':
+            self.send_socket.bind((interface, 0))
+
+        # Broadcasts only arrive at sockets bound to every interface.
+        self.receive_socket.bind(('0.0.0.0', port))
+
+
+class MulticastTransport(Transport):
+    kind = 'multicast'
+
+    # ttl is how many routers packets may cross, 1 keeps them on the LAN. loopback sends packets back
+    # to this machine, it's needed to run more than one player on one machine. interface is the IP
+    # address of the network interface to use, 0.0.0.0 lets the OS choose, 127.0.0.1 keeps the match
+    # on this machine.
+    def __init__(self, group: str = _MULTICAST_PREFIX + '0', port: int = _PORT, ttl: int = 1, loopback: bool = True,
+                 interface: str = '0.0.0.0', rcvbuf: int = _RCVBUF, sndbuf: int = _SNDBUF) -> None:
+        super().__init__(group, port, rcvbuf, sndbuf)
+        try:
+            self.send_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            self.send_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, int(loopback))
+            self.send_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+            # Binding to the group means only its packets arrive, not every group's on the port. Windows
+            # can't bind to a multicast address, and only delivers joined groups anyway.
+            try:
+                self.receive_socket.bind((group, port))
+            except OSError:
+                self.receive_socket.bind(('0.0.0.0', port))
+            membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton(interface))
+            self.receive_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        except OSError:
+            self.close()
+            raise
 
 
-# UDP socket binding for broadcasts.
-__bsocket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM, proto=socket.IPPROTO_UDP)
-__bsocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Allows multiple applications to use the same socket.
-__bsocket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1) # Sets the socket binding to broadcats mode.
+class RelayTransport(Transport):
+    kind = 'relay'
 
+    # host is the relay's address, a relay serves one match so there's no match number. interface is
+    # the IP address of the network interface to send from, 0.0.0.0 lets the OS choose.
+    def __init__(self, host: str, port: int = _PORT, interface: str = '0.0.0.0', rcvbuf: int = _RCVBUF, sndbuf: int = _SNDBUF) -> None:
+        super().__init__(host, port, rcvbuf, sndbuf)
+        # The relay replies to the address packets came from, so they're received on the socket they're sent from.
+        self.receive_socket.close()
+        self.receive_socket = self.send_socket
+        if rcvbuf:
+            self.receive_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.send_socket.bind((interface, 0))
 
-# UDP socket binding for receiving broadcasts.
-__csocket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM, proto=socket.IPPROTO_UDP)
-__csocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Allows multiple applications to use the same socket.
-__csocket.bind(("0.0.0.0", _PORT))
+
+def configure(kind: str = 'multicast', match: int = 0, port: int = _PORT, interface: str = '0.0.0.0', ttl: int = 1,
+              loopback: bool = True, rcvbuf: int = _RCVBUF, sndbuf: int = _SNDBUF, host: str = None) -> Transport:
+    # configure replaces the transport, every player in a match must use the same kind, match and port.
+    # host is the relay server's address, for the relay transport.
+    global _transport
+    if _transport is not None:
+        _transport.close()
+        _transport = None
+
+    if kind == 'relay':
+        _transport = RelayTransport(host or '127.0.0.1', port, interface, rcvbuf, sndbuf)
+        return _transport
+
+    if kind == 'multicast':
+        try:
+            _transport = MulticastTransport(multicast_group(match), port, ttl, loopback, interface, rcvbuf, sndbuf)
+        except OSError as error:
+            print('Multicast is unavailable ({}), using broadcast instead.'.format(error))
+            kind = 'broadcast'
+    if kind == 'broadcast':
+        multicast_group(match) # Checks the match number.
+        if port + match > 65535:
+            raise ValueError('broadcast match {} uses port {}, past the last port 65535'.format(match, port + match))
+        _transport = BroadcastTransport(port + match, interface=interface, rcvbuf=rcvbuf, sndbuf=sndbuf)
+    if _transport is None:
+        raise ValueError('unknown transport {!r}, use multicast, broadcast or relay'.format(kind))
+    return _transport
+
+
+def transport() -> Transport:
+    return _transport or configure()
 
 
 def BROADCAST(data: bytes) -> None:
-    __bsocket.sendto(data, ('255.255.255.255', _PORT))
+    (_transport or configure()).send(data)
 
 
 def CATCH() -> bytes:
-    try:
-        data, address = __csocket.recvfrom(1024)
-    except: # An exception is needed encase there is a timeout error 
-        data = None
+    return (_transport or configure()).catch()
+
+
+def _receive_socket() -> socket.socket:
+    return transport().receive_socket
+
+
+# Receiver drains the socket on its own thread, so packets keep being read while the game loop is busy
+# (window drag, GC, slow blits) instead of piling up in the kernel buffer until they're dropped.
+#
+# key(data) returns what a packet is the latest state of, e.g. a player's ID. Only the newest packet
+# for each key is kept, older ones are coalesced away. Packets with no key (None) are all kept, up to
+# max_queue, after which new ones are dropped. snapshot() hands both back in the order they arrived,
+# so a sender's keyed packet is never read before an older unkeyed one.
+#
+# Only one of CATCH and a running Receiver should be reading the socket at a time.
+class Receiver:
+    def __init__(self, key=None, max_queue: int = 4096) -> None:
+        self.key = key
+        self.max_queue = max_queue
+
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+        self._latest = {} # key: (arrival, data)
+        self._queue = [] # (arrival, data)
+        self._arrivals = 0 # Packets numbered as they arrive, only the receive thread counts them.
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="network.Receiver", daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+    def snapshot(self) -> list:
+        # snapshot returns every packet received since the last snapshot. Swapping the buffers is
+        # all that happens while the lock is held, so the receive thread is never kept waiting.
+        with self._lock:
+            latest, queue = self._latest, self._queue
+            self._latest, self._queue = {}, []
+
+        packets = list(latest.values()) + queue
+        packets.sort()
+        return [data for _, data in packets]
+
+
+    def stats(self) -> dict:
+        return {"received": self.received, "coalesced": self.coalesced, "dropped": self.dropped}
+
+
+    def _run(self) -> None:
+        sock = _receive_socket()
+        while self._running:
+            # Waits for data, but wakes up now and then to see if the receiver was stopped.
+            readable, _, _ = select.select([sock], [], [], 0.1)
+            if not readable:
+                continue
+
+            # Reads everything waiting in one go, so the lock is taken once per batch not per packet.
+            batch = []
+            while True:
+                try:
+                    data, address = sock.recvfrom(_MAX_PACKET)
+                except OSError: # Nothing left to read.
+                    break
+                batch.append(data)
+            self._store(batch)
+
+
+    def _store(self, batch: list) -> None:
+        # The keys are worked out before taking the lock, the game loop may be waiting on it.
+        keyed = []
+        for data in batch:
+            self._arrivals += 1
+            keyed.append((self.key(data) if self.key else None, (self._arrivals, data)))
 
-    return data # We ignore returning the sending address because it's irrelevant.
+        with self._lock:
+            for key, packet in keyed:
+                self.received += 1
+                if key is None:
+                    if len(self._queue) >= self.max_queue:
+                        self.dropped += 1
+                        continue
+                    self._queue.append(packet)
+                else:
+                    if key in self._latest:
+                        self.coalesced += 1
+                    self._latest[key] = packet
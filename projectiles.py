@@ -0,0 +1,148 @@
+# projectiles.py is a module used by entity.py and LANSpace.py
+# Its purpose is to move, expire and hit test every projectile in the world at once, instead of
+# one Projectile object at a time.
+#
+# Projectiles are kept as a struct of arrays: x, y, direction, rotation and spawn time each have
+# their own array, with projectile i at index i of every array. Projectiles only move in straight
+# lines, so the direction is worked out once when they spawn, not every frame.
+#
+# NumPy is used if it's installed, so a frame's work is a handful of array operations. Without it
+# the same arrays are Python lists, which is still faster than the Projectile objects were.
+#
+#
+#
+# Public Interface:
+#   ProjectilePool                  Holds every projectile in the world.
+#   direction(rotation) -> tuple    Returns the unit vector a projectile with the rotation travels along.
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def direction(rotation: float) -> tuple:
+    # Projectiles travel the opposite way to the direction their rotation points.
+    angle = math.radians(-rotation + 90)
+    return -math.cos(angle), -math.sin(angle)
+
+
+class ProjectilePool:
+    def __init__(self, lifetime: float = 2.0, size: int = 21, capacity: int = 256, use_numpy: bool = True) -> None:
+        self.lifetime = lifetime # Seconds before a projectile is removed.
+        self.size = size
+        self.numpy = use_numpy and numpy is not None
+
+        # Projectiles are kept in spawn order, so the ones to expire are always at the front.
+        self.count = 0
+        self.capacity = capacity
+        self.x = self._array(capacity)
+        self.y = self._array(capacity)
+        self.dir_x = self._array(capacity)
+        self.dir_y = self._array(capacity)
+        self.rotation = self._array(capacity)
+        self.spawned = self._array(capacity)
+
+
+    def __len__(self) -> int:
+        return self.count
+
+
+    def spawn(self, x: float, y: float, rotation: float, now: float) -> None:
+        if self.count == self.capacity:
+            self._grow()
+
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.dir_x[i], self.dir_y[i] = direction(rotation)
+        self.rotation[i] = rotation
+        self.spawned[i] = now
+        self.count += 1
+
+
+    def step(self, distance: float) -> None:
+        # step moves every projectile distance pixels along its direction.
+        n = self.count
+        if self.numpy:
+            self.x[:n] += self.dir_x[:n] * distance
+            self.y[:n] += self.dir_y[:n] * distance
+        else:
+            x, y, dir_x, dir_y = self.x, self.y, self.dir_x, self.dir_y
+            for i in range(n):
+                x[i] += dir_x[i] * distance
+                y[i] += dir_y[i] * distance
+
+
+    def expire(self, now: float) -> int:
+        # Removes projectiles that have been in the world for over lifetime seconds, returns how many.
+        n = self.count
+        if self.numpy:
+            expired = int(numpy.searchsorted(self.spawned[:n], now - self.lifetime, side='left'))
+        else:
+            expired = 0
+            while expired < n and (now - self.spawned[expired]) > self.lifetime:
+                expired += 1
+
+        if expired == 0:
+            return 0
+
+        # Shifts the survivors to the front of the arrays.
+        for array in (self.x, self.y, self.dir_x, self.dir_y, self.rotation, self.spawned):
+            array[:n-expired] = array[expired:n]
+        self.count = n - expired
+        return expired
+
+
+    def hits(self, x: float, y: float, size: float) -> bool:
+        # hits returns True if any projectile hits the square of size centred on x, y. It's spatial.hit()'s
+        # rule, a hit is the top left corner of a projectile being inside the square.
+        left, top = x - size/2, y - size/2
+        n = self.count
+        half = self.size / 2
+
+        if self.numpy:
+            px = self.x[:n] - half
+            py = self.y[:n] - half
+            return bool(numpy.any((px > left) & (px < left+size) & (py > top) & (py < top+size)))
+
+        for i in range(n):
+            px = self.x[i] - half
+            py = self.y[i] - half
+            if (px > left and px < left+size) and (py > top and py < top+size):
+                return True
+        return False
+
+
+    def positions(self, offset: float = 0.0) -> list:
+        # positions returns (x, y, rotation) for every projectile, for drawing. offset moves them that
+        # many pixels along their direction, so they can be drawn between simulation ticks.
+        n = self.count
+        if offset == 0.0:
+            if self.numpy:
+                return list(zip(self.x[:n].tolist(), self.y[:n].tolist(), self.rotation[:n].tolist()))
+            return list(zip(self.x[:n], self.y[:n], self.rotation[:n]))
+
+        if self.numpy:
+            x = self.x[:n] + self.dir_x[:n] * offset
+            y = self.y[:n] + self.dir_y[:n] * offset
+            return list(zip(x.tolist(), y.tolist(), self.rotation[:n].tolist()))
+        return [(self.x[i] + self.dir_x[i] * offset, self.y[i] + self.dir_y[i] * offset, self.rotation[i]) for i in range(n)]
+
+
+    def _array(self, capacity: int):
+        if self.numpy:
+            return numpy.zeros(capacity, dtype=numpy.float64)
+        return [0.0] * capacity
+
+
+    def _grow(self) -> None:
+        capacity = self.capacity * 2
+        for name in ('x', 'y', 'dir_x', 'dir_y', 'rotation', 'spawned'):
+            old = getattr(self, name)
+            new = self._array(capacity)
+            new[:self.capacity] = old
+            setattr(self, name, new)
+        self.capacity = capacity
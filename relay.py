@@ -0,0 +1,257 @@
+# relay.py runs a relay server for a LANSpace match, for matches too big for every player to hear
+# every other player. It's optional, with no relay the game stays no-host.
+#
+# Peer to peer, every player gets a datagram from every other player every tick, so N players cost
+# each of them N datagrams a tick. With a relay (LANSpace.py --relay HOST) players send their frames to
+# the relay instead, in the same codec as always, and every tick the relay sends each player one
+# snapshot of the whole match: every player, the projectiles fired since the last tick, and who was hit.
+# A snapshot is one datagram, or a few with more than 90 players (see codec.MAX_FRAME).
+#
+# The relay's world is the one that counts:
+#   movement        A player can't seem to move faster than Game.velocity allows, or leave the window.
+#                   A position that does is pulled back, and the other players see, and are hit at,
+#                   where the relay put it. The player itself isn't told and keeps its own position,
+#                   so this only keeps a teleport or a speed hack from reaching everyone else.
+#   projectiles     Only kept if they're fired from near their owner. The relay moves them, expires
+#                   them and checks them against every player, through a spatial.SpatialHash of them
+#                   rebuilt every tick, so a big match doesn't test every projectile against every player.
+#   collisions      The relay decides who's hit, and puts a kill record in every snapshot until the
+#                   dead player's heartbeat shows it heard, or KILL_TIMEOUT is up. Until then its
+#                   updates are ignored. Players don't check hits themselves in relay mode.
+# Claims (see join.py) are passed straight on to every player, so IDs are found the same way as
+# peer to peer. Players that haven't been heard from for CLIENT_TIMEOUT are forgotten, dead players
+# send a heartbeat so they aren't.
+#
+# Usage:
+#   python relay.py                         Serves a match on port 8080 of every interface.
+#   python relay.py --host 127.0.0.1 --port 8090 --duration 60
+#
+#
+#
+# Public Interface:
+#   Relay(tick_rate)                        The relay's world, driven by receive() and tick().
+#   Relay.receive(data, address, now)       Reads a packet from a player.
+#   Relay.tick(now)                         Runs a tick, and sends every player its snapshot.
+#   serve(relay, host, port, duration)      Runs a relay on a socket with asyncio until duration is up, or forever.
+
+import os, time, math, asyncio, argparse, socket
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1") # entity imports pygame for its sprites, the relay never draws.
+
+from collections import OrderedDict
+import codec, entity, projectiles, simulation, spatial, GMath
+
+
+CLIENT_TIMEOUT = 2.0 # Seconds. Must be longer than Game.relay_heartbeat.
+ACTOR_TIMEOUT = 0.5 # Seconds a player can go unheard before it's left out of snapshots, --send-rate 10 with --interest sends every 0.4.
+KILL_TIMEOUT = 2.0 # Seconds a kill is resent for at most, a player that never answers has probably quit.
+SPAWN_DISTANCE = 80 # Pixels from their owner a projectile can be fired from, the game fires them 40 pixels out.
+SPEED_TOLERANCE = 1.5 # How much faster than Game.velocity a player can seem to move, network jitter bunches updates.
+CHALLENGE_TIME = 1.0 # Seconds a claimed ID can be defended for, see receive().
+RCVBUF = 4 * 1024 * 1024
+
+
+class Relay:
+    def __init__(self, tick_rate: int = 60, width: int = 1080, height: int = 700) -> None:
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.width, self.height = width, height
+        self.sendto = None # sendto(data, address), set once the socket is open.
+
+        self.clients = {} # address: when it was last heard from
+        self.actors = OrderedDict() # id: entity.Avatar, in the order they were last updated
+        self.dead = {} # id: when it was killed, for players that haven't shown they know yet
+        self.challenged = {} # id: when someone joining last claimed it
+        self.projectiles = projectiles.ProjectilePool(lifetime=2.0)
+        self.grid = spatial.SpatialHash() # This tick's projectiles, for the collision pass.
+        self.decoder = codec.ActorDecoder() # For players sending compact actors.
+        self.writer = codec.FrameWriter(0, self._send, always_read=True) # Sender 0, no player has ID 0.
+
+        self.packets_in = 0
+        self.bytes_in = 0
+        self.datagrams_out = 0
+        self.bytes_out = 0
+        self.kills = 0
+        self.corrected = 0 # Player positions pulled back.
+        self.rejected = 0 # Projectiles thrown away.
+
+
+    def receive(self, data, address: tuple, now: float) -> None:
+        self.clients[address] = now
+        self.packets_in += 1
+        self.bytes_in += len(data)
+
+        sender = codec.frame_sender(data)
+        for record_type, offset in codec.records(data):
+            if record_type == codec.CLAIM_TYPE:
+                _, _, id, nonce = codec.CLAIM.unpack_from(data, offset)
+                if nonce == 0:
+                    self.dead.pop(id, None) # It's heard it was killed, see Game.relay_heartbeat.
+                # Claims from joining players go to everyone straight away, so the ID's owner can
+                # defend it in time. So does the owner's defence, nonce 0, but a nonce 0 claim nobody
+                # asked for is a dead player's heartbeat and goes no further.
+                if nonce != 0:
+                    self.challenged[id] = now
+                elif now - self.challenged.get(id, -math.inf) > CHALLENGE_TIME:
+                    continue
+                claim = codec.encode_claim(id, nonce)
+                for client in self.clients:
+                    self._sendto(claim, client)
+
+            elif record_type == entity.Type.Actor:
+                _, id, rotation, x, y, shiptype = codec.decode_actor(data, offset)
+                self._update_actor(id, rotation, x, y, shiptype, now)
+
+            elif record_type == entity.Type.Projectile:
+                _, rotation, x, y = codec.decode_projectile(data, offset)
+                owner = self.actors.get(sender)
+                if owner is None or math.hypot(x - owner.x, y - owner.y) > SPAWN_DISTANCE:
+                    self.rejected += 1
+                    continue
+                self.projectiles.spawn(x, y, rotation + 180, now)
+                self.writer.add_projectile(entity.Projectile(rotation, x, y))
+
+            elif record_type in (codec.ACTOR_KEY_TYPE, codec.ACTOR_DELTA_TYPE):
+                state = self.decoder.decode(data, offset, record_type)
+                if state is not None:
+                    self._update_actor(*state, now)
+                elif codec.record_id(data, offset, record_type) in self.actors: # Its keyframe was lost.
+                    id = codec.record_id(data, offset, record_type)
+                    self.actors[id].last_update = now
+                    self.actors.move_to_end(id)
+
+
+    def _update_actor(self, id: int, rotation: float, x: float, y: float, shiptype: int, now: float) -> None:
+        if id in self.dead: # Sent before it heard it was killed.
+            return
+        rotation = int(round(rotation)) # Compact actors decode to a float, the Actor layout needs a whole number.
+
+        ent = self.actors.get(id)
+        if ent is None:
+            ent = self.actors[id] = entity.Avatar(id, entity.Type.Actor, rotation, x, y, shiptype)
+        else:
+            # Pulls the player back to as far as it could have moved since it was last heard from.
+            reach = simulation.Game.velocity * SPEED_TOLERANCE * (now - ent.last_update) + ent.size
+            distance = math.hypot(x - ent.x, y - ent.y)
+            if distance > reach:
+                self.corrected += 1
+                x = GMath.lerp(ent.x, x, reach / distance)
+                y = GMath.lerp(ent.y, y, reach / distance)
+            ent.rotation = rotation
+
+        border = ent.size / 2
+        ent.x = GMath.clamp(border, self.width - border, x)
+        ent.y = GMath.clamp(border, self.height - border, y)
+        ent.last_update = now
+        self.actors.move_to_end(id)
+
+
+    def tick(self, now: float) -> None:
+        self.projectiles.step(simulation.Game.projs_speed * self.dt)
+        self.projectiles.expire(now)
+
+        # Removes players that stopped sending, then hits every player left with every projectile.
+        while self.actors and now - next(iter(self.actors.values())).last_update > ACTOR_TIMEOUT:
+            self.actors.popitem(last=False)
+        self.grid.clear()
+        for n, (x, y, _) in enumerate(self.projectiles.positions()):
+            self.grid.insert(n, spatial.box(x, y, self.projectiles.size))
+        hit = [id for id, ent in self.actors.items() if self.grid.query(spatial.box(ent.x, ent.y, ent.size))]
+        for id in hit:
+            del self.actors[id]
+            self.dead[id] = now
+            self.kills += 1
+        # Kills go in every snapshot until they're heard, a snapshot can be lost like any datagram.
+        for id, when in list(self.dead.items()):
+            if now - when > KILL_TIMEOUT:
+                del self.dead[id]
+            else:
+                self.writer.add_kill(id)
+
+        for address, heard in list(self.clients.items()):
+            if now - heard > CLIENT_TIMEOUT:
+                del self.clients[address]
+        if len(self.challenged) > 1024:
+            self.challenged = {id: when for id, when in self.challenged.items() if now - when < CHALLENGE_TIME}
+
+        # The snapshot, this tick's projectiles and kills are already in the writer.
+        for ent in self.actors.values():
+            self.writer.add_actor(ent)
+        self.writer.flush()
+
+
+    def _send(self, frame) -> None:
+        # Every player gets the same snapshot, so it's only packed once.
+        for client in self.clients:
+            self._sendto(frame, client)
+
+
+    def _sendto(self, data, address: tuple) -> None:
+        self.sendto(data, address)
+        self.datagrams_out += 1
+        self.bytes_out += len(data)
+
+
+    def stats(self) -> dict:
+        return {'clients': len(self.clients), 'players': len(self.actors), 'projectiles': len(self.projectiles),
+                'packets in': self.packets_in, 'bytes in': self.bytes_in, 'datagrams out': self.datagrams_out,
+                'bytes out': self.bytes_out, 'kills': self.kills, 'corrected': self.corrected, 'rejected': self.rejected}
+
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, relay: Relay) -> None:
+        self.relay = relay
+
+    def datagram_received(self, data: bytes, address: tuple) -> None:
+        self.relay.receive(data, address, time.time())
+
+    def error_received(self, error: Exception) -> None:
+        pass # A player that quit, the OS tells us with an ICMP port unreachable.
+
+
+async def serve(relay: Relay, host: str = '0.0.0.0', port: int = 8080, duration: float = None, stats_interval: float = None) -> None:
+    # serve returns once duration is up, it runs forever without one.
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(lambda: _Protocol(relay), local_addr=(host, port))
+    transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+    relay.sendto = transport.sendto
+
+    # Ticks a wakeup was late for are run together, up to the clock's max_ticks, past that they're dropped.
+    clock = simulation.FixedTimestep(relay.tick_rate)
+    start = last = loop.time()
+    next_stats = start
+    try:
+        while duration is None or loop.time() - start < duration:
+            await asyncio.sleep(max(0.0, relay.dt - clock.accumulator - (loop.time() - last)))
+            now = loop.time()
+            for _ in clock.ticks(now - last):
+                relay.tick(time.time())
+            last = now
+
+            if stats_interval and loop.time() >= next_stats:
+                next_stats += stats_interval
+                print(relay.stats(), flush=True)
+    finally:
+        transport.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Runs a relay server for a LANSpace match, players join it with LANSpace.py --relay HOST.')
+    parser.add_argument('--host', default='0.0.0.0', help='IP address to serve on (default: every interface)')
+    parser.add_argument('--port', type=int, default=8080, help='UDP port to serve on (default: 8080)')
+    parser.add_argument('--tick-rate', type=int, default=60, help='snapshots sent per second (default: 60)')
+    parser.add_argument('--duration', type=float, help='quit after this many seconds')
+    parser.add_argument('--stats', type=float, default=10, metavar='SECONDS', help='print stats this often, 0 for never (default: 10)')
+    args = parser.parse_args()
+
+    relay = Relay(args.tick_rate)
+    start = time.process_time(), time.perf_counter()
+    try:
+        asyncio.run(serve(relay, args.host, args.port, args.duration, args.stats))
+    except KeyboardInterrupt:
+        pass
+    print(relay.stats())
+    print('CPU {:.0%}'.format((time.process_time() - start[0]) / (time.perf_counter() - start[1])))
+
+
+if __name__ == '__main__':
+    main()
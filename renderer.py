@@ -0,0 +1,79 @@
+# renderer.py is a module used by LANSpace.py
+# Its purpose is to only clear and update the parts of the window that changed, instead of filling
+# and updating the whole 1080x700 window every frame when only a few dozen small sprites moved.
+#
+# Every blit goes through the Renderer, which remembers the rect it covered. Next frame those rects
+# are cleared back to the background, and only last frame's rects and this frame's rects are sent to
+# the display. If that adds up to more than threshold of the window, or there are more than max_rects
+# rects, it's cheaper to do the lot, so the whole window is cleared and updated instead.
+#
+# Anything drawn straight onto the window surface, instead of through Renderer.blit, won't be cleared.
+#
+#
+#
+# Public Interface:
+#   Renderer(surface)           Draws onto surface, normally the window from pygame.display.set_mode().
+#   Renderer.begin()            Clears last frame's sprites, call it at the start of every frame.
+#   Renderer.blit(image, pos)   Same as Surface.blit, and remembers the rect it drew.
+#   Renderer.present()          Updates the display with what changed since last frame.
+#   Renderer.invalidate()       Redraws and updates the whole window next frame, e.g. after the window was covered.
+
+import pygame
+
+
+class Renderer:
+    def __init__(self, surface, background: tuple = (0, 0, 0), threshold: float = 0.5, max_rects: int = 150, dirty: bool = True) -> None:
+        self.surface = surface
+        self.background = background
+        self.threshold = threshold # Share of the window, above it the whole window is updated.
+        self.max_rects = max_rects # Rects per frame, above it clearing them one by one is slower than clearing the window.
+        self.dirty = dirty # False updates the whole window every frame, like the game used to.
+
+        # Rects are cleared by copying from a background surface, which is quicker than filling them.
+        self.clear_surface = pygame.Surface(surface.get_size())
+        self.clear_surface.fill(background)
+        if pygame.display.get_surface() is not None:
+            self.clear_surface = self.clear_surface.convert(surface)
+
+        self.area = surface.get_width() * surface.get_height()
+        self.previous = [] # Rects drawn last frame.
+        self.current = [] # Rects drawn this frame.
+        self.full = True # The first frame has to draw everything.
+
+        self.pixels_pushed = 0 # Pixels sent to the display last frame.
+        self.full_updates = 0
+        self.dirty_updates = 0
+
+
+    def begin(self) -> None:
+        if self.full or not self.dirty or len(self.previous) > self.max_rects:
+            self.surface.fill(self.background)
+        else:
+            self.surface.blits([(self.clear_surface, rect, rect) for rect in self.previous], doreturn=False)
+
+
+    def blit(self, image, position):
+        rect = self.surface.blit(image, position)
+        self.current.append(rect)
+        return rect
+
+
+    def present(self) -> None:
+        rects = self.previous + self.current
+        pixels = sum(rect.width * rect.height for rect in rects)
+
+        if self.full or not self.dirty or pixels > self.area * self.threshold or len(rects) > self.max_rects * 2:
+            pygame.display.update()
+            self.pixels_pushed = self.area
+            self.full_updates += 1
+        else:
+            pygame.display.update(rects)
+            self.pixels_pushed = pixels
+            self.dirty_updates += 1
+
+        self.previous, self.current = self.current, []
+        self.full = False
+
+
+    def invalidate(self) -> None:
+        self.full = True
@@ -0,0 +1,191 @@
+# simulation.py is a module used by LANSpace.py
+# Its purpose is to run the game's simulation at a fixed tick rate, whatever rate frames are drawn at.
+# Movement used to be so many pixels per frame, so below 60 FPS everything moved slower, and players
+# at different frame rates disagreed about where projectiles were and who they hit.
+#
+# Every frame adds the time it took to an accumulator, and the simulation steps once for every whole
+# tick in it. Speeds are in pixels per second and every tick moves things by speed * dt, so a tick
+# does the same thing on every machine. What's left in the accumulator, as a fraction of a tick, is
+# how far between the last two ticks the frame is drawn, so movement stays smooth when frames and
+# ticks don't line up.
+#
+# After a long stall (loading, dragging the window) the simulation doesn't try to catch up on every
+# missed tick at once, only max_ticks of them, or the catching up would stall the next frame too.
+#
+#
+#
+# Public Interface:
+#   FixedTimestep(rate)                 Ticks rate times per second.
+#   FixedTimestep.ticks(elapsed)        Adds elapsed seconds, yields the number of each tick to run.
+#   FixedTimestep.alpha                 How far between the last tick and the next one the frame is, 0 to 1.
+#   FixedTimestep.time                  Seconds of simulation run so far.
+#   move(player, dir_x, dir_y, speed, dt, width, height)
+#                                       Moves the player along a direction, kept inside the window.
+#   Controls                            What the user is pressing, read once a frame.
+#   Game(player, frame_writer, ...)     The main player's side of the game: moving, firing, dying and sending.
+#                                       With relay on, the relay server decides who's hit, see relay.py.
+#   Game.update(entities, controls, elapsed)
+#                                       Runs the ticks due after elapsed seconds.
+
+import math, GMath, entity, telemetry
+from collections import namedtuple
+
+
+class FixedTimestep:
+    def __init__(self, rate: int = 60, max_ticks: int = 5) -> None:
+        self.rate = rate
+        self.dt = 1 / rate # Seconds per tick.
+        self.max_ticks = max_ticks # Ticks run in one frame at most.
+        self.accumulator = 0.0
+        self.tick = 0
+
+
+    @property
+    def alpha(self) -> float:
+        return self.accumulator / self.dt
+
+
+    @property
+    def time(self) -> float:
+        return self.tick * self.dt
+
+
+    def ticks(self, elapsed: float):
+        self.accumulator = min(self.accumulator + elapsed, self.dt * self.max_ticks)
+        while self.accumulator >= self.dt:
+            self.accumulator -= self.dt
+            self.tick += 1
+            yield self.tick
+
+
+def move(player, dir_x: float, dir_y: float, speed: float, dt: float, width: int, height: int) -> None:
+    if dir_x != 0 or dir_y != 0:
+        dir_x, dir_y = GMath.normalize(dir_x, dir_y)
+        player.x += dir_x * speed * dt
+        player.y += dir_y * speed * dt
+
+    # Checks player position is not illegal, if it is then the player is moved back inside the window.
+    border_offset = player.size / 2
+    player.x = GMath.clamp(border_offset, width - border_offset, player.x)
+    player.y = GMath.clamp(border_offset, height - border_offset, player.y)
+
+
+Controls = namedtuple('Controls', 'dir_x dir_y mouse_x mouse_y firing respawn')
+
+
+# Game runs the main player's simulation one tick at a time, against the game state from network_reader.
+# It doesn't draw anything, so it can run in the window's process or a worker process, see world.py.
+class Game:
+    velocity = 600 # Pixels per second, speeds are per second so they don't depend on the frame or tick rate.
+    projs_speed = 900 # If projectile speed is too low, the player will kill themself.
+    firerate = 0.05
+    proj_max_count = 5
+    reload_time = 0.5
+    relay_heartbeat = 0.5 # Seconds between heartbeats to a relay while dead, so it keeps sending to us.
+
+    def __init__(self, player, frame_writer, tick_rate: int = 60, send_ticks: int = 1, interest_manager=None,
+                 width: int = 1080, height: int = 700, relay: bool = False) -> None:
+        self.player = player
+        self.frame_writer = frame_writer
+        self.send_ticks = send_ticks # The player position is sent every send_ticks ticks.
+        self.interest_manager = interest_manager
+        self.width, self.height = width, height
+        self.relay = relay
+
+        self.clock = FixedTimestep(tick_rate)
+        self.dt = self.clock.dt
+        self.alive = True
+        self.previous_x, self.previous_y = player.x, player.y # Where the player was the tick before, for drawing between ticks.
+
+        self.last_fired = 0.0 # Simulation time.
+        self.proj_cur_count = 0
+        self.last_reload = 0.0
+
+
+    def update(self, entities, controls: Controls, elapsed: float) -> None:
+        # Respawn player
+        if controls.respawn: self.alive = True
+
+        for tick in self.clock.ticks(elapsed):
+            telemetry.count('ticks')
+            self.tick(entities, controls)
+
+        if self.interest_manager:
+            self.interest_manager.position = (self.player.x, self.player.y) # For reading the next frame's packets.
+
+
+    def tick(self, entities, controls: Controls) -> None:
+        player, frame_writer, clock, dt = self.player, self.frame_writer, self.clock, self.dt
+        projectiles = entities.projectiles
+
+        # Player logic below! ----------------------------------------------------------------------------------------------------------------
+        with telemetry.span('player'):
+            self.previous_x, self.previous_y = player.x, player.y
+            if self.alive:
+                move(player, controls.dir_x, controls.dir_y, self.velocity, dt, self.width, self.height)
+
+                # Player rotation based on mouse position
+                rel_x = controls.mouse_x - player.x
+                rel_y = controls.mouse_y - player.y
+
+                # 180 is the offset angle to make the rotation between 0-360, otherwise it would be between -180 - 180
+                angle = math.degrees(-math.atan2(rel_y, rel_x))+180
+                # Offset to make player face cursor 270, can't use -90 because it could make a negative number.
+                player.rotation = int(angle)+270
+
+        # End of player logic! --------------------------------------------------------------------------------------------------------------
+
+        # Moves every projectile at once
+        with telemetry.span('projectiles'):
+            projectiles.step(self.projs_speed * dt)
+
+        # Findout if player has been hit
+        with telemetry.span('collision'):
+            died = False
+            if self.relay:
+                if entities.killed:
+                    entities.killed = False
+                    died, self.alive = self.alive, False
+            elif projectiles.hits(player.x, player.y, player.size):
+                self.alive = False
+
+        # A joining player asked for our ID, tells them it's taken.
+        if entities.challenged:
+            entities.challenged = False
+            frame_writer.add_claim(player.id, 0)
+
+        # Broadcast player position, it's sent with the rest of the tick's entities in one frame. The
+        # interest tiers already count in send_ticks, see world.py.
+        send_every = self.send_ticks
+        if self.interest_manager:
+            send_every = self.interest_manager.send_every(player.x, player.y, entities.actors.values())
+        if self.alive and frame_writer.tick % send_every == 0:
+            frame_writer.add_actor(player)
+        # Using a delayed broadcast only inceases the player limit by about 3-5, it's not worth it.
+
+        # A dead player sends nothing else, the relay forgets players it doesn't hear from. The first is
+        # sent straight away, it tells the relay we heard we were killed.
+        if self.relay and not self.alive and (died or frame_writer.tick % max(1, round(self.relay_heartbeat / dt)) == 0):
+            frame_writer.add_claim(player.id, 0)
+
+        # Projectile Logic ------------------------------------------------------------------------------------------------------------------
+
+        if controls.firing and (clock.time-self.last_reload) > self.reload_time and (clock.time-self.last_fired) > self.firerate and self.alive:
+            self.last_fired = clock.time
+            self.proj_cur_count += 1
+
+            # Creates projectile
+            front_of_ship_x = player.x + (math.cos(math.radians(-player.rotation+90)) * 40)
+            front_of_ship_y = player.y + (math.sin(math.radians(-player.rotation+90)) * 40)
+            proj = entity.Projectile(player.rotation, front_of_ship_x, front_of_ship_y)
+            frame_writer.add_projectile(proj)
+
+            if self.proj_cur_count == self.proj_max_count:
+                self.last_reload = clock.time
+                self.proj_cur_count = 0
+
+        # Projectile Logic ------------------------------------------------------------------------------------------------------------------
+
+        # Sends everything the player did this tick as one frame.
+        with telemetry.span('network send'):
+            frame_writer.flush()
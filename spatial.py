@@ -0,0 +1,112 @@
+# spatial.py is a module used by relay.py for collision queries between many entities.
+# Its purpose is to only test entities that are near each other, instead of every entity against every other.
+#
+# The window is split into a grid of square cells, and every entity is listed in each cell its rect
+# touches. A query only looks at the entities listed in the cells its rect covers. Cells are as big
+# as the biggest entity (a 42 pixel spaceship), so an entity is in at most 4 cells.
+#
+# Every hit in the game follows hit(): obj2 hits obj1 if obj2's top left corner is strictly inside obj1.
+# The only hits the game has are projectiles hitting ships, so there's no all pairs broad phase, a
+# ship or a projectile is never tested against its own kind.
+#
+#
+#
+# Public Interface:
+#   SpatialHash                         The grid, rebuilt with clear()/insert() or kept up to date with update().
+#   SpatialHash.query(rect) -> list     Returns the keys of every entity that hits rect.
+#   hit(rect1, rect2) -> bool           Returns True if rect2 hits rect1. A rect is (left, top, width, height).
+#   box(x, y, size) -> tuple            Returns the rect of a square entity centred on x, y.
+
+
+def box(x: float, y: float, size: float) -> tuple:
+    return (x - size/2, y - size/2, size, size)
+
+
+def hit(rect1, rect2: tuple) -> bool:
+    # The game's one hit rule, rect2 hits rect1 if rect2's top left corner is strictly inside rect1. It's
+    # one way round, a projectile hits a ship but the ship doesn't hit the projectile.
+    left, top, width, height = rect1
+    return (rect2[0] > left and rect2[0] < left+width) and (rect2[1] > top and rect2[1] < top+height)
+
+
+class SpatialHash:
+    def __init__(self, cell_size: int = 42) -> None:
+        self.cell_size = cell_size
+        self.cells = {} # (column, row): [key, ...]
+        self.rects = {} # key: (left, top, width, height)
+        self._spans = {} # key: the cells the key is listed in, as (first column, first row, last column, last row)
+
+
+    def __len__(self) -> int:
+        return len(self.rects)
+
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.rects.clear()
+        self._spans.clear()
+
+
+    def insert(self, key, rect: tuple) -> None:
+        # insert adds an entity. The key can be anything hashable, e.g. a player ID.
+        span = self._span(rect)
+        self.rects[key] = rect
+        self._spans[key] = span
+        for cell in self._cells(span):
+            self.cells.setdefault(cell, []).append(key)
+
+
+    def remove(self, key) -> None:
+        span = self._spans.pop(key)
+        del self.rects[key]
+        for cell in self._cells(span):
+            keys = self.cells[cell]
+            keys.remove(key)
+            if not keys:
+                del self.cells[cell]
+
+
+    def update(self, key, rect: tuple) -> None:
+        # update moves an entity, or inserts it if it's new. The cells are only touched if the entity
+        # moved into a different cell, which most frames it hasn't.
+        if key not in self.rects:
+            self.insert(key, rect)
+            return
+
+        span = self._span(rect)
+        self.rects[key] = rect
+        if span != self._spans[key]:
+            for cell in self._cells(self._spans[key]):
+                keys = self.cells[cell]
+                keys.remove(key)
+                if not keys:
+                    del self.cells[cell]
+            self._spans[key] = span
+            for cell in self._cells(span):
+                self.cells.setdefault(cell, []).append(key)
+
+
+    def query(self, rect: tuple) -> list:
+        # query returns the keys of every entity that hits rect, in the order they were first seen.
+        found = []
+        seen = set()
+        for cell in self._cells(self._span(rect)):
+            for key in self.cells.get(cell, ()):
+                if key not in seen:
+                    seen.add(key)
+                    if hit(rect, self.rects[key]):
+                        found.append(key)
+        return found
+
+
+    def _span(self, rect: tuple) -> tuple:
+        cell_size = self.cell_size
+        left, top, width, height = rect
+        return (int(left // cell_size), int(top // cell_size), int((left+width) // cell_size), int((top+height) // cell_size))
+
+
+    def _cells(self, span: tuple):
+        first_column, first_row, last_column, last_row = span
+        for column in range(first_column, last_column+1):
+            for row in range(first_row, last_row+1):
+                yield (column, row)
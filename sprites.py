@@ -0,0 +1,117 @@
+# sprites.py is a module used by entity.py
+# Its purpose is to pre-render every rotation of the game's sprites, so drawing a spaceship or
+# projectile is a table lookup and a blit instead of a copy, scale, rotate and subsurface per frame.
+#
+# Frames are rendered lazily the first time an angle is drawn, or all at once with prebuild().
+#
+#
+#
+# Public Interface:
+#   resolution                      Degrees between each pre-rendered frame, set before drawing.
+#   memory_budget                   Max bytes all atlases may use. Frames past the budget aren't kept.
+#   SpriteAtlas                     Holds the pre-rotated frames of one image at one size.
+#   atlas(path, size)               Returns the shared SpriteAtlas for an image and size.
+#   spaceship(shiptype, rotation)   Returns the spaceship surface for the ship type and rotation.
+#   projectile(rotation)            Returns the projectile surface for the rotation.
+#   prebuild()                      Renders every frame of the game's sprites ahead of time.
+#   memory_used() -> int            Returns the bytes used by all the atlases.
+
+import pygame, assets
+
+
+SPACESHIP_SIZE = 42
+PROJECTILE_SIZE = 21
+
+resolution = 1 # 1 degree = 360 frames per sprite. 2 degrees halves the memory and start up time.
+memory_budget = 16 * 1024 * 1024 # 16MB, the game's 5 sprites at 1 degree need about 11MB.
+
+_atlases = {}
+_memory_used = 0
+
+
+class SpriteAtlas:
+    def __init__(self, path: str, size: int, step: float) -> None:
+        self.path = path
+        self.size = size
+
+        # The step is adjusted so the frames evenly divide a full rotation.
+        self.count = max(1, int(round(360 / step)))
+        self.step = 360 / self.count
+
+        self.image = None
+        self.frames = [None] * self.count
+
+
+    def frame_bytes(self) -> int:
+        # Every frame is a 32bit size by size surface.
+        return self.size * self.size * 4
+
+
+    def get(self, rotation: float):
+        # get returns the pre-rendered frame nearest to the rotation. Rotation can be any number of degrees.
+        index = int(round(rotation / self.step)) % self.count
+
+        frame = self.frames[index]
+        if frame is None:
+            frame = self._render(index * self.step)
+
+            # Frames over the memory budget are still drawn, just not kept.
+            global _memory_used
+            if _memory_used + self.frame_bytes() <= memory_budget:
+                self.frames[index] = frame
+                _memory_used += self.frame_bytes()
+
+        return frame
+
+
+    def build(self) -> None:
+        for index in range(self.count):
+            self.get(index * self.step)
+
+
+    def _render(self, angle: float):
+        # Every frame is rotated from the one scaled image to prevent noise damage from rotating
+        # an already rotated frame.
+        if self.image is None:
+            self.image = assets.image(self.path, (self.size, self.size))
+
+        # To make the sprite rotate on its center, I used a reference:
+        # https://www.pygame.org/wiki/RotateCenter?parent=CookBook
+        rect = self.image.get_rect().copy()
+        rotated = pygame.transform.rotate(self.image, angle)
+        rect.center = rotated.get_rect().center
+
+        # copy() so the frame doesn't keep the larger rotated surface alive.
+        frame = rotated.subsurface(rect).copy()
+
+        # Matching the display's pixel format makes every blit of the frame far faster.
+        if pygame.display.get_surface() is not None:
+            frame = frame.convert_alpha()
+
+        return frame
+
+
+def atlas(path: str, size: int) -> SpriteAtlas:
+    key = (path, size)
+    if key not in _atlases:
+        _atlases[key] = SpriteAtlas(path, size, resolution)
+    return _atlases[key]
+
+
+def spaceship(shiptype: int, rotation: float, size: int = SPACESHIP_SIZE):
+    return atlas('assets/spaceship/{}.png'.format(shiptype), size).get(rotation)
+
+
+def projectile(rotation: float, size: int = PROJECTILE_SIZE):
+    return atlas('assets/projectile.png', size).get(rotation)
+
+
+def prebuild() -> None:
+    # prebuild renders every frame of the game's sprites, so there are no render spikes mid game.
+    for shiptype in range(1, 5):
+        atlas('assets/spaceship/{}.png'.format(shiptype), SPACESHIP_SIZE).build()
+    atlas('assets/projectile.png', PROJECTILE_SIZE).build()
+
+
+def memory_used() -> int:
+    return _memory_used
@@ -0,0 +1,166 @@
+# telemetry.py is a module used by LANSpace.py and entity.py
+# Its purpose is to show where each frame's time goes, and to count what the network code is doing.
+#
+# Timing spans go around each phase of a frame, and counters count things like packets received.
+# Both can be shown on screen as an overlay, and written to a Chrome trace file for offline analysis
+# (open it in chrome://tracing or https://ui.perfetto.dev).
+#
+# When telemetry is disabled, span() hands back one shared object that does nothing, and count()
+# returns straight away, so the instrumentation can stay in the hot paths.
+#
+#
+#
+# Public Interface:
+#   enabled                 True while spans and counters are being recorded.
+#   enable(on)              Turns recording on or off.
+#   span(name)              Context manager that times the code inside it, e.g. with telemetry.span('render'):
+#   count(name, n)          Adds n to a counter for the current frame.
+#   end_frame()             Ends the current frame, call it once per game loop.
+#   averages() -> dict      Returns each span's average ms and each counter's average per frame.
+#   draw_overlay(surface)   Draws the averages in the top left corner of a surface, or a renderer.Renderer.
+#   start_trace(path)       Starts writing every frame to a Chrome trace file, rolled over every max_frames.
+#   stop_trace()            Finishes the trace file.
+
+import time, json, os
+from collections import defaultdict, deque
+
+
+enabled = False
+HISTORY = 60 # Frames the overlay averages over.
+
+_spans = defaultdict(float) # name: seconds this frame
+_counters = defaultdict(int) # name: count this frame
+_history = deque(maxlen=HISTORY) # (frame seconds, spans, counters) of past frames
+_frame_start = time.perf_counter()
+
+_trace = None # The open trace file
+_trace_path = None
+_trace_frames = 0
+_trace_max_frames = 0
+_trace_events = []
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        end = time.perf_counter()
+        _spans[self.name] += end - self.start
+        if _trace is not None:
+            _trace_events.append({'name': self.name, 'ph': 'X', 'ts': self.start * 1e6, 'dur': (end - self.start) * 1e6, 'pid': os.getpid(), 'tid': 0})
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(on: bool = True) -> None:
+    global enabled, _frame_start
+    enabled = on
+    _spans.clear()
+    _counters.clear()
+    _frame_start = time.perf_counter()
+
+
+def span(name: str):
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    if enabled:
+        _counters[name] += n
+
+
+def end_frame() -> None:
+    global _frame_start, _trace_frames
+    if not enabled:
+        return
+
+    now = time.perf_counter()
+    _history.append((now - _frame_start, dict(_spans), dict(_counters)))
+
+    if _trace is not None:
+        _trace_events.append({'name': 'counters', 'ph': 'C', 'ts': now * 1e6, 'pid': os.getpid(), 'tid': 0, 'args': dict(_counters)})
+        for event in _trace_events:
+            _trace.write(json.dumps(event) + ',\n')
+        _trace_events.clear()
+
+        _trace_frames += 1
+        if _trace_frames >= _trace_max_frames:
+            _roll_trace()
+
+    _spans.clear()
+    _counters.clear()
+    _frame_start = now
+
+
+def averages() -> dict:
+    frames = len(_history)
+    if frames == 0:
+        return {}
+
+    result = {'frame ms': sum(frame for frame, _, _ in _history) / frames * 1000}
+    totals = defaultdict(float)
+    for _, spans, counters in _history:
+        for name, seconds in spans.items():
+            totals[name + ' ms'] += seconds * 1000
+        for name, n in counters.items():
+            totals[name] += n
+    for name, total in sorted(totals.items()):
+        result[name] = total / frames
+    return result
+
+
+def draw_overlay(surface) -> None:
+    import text as text_cache
+
+    y = 5
+    for name, value in averages().items():
+        text = text_cache.render('{}: {:.2f}'.format(name, value), 14, (0, 255, 0))
+        surface.blit(text, (5, y))
+        y += 16
+
+
+def start_trace(path: str, max_frames: int = 3600) -> None:
+    # The trace is rolled over every max_frames frames (a minute at 60 FPS): the finished file is moved
+    # to path + '.1', so there's always at least the last max_frames frames on disk.
+    global _trace_path, _trace_max_frames
+    _trace_path = path
+    _trace_max_frames = max_frames
+    _open_trace()
+    enable()
+
+
+def stop_trace() -> None:
+    global _trace
+    if _trace is not None:
+        _trace.close() # Chrome's trace format allows the array to be left unclosed.
+        _trace = None
+
+
+def _open_trace() -> None:
+    global _trace, _trace_frames
+    _trace = open(_trace_path, 'w')
+    _trace.write('[\n')
+    _trace_frames = 0
+
+
+def _roll_trace() -> None:
+    stop_trace()
+    os.replace(_trace_path, _trace_path + '.1')
+    _open_trace()
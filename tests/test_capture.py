@@ -0,0 +1,74 @@
+# Records a few frames and replays them, they must come back in order at the times they were recorded.
+
+import time
+import pytest
+import capture, codec, entity
+
+
+def frames(count: int) -> list:
+    sent = []
+    writer = codec.FrameWriter(7, lambda view: sent.append(bytes(view)))
+    for n in range(count):
+        writer.add_actor(entity.Avatar(7, entity.Type.Actor, 0, 100 + n, 300, 1))
+        writer.flush()
+    return sent
+
+
+def test_replay_keeps_order_and_times(tmp_path):
+    path = str(tmp_path / 'test.lscap')
+    recorder = capture.Recorder(path, player=7)
+    sent = frames(4)
+    recorded_at = []
+    for data in sent:
+        recorded_at.append(time.perf_counter() - recorder.perf_start)
+        recorder.record(data)
+        time.sleep(0.02)
+    recorder.close()
+
+    replay = capture.Replay(path)
+    assert replay.player == 7
+    assert replay.start == recorder.start
+    replayed = []
+    while not replay.done:
+        data = replay.catch()
+        if data is None:
+            replay.advance(0.001)
+        else:
+            replayed.append((data, replay.offset))
+    replay.close()
+
+    assert [data for data, _ in replayed] == sent
+    for (_, offset), at in zip(replayed, recorded_at):
+        assert at <= offset < at + 0.01 # Out on the first millisecond step after it was recorded, give or take a busy machine.
+
+
+def test_replay_reads_as_the_recording_player(tmp_path):
+    # The player's own frames are in its capture, the replay mustn't show them as another ship.
+    path = str(tmp_path / 'test.lscap')
+    recorder = capture.Recorder(path, player=7)
+    for data in frames(2):
+        recorder.record(data)
+    recorder.close()
+
+    replay = capture.Replay(path)
+    replay.advance(1)
+    reader = entity.network_reader(replay.player, replay.catch, clock=replay.time)
+    assert 7 not in next(reader).actors
+    replay.close()
+
+
+def test_format_1_replays_as_player_0(tmp_path):
+    path = tmp_path / 'old.lscap'
+    data = frames(1)[0]
+    path.write_bytes(capture.HEADER_V1.pack(capture.MAGIC, 1, 1000.0) + capture.RECORD.pack(0, len(data)) + data)
+    replay = capture.Replay(str(path))
+    assert (replay.player, replay.start) == (0, 1000.0)
+    assert replay.catch() == data
+    replay.close()
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.lscap'
+    path.write_bytes(b'not a capture at all')
+    with pytest.raises(ValueError):
+        capture.Replay(str(path))
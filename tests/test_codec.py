@@ -0,0 +1,140 @@
+# Round trips every record type in codec.py through records(), as single packets and in frames.
+
+import codec, entity
+
+
+def frames(*adds, compact=False) -> list:
+    # frames returns the datagrams a FrameWriter sends for one tick, after calling each add on it.
+    sent = []
+    writer = codec.FrameWriter(9, lambda view: sent.append(bytes(view)), compact=compact)
+    for add in adds:
+        add(writer)
+    writer.flush()
+    return sent
+
+
+def test_actor_packet():
+    actor = entity.Avatar(65535, entity.Type.Actor, 359, -20, -700, 4)
+    data = codec.encode_actor(actor)
+    assert list(codec.records(data)) == [(entity.Type.Actor, 0)]
+    assert codec.decode_actor(data) == (entity.Type.Actor, 65535, 359, -20, -700, 4)
+    assert codec.record_id(data, 0, entity.Type.Actor) == 65535
+
+
+def test_projectile_packet():
+    projectile = entity.Projectile(630, -15, 2**31 - 1)
+    data = codec.encode_projectile(projectile)
+    assert list(codec.records(data)) == [(entity.Type.Projectile, 0)]
+    assert codec.decode_projectile(data) == (entity.Type.Projectile, 630, -15, 2**31 - 1)
+    assert codec.record_id(data, 0, entity.Type.Projectile) is None
+
+
+def test_claim_packet():
+    data = codec.encode_claim(1234, 0xFFFFFFFF)
+    assert list(codec.records(data)) == [(codec.CLAIM_TYPE, 0)]
+    assert codec.CLAIM.unpack_from(data) == (codec.VERSION, codec.CLAIM_TYPE, 1234, 0xFFFFFFFF)
+    assert codec.record_id(data, 0, codec.CLAIM_TYPE) == 1234
+
+
+def test_frame_of_every_record():
+    actor = entity.Avatar(9, entity.Type.Actor, 90, -5, 710, 2)
+    projectile = entity.Projectile(45, -40, -1)
+    sent = frames(lambda w: w.add_actor(actor), lambda w: w.add_projectile(projectile),
+                  lambda w: w.add_claim(9, 0), lambda w: w.add_kill(300))
+    assert len(sent) == 1
+    data = sent[0]
+
+    assert codec.frame_sender(data) == 9
+    sender, tick, cell_x, cell_y, flags, count = codec.frame_header(data)
+    assert (sender, tick, count) == (9, 0, 4)
+    assert (cell_x, cell_y) == (0, 11) # Negative positions are in the first cell.
+    assert flags & codec.ALWAYS_READ
+
+    records = list(codec.records(data))
+    assert [record_type for record_type, _ in records] == [entity.Type.Actor, entity.Type.Projectile, codec.CLAIM_TYPE, codec.KILL_TYPE]
+    (_, actor_at), (_, projectile_at), (_, claim_at), (_, kill_at) = records
+    assert codec.decode_actor(data, actor_at) == (entity.Type.Actor, 9, 90, -5, 710, 2)
+    assert codec.decode_projectile(data, projectile_at) == (entity.Type.Projectile, 45, -40, -1)
+    assert codec.CLAIM.unpack_from(data, claim_at)[2:] == (9, 0)
+    assert codec.record_id(data, kill_at, codec.KILL_TYPE) == 300
+
+
+def test_compact_records():
+    actor = entity.Avatar(9, entity.Type.Actor, 180, 500, 300, 3)
+    encoder = codec.ActorEncoder()
+    decoder = codec.ActorDecoder()
+
+    def send(now):
+        layout, values = encoder.encode(actor, now)
+        data = layout.pack(*values)
+        (record_type, offset), = codec.records(data)
+        return record_type, decoder.decode(data, offset, record_type)
+
+    assert send(0.0) == (codec.ACTOR_KEY_TYPE, (9, 180.0, 500, 300, 3))
+    actor.x, actor.y, actor.rotation = 400, 427, 90 # Deltas of -100, 127 and -90 degrees.
+    assert send(0.02) == (codec.ACTOR_DELTA_TYPE, (9, 90.0, 400, 427, 3))
+    actor.x = 0 # Too far for a delta.
+    assert send(0.04) == (codec.ACTOR_KEY_TYPE, (9, 90.0, 0, 427, 3))
+
+
+def test_idle_heartbeats_are_keyframes():
+    actor = entity.Avatar(9, entity.Type.Actor, 0, 500, 300, 1)
+    encoder = codec.ActorEncoder()
+    assert encoder.encode(actor, 0.0)[0] is codec.ACTOR_KEY
+    assert encoder.encode(actor, 0.05) is None
+    assert encoder.encode(actor, codec.HEARTBEAT_INTERVAL)[0] is codec.ACTOR_KEY
+
+
+def test_lost_keyframe_keeps_the_player():
+    # The sender moves for a second and a half, then stands still. Its keyframe at one second is lost,
+    # so the deltas after it can't be decoded, but the player must stay on the reader's screen.
+    actor = entity.Avatar(9, entity.Type.Actor, 0, 500, 300, 1)
+    packets = []
+    writer = codec.FrameWriter(9, lambda view: packets.append(bytes(view)), compact=True)
+    clock = [0.0]
+    reader = entity.network_reader(1, catch=lambda: packets.pop(0) if packets else None,
+                                   actor_timeout=entity.COMPACT_ACTOR_TIMEOUT, clock=lambda: clock[0])
+
+    visible, lost = 0, 0
+    for frame in range(180):
+        clock[0] = frame / 60
+        if clock[0] < 1.5:
+            actor.x = 500 + frame % 20
+        keyframes = writer.encoder.keyframes
+        writer.add_actor(actor, clock[0])
+        writer.flush()
+        if writer.encoder.keyframes > keyframes and clock[0] >= 1.0 and not lost:
+            packets.clear()
+            lost += 1
+        visible += 9 in next(reader).actors
+    assert lost == 1
+    assert visible == 180
+
+
+def test_frames_split_at_max_size():
+    actors = [entity.Avatar(n, entity.Type.Actor, 0, n, n, 1) for n in range(200)]
+    sent = frames(*(lambda w, actor=actor: w.add_actor(actor) for actor in actors))
+    assert len(sent) > 1
+    assert all(len(data) <= codec.MAX_FRAME for data in sent)
+    ids = [codec.decode_actor(data, offset)[1] for data in sent for _, offset in codec.records(data)]
+    assert ids == list(range(200))
+
+
+def test_truncated_frames():
+    actor = entity.Avatar(9, entity.Type.Actor, 90, 5, 7, 2)
+    data = frames(lambda w: w.add_actor(actor), lambda w: w.add_projectile(entity.Projectile(0, 1, 2)))[0]
+    for length in range(len(data)):
+        truncated = data[:length]
+        records = list(codec.records(truncated))
+        # Only the records that fit whole are read.
+        expected = [entity.Type.Actor] if length >= codec.FRAME.size + codec.ACTOR.size else []
+        assert [record_type for record_type, _ in records] == expected
+    assert codec.frame_header(data[:codec.FRAME.size - 1]) is None
+
+
+def test_other_versions_and_types_are_skipped():
+    data = bytearray(codec.encode_actor(entity.Avatar(1, entity.Type.Actor, 0, 0, 0, 1)))
+    data[0] = codec.VERSION + 1
+    assert list(codec.records(data)) == []
+    assert list(codec.records(bytes([codec.VERSION, 200, 0, 0]))) == []
+    assert list(codec.records(b'')) == []
@@ -0,0 +1,39 @@
+# Checks interest management's send and read schedules line up, with and without a send rate.
+
+import math
+import pytest
+import codec, entity, interest, simulation
+
+
+def play(send_ticks: int, ticks: int = 120) -> list:
+    # play returns the frames a player sends for ticks ticks, with an enemy in its far tier.
+    tiers = tuple((distance, rate * send_ticks) for distance, rate in zip((300, 600, math.inf), (1, 2, 4)))
+    sent = []
+    player = entity.Player(3, entity.Type.Actor, 0, 100, 100, 1)
+    game = simulation.Game(player, codec.FrameWriter(3, lambda view: sent.append(bytes(view))), send_ticks=send_ticks,
+                           interest_manager=interest.Interest(tiers))
+    entities = entity.GameState()
+    entities.actors[9] = entity.Avatar(9, entity.Type.Actor, 0, 1000, 650, 1)
+    controls = simulation.Controls(0, 0, 0, 0, False, False)
+    for _ in range(ticks):
+        game.tick(entities, controls)
+    return sent, tiers
+
+
+@pytest.mark.parametrize('send_ticks', [1, 2, 3])
+def test_far_reader_reads_every_frame_sent(send_ticks):
+    sent, tiers = play(send_ticks)
+    far_rate = tiers[-1][1]
+    assert [codec.frame_header(data)[1] for data in sent] == list(range(0, 120, far_rate))
+
+    reader = interest.Interest(tiers)
+    reader.position = (1000, 650)
+    read = [data for data in sent if reader.skip(data) is None]
+    assert read == sent
+
+
+def test_rates_must_divide():
+    with pytest.raises(ValueError):
+        interest.Interest(((300, 3), (600, 2), (math.inf, 4)))
+    with pytest.raises(ValueError):
+        interest.Interest(((300, 2), (600, 3), (math.inf, 6)))
@@ -0,0 +1,56 @@
+# Replays a jittery packet trace through GameState's interpolation, the same trace as
+# benchmark.py interpolation: an enemy flies in a circle at 200 pixels a second and sends at 20Hz,
+# each packet arrives 5-35ms late and 5% are lost. It's drawn at 60 FPS for 10s.
+
+import math, random
+import entity
+
+
+def truth(t: float) -> tuple:
+    return 540 + 200 * math.cos(t), 350 + 200 * math.sin(t)
+
+
+def replay(interp_delay: float) -> tuple:
+    # replay returns (stutters, errors), a stutter is a frame where the ship didn't move and an error is
+    # how far a frame drew it from where it really was interp_delay ago.
+    rng = random.Random(1)
+    arrivals = []
+    for n in range(10 * 20):
+        sent = n / 20
+        if rng.random() >= 0.05:
+            arrivals.append((sent + 0.005 + rng.random() * 0.03, sent))
+    arrivals.sort(reverse=True)
+
+    state = entity.GameState(actor_timeout=1.0, interp_delay=interp_delay)
+    stutters, errors, last = 0, [], None
+    for frame in range(10 * 60):
+        now = frame / 60
+        while arrivals and arrivals[-1][0] <= now:
+            _, sent = arrivals.pop()
+            x, y = truth(sent)
+            state.update_actor(entity.Avatar(1, entity.Type.Actor, 0, x, y, 1), now)
+        state.expire(now)
+        state.interpolate(now)
+
+        avatar = state.actors.get(1)
+        if avatar is None: # Nothing has arrived yet.
+            continue
+        position = (avatar.x, avatar.y)
+        if last is not None and math.dist(position, last) < 0.01:
+            stutters += 1
+        last = position
+        errors.append(math.dist(position, truth(now - interp_delay)))
+    return stutters, errors
+
+
+def test_interpolation_is_smooth():
+    stutters, errors = replay(entity.INTERP_DELAY)
+    assert stutters <= 12 # Of about 600 frames.
+    assert sum(errors) / len(errors) < 8
+    assert max(errors) < 20
+
+
+def test_without_interpolation_stutters():
+    # Drawing every update where it lands holds the ship still for two frames of every three.
+    stutters, _ = replay(0.0)
+    assert stutters > 300
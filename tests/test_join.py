@@ -0,0 +1,69 @@
+# 100 players start at the same moment, with 20 already playing, on a simulated LAN with 0.2-2ms of
+# latency. Every player must end up with a different ID, and none of the playing players' IDs.
+
+import heapq, random
+import codec, entity, join
+
+
+PLAYING = set(range(1, 21))
+# The longest a claim for one ID takes, its probes at their longest apart then the wait for a defence.
+ROUND = (join.PROBES - 1) * join.PROBE_INTERVAL * 1.5 + join.DEFEND_WAIT
+MARGIN = 0.02 # Network latency and the simulation's 0.5ms steps.
+
+
+def simulate(loss: float, max_id: int, seed: int = 1) -> tuple:
+    # simulate returns (joiners, seconds each took) once every joiner has an ID.
+    rng = random.Random(seed)
+    deliveries = [] # (arrival time, order, receiver, data)
+    order = 0
+    now = 0.0
+
+    def broadcast(data) -> None:
+        nonlocal order
+        for receiver in range(len(joiners)):
+            if rng.random() >= loss:
+                order += 1
+                heapq.heappush(deliveries, (now + rng.uniform(0.0002, 0.002), order, receiver, bytes(data)))
+
+    writers = [codec.FrameWriter(id, broadcast) for id in sorted(PLAYING)]
+    joiners = [join.Joiner(broadcast, 0.0, rng, max_id) for _ in range(100)]
+    finished = {}
+
+    while len(finished) < len(joiners):
+        assert now < 5, 'joining never finished'
+        while deliveries and deliveries[0][0] <= now:
+            _, _, receiver, data = heapq.heappop(deliveries)
+            joiners[receiver].receive(data, now)
+        if int(now * 1000) % 16 == 0: # The players already in the game send a frame every 16ms.
+            for writer in writers:
+                writer.add_actor(entity.Actor(writer.sender, entity.Type.Actor, 0, 100, 100, 1))
+                writer.flush()
+        for n, joiner in enumerate(joiners):
+            if n not in finished and joiner.poll(now):
+                finished[n] = now
+        now += 0.0005
+    return joiners, list(finished.values())
+
+
+def check(joiners: list, times: list, rounds: int = 1) -> None:
+    # rounds is how many IDs a joiner may have to claim, it backs off before each one after the first.
+    ids = [joiner.id for joiner in joiners]
+    assert len(set(ids)) == len(ids), 'two players joined with the same ID'
+    assert not set(ids) & PLAYING, 'a player joined with an ID in use'
+    assert max(times) < join.LISTEN + rounds * ROUND + (rounds - 1) * join.BACKOFF + MARGIN # About 0.1s a round.
+
+
+def test_join():
+    check(*simulate(0.0, codec.MAX_ID))
+
+
+def test_join_with_loss():
+    check(*simulate(0.05, codec.MAX_ID))
+
+
+def test_join_clashing():
+    # With only 150 IDs for 120 players, joiners keep wanting the same ones.
+    joiners, times = simulate(0.05, 150)
+    check(joiners, times, rounds=2)
+    assert sum(joiner.conflicts for joiner in joiners) > 0
+    assert all(joiner.id <= 150 for joiner in joiners)
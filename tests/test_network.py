@@ -0,0 +1,90 @@
+# Tests for network.py.
+
+import time
+import pytest
+import codec, entity, network
+
+
+PORT = 8093 # Not the game's port, so a game running on this machine doesn't get in the way.
+
+
+def frame(sender: int, *entities) -> bytes:
+    sent = []
+    writer = codec.FrameWriter(sender, lambda view: sent.append(bytes(view)))
+    for ent in entities:
+        if ent.type == entity.Type.Actor:
+            writer.add_actor(ent)
+        else:
+            writer.add_projectile(ent)
+    writer.flush()
+    return sent[0]
+
+
+def test_receiver_keeps_arrival_order():
+    # A frame with a projectile isn't coalesced, a frame with only the player is. The newer position
+    # must still be read last.
+    older = frame(4, entity.Avatar(4, entity.Type.Actor, 0, 100, 300, 1), entity.Projectile(0, 100, 260))
+    newer = frame(4, entity.Avatar(4, entity.Type.Actor, 0, 110, 300, 1))
+    receiver = network.Receiver(entity.packet_key)
+    receiver._store([older, newer])
+    assert receiver.snapshot() == [older, newer]
+
+    receiver._store([older, newer])
+    reader = entity.network_reader(1, receiver=receiver, clock=lambda: 0.0)
+    assert next(reader).actors[4].x == 110
+
+
+def test_receiver_coalesces_and_drops():
+    first = frame(4, entity.Avatar(4, entity.Type.Actor, 0, 100, 300, 1))
+    other = frame(5, entity.Avatar(5, entity.Type.Actor, 0, 500, 300, 1))
+    last = frame(4, entity.Avatar(4, entity.Type.Actor, 0, 120, 300, 1))
+    projectiles = [frame(6, entity.Projectile(0, n, 0)) for n in range(3)]
+    receiver = network.Receiver(entity.packet_key, max_queue=2)
+    receiver._store([first, projectiles[0], other, projectiles[1], last, projectiles[2]])
+    assert receiver.snapshot() == [projectiles[0], other, projectiles[1], last]
+    assert receiver.stats() == {'received': 6, 'coalesced': 1, 'dropped': 1}
+    assert receiver.snapshot() == []
+
+
+def receive(transport, timeout: float = 1.0) -> list:
+    # receive returns what arrives at the transport within timeout, waiting for the first packet.
+    packets = []
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        data = transport.catch()
+        if data is None:
+            if packets:
+                break
+            time.sleep(0.005)
+            continue
+        packets.append(data)
+    return packets
+
+
+def test_multicast_matches_are_separate():
+    try:
+        a1 = network.MulticastTransport(network.multicast_group(1), PORT, interface='127.0.0.1')
+        a2 = network.MulticastTransport(network.multicast_group(1), PORT, interface='127.0.0.1')
+        b = network.MulticastTransport(network.multicast_group(2), PORT, interface='127.0.0.1')
+    except OSError as error:
+        pytest.skip('multicast is unavailable: {}'.format(error))
+    try:
+        a1.send(b'match 1')
+        a1_got = receive(a1)
+        if not a1_got:
+            pytest.skip('multicast loopback is unavailable')
+        assert a1_got == [b'match 1']
+        assert receive(a2) == [b'match 1']
+
+        b.send(b'match 2')
+        assert receive(b) == [b'match 2']
+        assert receive(a1, 0.1) == receive(a2, 0.1) == [] # Nothing from the other match, nor anything left over.
+        assert b.catch() is None
+    finally:
+        for transport in (a1, a2, b):
+            transport.close()
+
+
+def test_broadcast_port_range_is_checked():
+    with pytest.raises(ValueError):
+        network.configure('broadcast', match=10, port=65530)
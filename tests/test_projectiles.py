@@ -0,0 +1,33 @@
+# Checks ProjectilePool gives the same answers with NumPy arrays as with Python lists.
+
+import random
+import pytest
+import projectiles
+
+
+@pytest.mark.skipif(projectiles.numpy is None, reason='NumPy is not installed')
+def test_numpy_matches_lists():
+    rng = random.Random(1)
+    pools = [projectiles.ProjectilePool(use_numpy=True), projectiles.ProjectilePool(use_numpy=False)]
+    assert pools[0].numpy and not pools[1].numpy
+
+    now, hits = 0.0, 0
+    for frame in range(600):
+        now += rng.uniform(0.005, 0.03)
+        for _ in range(rng.randint(0, 6)): # Enough to grow past the starting capacity.
+            x, y, rotation = rng.uniform(0, 1080), rng.uniform(0, 700), rng.uniform(0, 360)
+            for pool in pools:
+                pool.spawn(x, y, rotation, now)
+        distance = rng.uniform(5, 25)
+        x, y, size = rng.uniform(0, 1080), rng.uniform(0, 700), rng.choice((21, 42))
+
+        results = []
+        for pool in pools:
+            pool.step(distance)
+            expired = pool.expire(now)
+            results.append((expired, len(pool), pool.hits(x, y, size), pool.positions(), pool.positions(7.5)))
+        assert results[0] == results[1]
+        hits += results[0][2]
+
+    assert len(pools[0]) > 256
+    assert hits > 0
@@ -0,0 +1,88 @@
+# Drives a relay.Relay by hand, without a socket.
+
+import time, asyncio
+import codec, entity, relay
+
+
+def snapshot(sent: list) -> list:
+    # snapshot returns the records of the last tick's datagrams, as (record type, id or None).
+    return [(record_type, codec.record_id(data, offset, record_type))
+            for data in sent for record_type, offset in codec.records(data)]
+
+
+def make_relay():
+    server = relay.Relay(tick_rate=60)
+    sent = []
+    server.sendto = lambda data, address: sent.append(bytes(data))
+    return server, sent
+
+
+def test_projectile_kills_player():
+    server, sent = make_relay()
+    server.receive(codec.encode_actor(entity.Avatar(5, entity.Type.Actor, 0, 300, 300, 1)), ('a', 1), 0.0)
+    server.receive(codec.encode_actor(entity.Avatar(6, entity.Type.Actor, 0, 700, 300, 1)), ('b', 1), 0.0)
+    server.projectiles.spawn(300, 310, 0, 0.0) # Moves 15 pixels up to 300, 295 in the tick.
+    server.tick(0.01)
+    records = snapshot(sent)
+    assert (codec.KILL_TYPE, 5) in records
+    assert (entity.Type.Actor, 5) not in records
+    assert (entity.Type.Actor, 6) in records
+    assert server.kills == 1
+
+
+def test_kill_is_resent_until_heard():
+    server, sent = make_relay()
+    player = codec.encode_actor(entity.Avatar(5, entity.Type.Actor, 0, 300, 300, 1))
+    server.receive(player, ('a', 1), 0.0)
+    server.projectiles.spawn(300, 310, 0, 0.0)
+    server.tick(0.01)
+
+    # The player hasn't heard, so its updates are ignored and every snapshot kills it again.
+    for n in range(1, 10):
+        sent.clear()
+        server.receive(player, ('a', 1), n / 60)
+        server.tick(n / 60 + 0.01)
+        assert snapshot(sent).count((codec.KILL_TYPE, 5)) == 1
+        assert (entity.Type.Actor, 5) not in snapshot(sent)
+
+    # Its heartbeat says it knows, then it respawns.
+    server.receive(codec.encode_claim(5, 0), ('a', 1), 0.2)
+    server.receive(player, ('a', 1), 0.21)
+    sent.clear()
+    server.tick(0.22)
+    assert (codec.KILL_TYPE, 5) not in snapshot(sent)
+    assert (entity.Type.Actor, 5) in snapshot(sent)
+    assert server.kills == 1
+
+
+def test_kill_is_resent_until_timeout():
+    server, sent = make_relay()
+    server.receive(codec.encode_actor(entity.Avatar(5, entity.Type.Actor, 0, 300, 300, 1)), ('a', 1), 0.0)
+    server.projectiles.spawn(300, 310, 0, 0.0)
+    server.tick(0.01)
+    sent.clear()
+    server.tick(relay.KILL_TIMEOUT + 0.02)
+    assert (codec.KILL_TYPE, 5) not in snapshot(sent)
+    assert server.dead == {}
+
+
+def served_ticks(stall: float, duration: float = 0.5) -> int:
+    # served_ticks returns how many ticks serve ran in duration, with the event loop stalled for stall seconds part way.
+    server, _ = make_relay()
+    ticks = []
+    server.tick = ticks.append
+
+    async def run():
+        async def stall_loop():
+            await asyncio.sleep(0.2)
+            time.sleep(stall) # Blocks the loop, like a burst of packets would.
+        asyncio.ensure_future(stall_loop())
+        await relay.serve(server, '127.0.0.1', 0, duration)
+    asyncio.run(run())
+    return len(ticks)
+
+
+def test_serve_catches_up_late_ticks():
+    expected = 0.5 * 60
+    assert abs(served_ticks(0.06) - expected) <= 2 # 3.6 ticks late, all run.
+    assert abs(served_ticks(0.2) - (expected - 12 + 5)) <= 2 # 12 late, the first 5 run.
@@ -0,0 +1,70 @@
+# Plays the same scripted input through simulation.Game at different frame rates, with a jittery frame
+# time, and checks every tick comes out the same. Before the fixed timestep movement was per frame, so
+# a 30 FPS player covered half the distance of a 60 FPS one.
+
+import random
+import codec, entity, simulation
+
+
+SEGMENT_TICKS = 45 # The keys held change every 45 ticks.
+STEERING = ((1, 0), (1, 1), (0, 1), (-1, 0))
+
+
+class RecordingGame(simulation.Game):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.trajectory = [] # (tick, x, y, rotation, alive, projectile positions) after every tick.
+
+    def tick(self, entities, controls: simulation.Controls) -> None:
+        super().tick(entities, controls)
+        player = self.player
+        self.trajectory.append((self.clock.tick, player.x, player.y, player.rotation, self.alive, entities.projectiles.positions()))
+
+
+def play(fps: int) -> tuple:
+    # play returns (trajectory, frames sent) for 4 segments of input drawn at about fps.
+    sent = []
+    player = entity.Player(1, entity.Type.Actor, 0, 540, 350, 1)
+    game = RecordingGame(player, codec.FrameWriter(1, lambda view: sent.append(bytes(view))))
+    entities = entity.GameState()
+    rng = random.Random(fps)
+
+    for segment, (dir_x, dir_y) in enumerate(STEERING):
+        # An enemy fires across the window at the start of every segment.
+        entities.projectiles.spawn(60, 100 + segment * 150, 270, game.clock.time)
+        controls = simulation.Controls(dir_x, dir_y, 900, 100, True, False)
+        end = (segment + 1) * SEGMENT_TICKS
+        while game.clock.tick < end:
+            elapsed = rng.uniform(0.8, 1.2) / fps
+            # The last frame of a segment stops on its last tick, so input changes at the same tick whatever the frame rate.
+            remaining = (end - game.clock.tick) * game.dt - game.clock.accumulator
+            if elapsed >= remaining:
+                elapsed = remaining + 1e-9
+            game.update(entities, controls, elapsed)
+    return game.trajectory, sent
+
+
+def test_same_at_every_frame_rate():
+    trajectory, sent = play(60)
+    assert [tick for tick, *_ in trajectory] == list(range(1, len(STEERING) * SEGMENT_TICKS + 1))
+    assert len(sent) == len(trajectory)
+    assert trajectory[-1][1:3] != (540, 350) # The player moved.
+    assert any(projectiles for *_, projectiles in trajectory)
+    for fps in (30, 144):
+        assert play(fps) == (trajectory, sent)
+
+
+def test_relay_kill_is_answered_straight_away():
+    # A player killed by the relay sends a heartbeat on the same tick, so the relay stops resending the kill.
+    sent = []
+    player = entity.Player(7, entity.Type.Actor, 0, 540, 350, 1)
+    game = simulation.Game(player, codec.FrameWriter(7, lambda view: sent.append(bytes(view))), relay=True)
+    entities = entity.GameState()
+    controls = simulation.Controls(0, 0, 0, 0, False, False)
+    game.update(entities, controls, game.dt * 3)
+    entities.killed = True
+    sent.clear()
+    game.update(entities, controls, game.dt)
+    assert not game.alive
+    assert [codec.CLAIM.unpack_from(data, offset)[2:] for data in sent
+            for record_type, offset in codec.records(data) if record_type == codec.CLAIM_TYPE] == [(7, 0)]
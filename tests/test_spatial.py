@@ -0,0 +1,64 @@
+# Checks SpatialHash finds the same hits as testing every entity with spatial.hit().
+
+import random
+import projectiles, spatial
+
+
+def scatter(count: int, seed: int = 1) -> list:
+    # scatter returns the rects of ships and projectiles spread over the window.
+    rng = random.Random(seed)
+    return [spatial.box(rng.uniform(0, 1080), rng.uniform(0, 700), 42 if n % 4 == 0 else 21) for n in range(count)]
+
+
+def naive_query(rects: dict, area: tuple) -> list:
+    return sorted(key for key, rect in rects.items() if spatial.hit(area, rect))
+
+
+def test_query_finds_every_hit():
+    rects = dict(enumerate(scatter(500)))
+    grid = spatial.SpatialHash()
+    for key, rect in rects.items():
+        grid.insert(key, rect)
+    found = 0
+    for area in scatter(100, seed=2) + [(100, 50, 300, 20), (0, 0, 1080, 700)]: # Squares, a wide rect and the whole window.
+        expected = naive_query(rects, area)
+        assert sorted(grid.query(area)) == expected
+        found += len(expected)
+    assert found > 500
+
+
+def test_update_matches_a_rebuild():
+    grid = spatial.SpatialHash()
+    for key, rect in enumerate(scatter(300)):
+        grid.update(key, rect)
+    moved = {key: (left + 37, top - 55, width, height) for key, (left, top, width, height) in enumerate(scatter(300, seed=3))}
+    for key, rect in moved.items():
+        grid.update(key, rect)
+    grid.remove(0)
+    del moved[0]
+    assert len(grid) == 299
+
+    rebuilt = spatial.SpatialHash()
+    for key, rect in moved.items():
+        rebuilt.insert(key, rect)
+    for area in scatter(100, seed=4):
+        assert sorted(grid.query(area)) == sorted(rebuilt.query(area)) == naive_query(moved, area)
+
+
+def test_query_agrees_with_projectile_pool():
+    # The relay finds hits with a grid of its projectiles, players find them with ProjectilePool.hits.
+    pool = projectiles.ProjectilePool(use_numpy=False)
+    rng = random.Random(3)
+    for _ in range(200):
+        pool.spawn(rng.uniform(0, 1080), rng.uniform(0, 700), rng.uniform(0, 360), 0.0)
+    grid = spatial.SpatialHash()
+    for n, (x, y, _) in enumerate(pool.positions()):
+        grid.insert(n, spatial.box(x, y, pool.size))
+
+    found = 0
+    for left, top, size, _ in scatter(300, seed=4):
+        x, y = left + size/2, top + size/2
+        hit = pool.hits(x, y, 42)
+        assert bool(grid.query(spatial.box(x, y, 42))) == hit
+        found += hit
+    assert found
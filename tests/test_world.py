@@ -0,0 +1,157 @@
+# Checks the snapshot seqlock between the worker's _Publisher and the window's RemoteWorld, and that
+# the worker quits when the window's process is killed.
+
+import os, sys, json, signal, struct, types, argparse, subprocess
+import pytest
+import codec, entity, simulation, world
+
+
+PORT = 8094 # Not the game's port, so a game running on this machine doesn't get in the way.
+PIN = world.PIN
+
+
+def shared():
+    # shared returns a publisher, and a window reading from the same memory, a bytearray instead of shared memory.
+    buf = memoryview(bytearray(world.SIZE))
+    PIN.pack_into(buf, world.PIN_OFFSET, world.NO_PIN)
+    remote = world.RemoteWorld(types.SimpleNamespace(buf=buf), None, argparse.Namespace(tick_rate=60))
+    return world._Publisher(buf), remote
+
+
+def fake_world():
+    # Just what _Publisher reads from a World, with one enemy.
+    player = entity.Player(3, entity.Type.Actor, 0, 0, 300, 1)
+    state = entity.GameState()
+    state.update_actor(entity.Avatar(9, entity.Type.Actor, 0, 0, 100, 2), 0.0)
+    return types.SimpleNamespace(entities=state, _player=player, game=simulation.Game(player, codec.FrameWriter(3, lambda data: None)))
+
+
+def publish(publisher, match, tick: int) -> None:
+    # The tick is written into the player's and the enemy's x too, so a torn snapshot would show.
+    match.game.clock.tick = tick
+    match._player.x = tick
+    next(iter(match.entities.actors.values())).x = tick
+    publisher.publish(match, 0.0)
+
+
+def drawn(remote) -> tuple:
+    return remote.header[3], remote.player()[0], [x for x, _, _, _ in remote.enemies()]
+
+
+class Racing:
+    # Stands in for world.PIN, and runs race() right after the pin is first written, or read.
+    def __init__(self, race, read: bool = False) -> None:
+        self.race, self.read = race, read
+
+    def _race(self) -> None:
+        race, self.race = self.race, None
+        if race:
+            race()
+
+    def unpack_from(self, buf, offset):
+        value = PIN.unpack_from(buf, offset)
+        if self.read:
+            self._race()
+        return value
+
+    def pack_into(self, buf, offset, value) -> None:
+        PIN.pack_into(buf, offset, value)
+        if not self.read:
+            self._race()
+
+
+def test_window_draws_from_the_pinned_buffer():
+    publisher, remote = shared()
+    match = fake_world()
+    publish(publisher, match, 1)
+    remote._acquire()
+    pinned = remote.pinned
+    assert drawn(remote) == (1, 1, [1])
+
+    # The worker keeps to the other buffer while one is pinned, however many ticks it publishes.
+    for tick in range(2, 6):
+        publish(publisher, match, tick)
+        assert drawn(remote) == (1, 1, [1])
+        assert publisher.last != pinned
+
+    remote._acquire()
+    assert remote.pinned != pinned
+    assert drawn(remote) == (5, 5, [5])
+    publish(publisher, match, 6) # Now the first buffer is free again.
+    assert publisher.last == pinned
+    assert remote.torn == 0
+
+
+def test_window_retries_a_torn_read(monkeypatch):
+    publisher, remote = shared()
+    match = fake_world()
+    publish(publisher, match, 1)
+    publish(publisher, match, 2)
+    newest = publisher.last
+
+    # The worker read the pin before the window pinned the newest buffer, and starts writing it.
+    def race():
+        seq = world.HEADER.unpack_from(remote.buf, world._buffer(newest))[0]
+        struct.pack_into('=Q', remote.buf, world._buffer(newest), seq + 1)
+    monkeypatch.setattr(world, 'PIN', Racing(race))
+    remote._acquire()
+    assert remote.torn == 1
+    assert remote.pinned == 1 - newest
+    assert drawn(remote) == (1, 1, [1])
+
+
+def test_worker_backs_off_a_buffer_pinned_while_it_starts(monkeypatch):
+    publisher, remote = shared()
+    match = fake_world()
+    publish(publisher, match, 1)
+    remote._acquire()
+    publish(publisher, match, 2)
+    newest = publisher.last
+
+    # The window pins the newest buffer after the worker read the pin, but before it checks it again.
+    monkeypatch.setattr(world, 'PIN', Racing(remote._acquire, read=True))
+    publish(publisher, match, 3)
+    assert remote.pinned == newest
+    assert publisher.last == 1 - newest
+    assert drawn(remote) == (2, 2, [2])
+
+    remote._acquire()
+    assert drawn(remote) == (3, 3, [3])
+    assert remote.torn == 0
+
+
+PARENT = '''
+import sys, json, time, argparse
+import world
+match = world.start(argparse.Namespace(**json.loads(sys.argv[1])))
+print('worker', match.process.pid if match else None, flush=True)
+time.sleep(60)
+'''
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGKILL'), reason='needs SIGKILL')
+def test_worker_quits_when_the_window_is_killed():
+    if world.shared_memory is None:
+        pytest.skip('shared memory needs Python 3.8 or newer')
+    options = dict(relay=None, transport='broadcast', match=0, port=PORT, interface='127.0.0.1', ttl=1, compact=False,
+                   send_rate=None, interest=False, interest_radius=300, interest_rates=[1, 2, 4], interpolate=False,
+                   receiver_thread=False, record=None, tick_rate=60)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parent = subprocess.Popen([sys.executable, '-c', PARENT, json.dumps(options)], cwd=root, stdout=subprocess.PIPE, text=True)
+    try:
+        line = ''
+        while not line.startswith('worker'): # pygame prints a line when it's imported.
+            line = parent.stdout.readline()
+            assert line, 'the window process quit'
+        worker = line.split()[1]
+        assert worker.isdigit(), 'the worker didn\'t start'
+
+        parent.kill()
+        # The worker has the window's stdout too, so it's only closed once the worker has quit as well.
+        output = parent.communicate(timeout=world.QUIT_TIMEOUT + 5)[0]
+    except subprocess.TimeoutExpired:
+        os.kill(int(worker), signal.SIGKILL)
+        pytest.fail('the worker kept running after the window was killed')
+    finally:
+        parent.kill()
+    assert 'bytes/s' in output # It printed its stats on the way out, so it quit rather than crashed.
@@ -0,0 +1,74 @@
+# text.py is a module used by LANSpace.py and telemetry.py
+# Its purpose is to stop text being loaded and rendered from scratch every frame. Loading a font reads
+# it from disk, and rendering text is slow, so doing both every frame spikes the frame time.
+#
+# Fonts are cached by (path, size), and rendered text by (text, size, colour, path). Both caches drop
+# the least recently used entry once they're full. Text that changes every frame (like a counter)
+# still works, it just pushes older entries out.
+#
+# Surfaces are shared, so they must never be drawn on.
+#
+#
+#
+# Public Interface:
+#   max_fonts                           Fonts kept loaded, set it before rendering to change it.
+#   max_surfaces                        Rendered text surfaces kept.
+#   font(size, path) -> Font            Returns the shared font.
+#   render(text, size, colour, path)    Returns the shared surface of the rendered text.
+#   stats() -> dict                     Returns the hits and misses of the text cache.
+#   clear()                             Empties both caches.
+
+import pygame
+from collections import OrderedDict
+
+
+FONT = 'assets/freesansbold.ttf'
+
+max_fonts = 8
+max_surfaces = 256
+
+_fonts = OrderedDict() # (path, size): Font
+_surfaces = OrderedDict() # (text, size, colour, path): Surface
+_hits = 0
+_misses = 0
+
+
+def font(size: int, path: str = FONT):
+    key = (path, size)
+    loaded = _fonts.get(key)
+    if loaded is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        loaded = _fonts[key] = pygame.font.Font(path, size)
+        while len(_fonts) > max_fonts:
+            _fonts.popitem(last=False)
+    else:
+        _fonts.move_to_end(key)
+    return loaded
+
+
+def render(text: str, size: int, colour: tuple, path: str = FONT):
+    global _hits, _misses
+
+    key = (text, size, tuple(colour), path)
+    surface = _surfaces.get(key)
+    if surface is None:
+        _misses += 1
+        surface = _surfaces[key] = font(size, path).render(text, True, colour)
+        while len(_surfaces) > max_surfaces:
+            _surfaces.popitem(last=False)
+    else:
+        _hits += 1
+        _surfaces.move_to_end(key)
+    return surface
+
+
+def stats() -> dict:
+    return {'hits': _hits, 'misses': _misses, 'fonts': len(_fonts), 'surfaces': len(_surfaces)}
+
+
+def clear() -> None:
+    global _hits, _misses
+    _fonts.clear()
+    _surfaces.clear()
+    _hits, _misses = 0, 0
@@ -0,0 +1,488 @@
+# world.py is a module used by LANSpace.py
+# Its purpose is to own everything the game knows about the match (the network, the game state from
+# network_reader and the main player's simulation) behind one interface the window draws from.
+#
+# A World runs it all in the window's process, like LANSpace always has. A RemoteWorld (see
+# LANSpace.py --multiprocess) runs a World in a worker process instead, so reading the network,
+# decoding, projectiles and collisions don't share the GIL with drawing. The window process only
+# sends the controls and draws what the worker publishes.
+#
+# The worker publishes a snapshot of the world every tick into shared memory, in a fixed layout:
+#   input       seq  dir_x dir_y mouse_x mouse_y  firing respawn quit    written by the window
+#   pin         which buffer the window is drawing from                 written by the window
+#   buffer 0/1  header, then MAX_ACTORS actors (x y rotation shiptype), then
+#               MAX_PROJECTILES projectiles (x y rotation dir_x dir_y), all float32
+#
+# Both sides use a seqlock: seq is odd while its block is being written, and changes on every write,
+# so a reader that sees an odd seq, or a different seq afterwards, knows what it read was torn.
+# There are two snapshot buffers. The window pins the newest one and draws straight out of the shared
+# memory, without copying it, and the worker always writes the buffer that isn't pinned.
+#
+# The worker is started as its own Python process running this file, rather than with
+# multiprocessing, since multiprocessing's spawn would run LANSpace.py again in the worker.
+# Its stdin is a pipe from the window that nothing is written to. When the window's process ends, however
+# it ends, the pipe is closed and the worker quits, rather than playing on as a ghost player.
+# If shared memory isn't available, or the worker doesn't publish in time, start() returns None and
+# LANSpace falls back to a World in its own process.
+#
+#
+#
+# Public Interface:
+#   World(options)                  The match, run in this process. options are LANSpace's arguments.
+#   RemoteWorld                     The match, run in a worker process. It has the same interface as World.
+#   start(options) -> RemoteWorld   Starts a worker process, returns None if it can't.
+#
+#   world.id                        The main player's ID.
+#   world.alive                     True if the main player is alive.
+#   world.update(controls, elapsed) Reads the network and runs the simulation, or gets the worker's latest snapshot.
+#   world.player() -> tuple         (x, y, rotation, shiptype) of the main player, between the last two ticks.
+#   world.enemies()                 (x, y, rotation, shiptype) of every enemy player.
+#   world.projectiles()             (x, y, rotation) of every projectile, between the last two ticks.
+#   world.entity_count              Enemies and projectiles in the world.
+#   world.stats() -> list           Stats to print when the game quits.
+#   world.close()                   Stops the network, and the worker.
+
+import sys, os, math, time, json, random, struct, argparse, subprocess, threading
+import network, entity, codec, simulation, interest, capture, GMath
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError: # Python 3.7 and older.
+    shared_memory = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+WIDTH, HEIGHT = 1080, 700
+
+
+class World:
+    def __init__(self, options) -> None:
+        # The transport must be set up before anything is sent or received, including find_id.
+        if options.relay:
+            network.configure('relay', port=options.port, interface=options.interface, host=options.relay)
+        else:
+            network.configure(options.transport, options.match, options.port, options.interface, options.ttl)
+
+        # Setting up player object
+        player = self._player = entity.Player(0, entity.Type.Actor, 0, random.randrange(0, WIDTH), random.randrange(0, HEIGHT), random.randint(1, 4))
+        player.find_id() # find_id must be called to give the player an available ID
+        player.rotation = 90
+
+        # Everything the player sends in a tick is packed into one frame, rather than a broadcast per entity.
+        self.frame_writer = codec.FrameWriter(player.id, network.BROADCAST, compact=options.compact)
+        actor_timeout = entity.COMPACT_ACTOR_TIMEOUT if options.compact else entity.ACTOR_TIMEOUT
+        send_ticks = 1 # The player position is sent every send_ticks ticks.
+        if options.send_rate:
+            send_ticks = max(1, round(options.tick_rate / options.send_rate))
+        # Interest management, see interest.py. Far away players are sent and read less often. The tiers
+        # count in send intervals, so with --send-rate every tier's ticks are ticks the player sends in.
+        self.interest_manager = None
+        if options.interest:
+            radius = options.interest_radius
+            distances = (radius, radius * 2, math.inf)
+            self.interest_manager = interest.Interest(tuple((distance, rate * send_ticks) for distance, rate in zip(distances, options.interest_rates)))
+        slowest_send = self.interest_manager.tiers[-1][1] if self.interest_manager else send_ticks
+        actor_timeout = max(actor_timeout, slowest_send / options.tick_rate * 2.5) # Enemy players must survive a lost packet or two.
+        interp_delay = entity.INTERP_DELAY if options.interpolate else 0.0
+
+        # The receiver is started after find_id, since only one of them can read the network at a time.
+        self.receiver = None
+        if options.receiver_thread:
+            self.receiver = network.Receiver(entity.packet_key)
+            self.receiver.start()
+
+        # Records what the network sends us, so the match can be replayed offline, see capture.py
+        self.recorder = capture.Recorder(options.record, player.id) if options.record else None
+
+        self.reader = entity.network_reader(player.id, receiver=self.receiver, actor_timeout=actor_timeout, interp_delay=interp_delay,
+                                            interest=self.interest_manager, recorder=self.recorder)
+        self.entities = None
+        self.game = simulation.Game(player, self.frame_writer, options.tick_rate, send_ticks, self.interest_manager, WIDTH, HEIGHT,
+                                    relay=bool(options.relay))
+
+
+    @property
+    def id(self) -> int:
+        return self._player.id
+
+
+    @property
+    def alive(self) -> bool:
+        return self.game.alive
+
+
+    @property
+    def entity_count(self) -> int:
+        return len(self.entities) if self.entities is not None else 0
+
+
+    def update(self, controls: simulation.Controls, elapsed: float) -> None:
+        self.entities = next(self.reader)
+        self.game.update(self.entities, controls, elapsed)
+
+
+    def player(self) -> tuple:
+        # Things the simulation moves are drawn between the last two ticks, alpha of the way from the one before.
+        game, player = self.game, self._player
+        alpha = game.clock.alpha
+        return GMath.lerp(game.previous_x, player.x, alpha), GMath.lerp(game.previous_y, player.y, alpha), player.rotation, player.shiptype
+
+
+    def enemies(self):
+        return ((enemy.x, enemy.y, enemy.rotation, enemy.shiptype) for enemy in self.entities.actors.values())
+
+
+    def projectiles(self) -> list:
+        game = self.game
+        return self.entities.projectiles.positions(-(1 - game.clock.alpha) * game.projs_speed * game.dt)
+
+
+    def stats(self) -> list:
+        stats = []
+        if self.receiver: stats.append(self.receiver.stats())
+        if self.interest_manager: stats.append(self.interest_manager.stats())
+        stats.append(network.transport().stats())
+        stats.append('Sent {:.0f} bytes/s'.format(self.frame_writer.bandwidth()))
+        return stats
+
+
+    def close(self) -> None:
+        if self.recorder: self.recorder.close()
+        if self.receiver: self.receiver.stop()
+
+
+# Shared memory layout ---------------------------------------------------------------------------------------------------------------------
+
+MAX_ACTORS = 1024
+MAX_PROJECTILES = 8192 # A snapshot only has room for this many, any more aren't drawn.
+
+INPUT = struct.Struct('=QffffBBB') # seq dir_x dir_y mouse_x mouse_y firing respawn quit
+PIN = struct.Struct('=B')
+# seq, published (perf_counter), alpha when published, tick, x, y, previous x, previous y, rotation,
+# alive, shiptype, id, actors, projectiles, the worker's CPU time (process_time)
+HEADER = struct.Struct('=QddQfffffBBHIId')
+ACTOR = struct.Struct('=ffff')
+PROJECTILE = struct.Struct('=fffff')
+
+PIN_OFFSET = 64
+BUFFERS_OFFSET = 128
+ACTORS_OFFSET = 128 # From the start of a buffer, after the header.
+PROJECTILES_OFFSET = ACTORS_OFFSET + MAX_ACTORS * ACTOR.size
+BUFFER_SIZE = PROJECTILES_OFFSET + MAX_PROJECTILES * PROJECTILE.size
+SIZE = BUFFERS_OFFSET + 2 * BUFFER_SIZE
+NO_PIN = 255
+
+START_TIMEOUT = 10.0 # Seconds the worker has to join the match and publish its first snapshot.
+QUIT_TIMEOUT = 2.0
+
+
+def _buffer(i: int) -> int:
+    return BUFFERS_OFFSET + i * BUFFER_SIZE
+
+
+# Shared memory layout ---------------------------------------------------------------------------------------------------------------------
+
+
+class RemoteWorld:
+    def __init__(self, shm, process, options) -> None:
+        self.shm = shm
+        self.buf = shm.buf
+        self.process = process
+        self.dt = 1 / options.tick_rate
+        self.projs_speed = simulation.Game.projs_speed
+
+        self.input_seq = 0
+        self.pinned = None # Index of the pinned buffer.
+        self.pinned_seq = 0
+        self.header = None # The pinned buffer's header.
+
+        self.snapshots = 0
+        self.torn = 0 # Snapshots that changed while they were being read, and had to be read again or skipped.
+        self.latencies = [] # Seconds from the worker publishing a snapshot to the window first reading it.
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        self.worker_cpu_start = None
+
+
+    @property
+    def id(self) -> int:
+        return self.header[11] if self.header else 0
+
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.header[9]) if self.header else True
+
+
+    @property
+    def entity_count(self) -> int:
+        return self.header[12] + self.header[13] if self.header else 0
+
+
+    def running(self) -> bool:
+        return self.process.poll() is None
+
+
+    def send(self, controls: simulation.Controls, quit: bool = False) -> None:
+        # send writes the controls for the worker to read next tick.
+        self.input_seq += 1
+        INPUT.pack_into(self.buf, 0, self.input_seq * 2 - 1, 0, 0, 0, 0, 0, 0, 0) # Odd, being written.
+        INPUT.pack_into(self.buf, 0, self.input_seq * 2, controls.dir_x, controls.dir_y, controls.mouse_x, controls.mouse_y,
+                        controls.firing, controls.respawn, quit)
+
+
+    def update(self, controls: simulation.Controls, elapsed: float) -> None:
+        self.send(controls)
+        self._acquire()
+
+
+    def _acquire(self) -> None:
+        # _acquire pins the newest finished snapshot. The previous one is checked first, since it was
+        # drawn from after reading it, a change means the frame drawn from it was torn.
+        buf = self.buf
+        if self.pinned is not None and HEADER.unpack_from(buf, _buffer(self.pinned))[0] != self.pinned_seq:
+            self.torn += 1
+
+        for attempt in range(4):
+            headers = [HEADER.unpack_from(buf, _buffer(i)) for i in (0, 1)]
+            finished = [i for i in (0, 1) if headers[i][0] % 2 == 0 and headers[i][0] != 0]
+            if not finished:
+                return # Nothing published yet, keeps what's pinned.
+            newest = max(finished, key=lambda i: headers[i][3])
+
+            # Pins it, then checks the worker didn't start writing it before seeing the pin.
+            PIN.pack_into(buf, PIN_OFFSET, newest)
+            header = HEADER.unpack_from(buf, _buffer(newest))
+            if header[0] == headers[newest][0]:
+                break
+            self.torn += 1
+        else:
+            return
+
+        if self.header is None or header[3] != self.header[3]: # A new tick.
+            self.snapshots += 1
+            self.latencies.append(time.perf_counter() - header[1])
+            if self.worker_cpu_start is None:
+                self.worker_cpu_start = (header[14], time.perf_counter())
+        self.pinned, self.pinned_seq, self.header = newest, header[0], header
+
+
+    def _alpha(self) -> float:
+        # How far the window is between the snapshot's tick and the next, carrying on from when it was published.
+        _, published, alpha = self.header[:3]
+        return min(1.0, alpha + (time.perf_counter() - published) / self.dt)
+
+
+    def player(self) -> tuple:
+        header = self.header
+        if header is None:
+            return 0.0, 0.0, 0.0, 1
+        alpha = self._alpha()
+        x, y, previous_x, previous_y, rotation = header[4:9]
+        return GMath.lerp(previous_x, x, alpha), GMath.lerp(previous_y, y, alpha), rotation, header[10]
+
+
+    def enemies(self):
+        # Read straight out of the shared memory, the memoryview slice doesn't copy it.
+        if self.header is None:
+            return ()
+        start = _buffer(self.pinned) + ACTORS_OFFSET
+        return ((x, y, rotation, int(shiptype)) for x, y, rotation, shiptype in
+                ACTOR.iter_unpack(self.buf[start:start + self.header[12] * ACTOR.size]))
+
+
+    def projectiles(self):
+        if self.header is None:
+            return ()
+        offset = -(1 - self._alpha()) * self.projs_speed * self.dt
+        start = _buffer(self.pinned) + PROJECTILES_OFFSET
+        return ((x + dir_x * offset, y + dir_y * offset, rotation) for x, y, rotation, dir_x, dir_y in
+                PROJECTILE.iter_unpack(self.buf[start:start + self.header[13] * PROJECTILE.size]))
+
+
+    def stats(self) -> list:
+        wall = time.perf_counter()
+        stats = {'render process cpu': '{:.0%}'.format((time.process_time() - self.cpu_start) / (wall - self.wall_start))}
+        if self.header is not None and self.worker_cpu_start is not None:
+            cpu, since = self.worker_cpu_start
+            stats['worker process cpu'] = '{:.0%}'.format((self.header[14] - cpu) / max(1e-9, wall - since))
+        latencies = sorted(self.latencies)
+        if latencies:
+            stats['snapshot latency mean'] = '{:.2f}ms'.format(sum(latencies) / len(latencies) * 1000)
+            stats['snapshot latency p95'] = '{:.2f}ms'.format(latencies[int(0.95 * (len(latencies) - 1))] * 1000)
+        stats['snapshots'] = self.snapshots
+        stats['torn reads'] = self.torn
+        return [stats]
+
+
+    def close(self) -> None:
+        # Asks the worker to quit, it prints its own stats and closes the network.
+        self.header = None # Nothing must read the shared memory after it's closed.
+        try:
+            self.send(simulation.Controls(0, 0, 0, 0, False, False), quit=True)
+            self.process.stdin.close()
+            self.process.wait(QUIT_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        finally:
+            self.buf.release()
+            self.shm.close()
+            self.shm.unlink()
+
+
+def start(options):
+    # start returns a RemoteWorld once the worker has joined the match, or None to run in this process.
+    if shared_memory is None:
+        print('Shared memory needs Python 3.8 or newer, running in one process.')
+        return None
+
+    shm = shared_memory.SharedMemory(create=True, size=SIZE)
+    PIN.pack_into(shm.buf, PIN_OFFSET, NO_PIN) # New shared memory is all zeros, so nothing's been published.
+
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), shm.name, json.dumps(vars(options))], stdin=subprocess.PIPE)
+    world = RemoteWorld(shm, process, options)
+
+    deadline = time.perf_counter() + START_TIMEOUT
+    while world.header is None:
+        if not world.running() or time.perf_counter() > deadline:
+            print('The worker process didn\'t start, running in one process.')
+            world.close()
+            return None
+        world.update(simulation.Controls(0, 0, 0, 0, False, False), 0.0)
+        time.sleep(0.005)
+    return world
+
+
+# Worker process -----------------------------------------------------------------------------------------------------------------------------
+
+
+class _Publisher:
+    def __init__(self, buf) -> None:
+        self.buf = buf
+        self.seqs = [0, 0]
+        self.last = 1
+        self.projectile_arrays = None
+        if numpy is not None:
+            self.projectile_arrays = [numpy.ndarray((MAX_PROJECTILES, 5), numpy.float32, buf, _buffer(i) + PROJECTILES_OFFSET) for i in (0, 1)]
+
+
+    def publish(self, world: World, published: float) -> None:
+        buf = self.buf
+
+        # Writes the buffer that isn't pinned. It's marked as being written, then the pin is checked
+        # again, in case the window pinned it in between.
+        pin = PIN.unpack_from(buf, PIN_OFFSET)[0]
+        i = 1 - pin if pin in (0, 1) else 1 - self.last
+        base = _buffer(i)
+        self.seqs[i] += 1
+        struct.pack_into('=Q', buf, base, self.seqs[i] * 2 - 1) # Odd, being written.
+        if PIN.unpack_from(buf, PIN_OFFSET)[0] == i:
+            struct.pack_into('=Q', buf, base, self.seqs[i] * 2 - 2) # Back to how it was, the window is reading it.
+            self.seqs[i] -= 1
+            i = 1 - i
+            base = _buffer(i)
+            self.seqs[i] += 1
+            struct.pack_into('=Q', buf, base, self.seqs[i] * 2 - 1)
+
+        actors = world.entities.actors
+        actor_count = min(len(actors), MAX_ACTORS)
+        offset = base + ACTORS_OFFSET
+        for enemy, _ in zip(actors.values(), range(actor_count)):
+            ACTOR.pack_into(buf, offset, enemy.x, enemy.y, enemy.rotation, enemy.shiptype)
+            offset += ACTOR.size
+
+        pool = world.entities.projectiles
+        projectile_count = min(len(pool), MAX_PROJECTILES)
+        n = projectile_count
+        if self.projectile_arrays is not None and pool.numpy:
+            array = self.projectile_arrays[i]
+            array[:n, 0] = pool.x[:n]
+            array[:n, 1] = pool.y[:n]
+            array[:n, 2] = pool.rotation[:n]
+            array[:n, 3] = pool.dir_x[:n]
+            array[:n, 4] = pool.dir_y[:n]
+        else:
+            offset = base + PROJECTILES_OFFSET
+            for j in range(n):
+                PROJECTILE.pack_into(buf, offset, pool.x[j], pool.y[j], pool.rotation[j], pool.dir_x[j], pool.dir_y[j])
+                offset += PROJECTILE.size
+
+        game, player = world.game, world._player
+        HEADER.pack_into(buf, base, self.seqs[i] * 2, published, game.clock.alpha, game.clock.tick, player.x, player.y,
+                         game.previous_x, game.previous_y, player.rotation, game.alive, player.shiptype, player.id,
+                         actor_count, projectile_count, time.process_time())
+        self.last = i
+
+
+def _read_input(buf) -> tuple:
+    # _read_input returns the window's latest (Controls, quit), or None if it was being written.
+    seq, dir_x, dir_y, mouse_x, mouse_y, firing, respawn, quit = INPUT.unpack_from(buf, 0)
+    if seq % 2 or INPUT.unpack_from(buf, 0)[0] != seq:
+        return None
+    return simulation.Controls(dir_x, dir_y, mouse_x, mouse_y, bool(firing), bool(respawn)), bool(quit)
+
+
+def _watch(stream, closed: threading.Event) -> None:
+    # _watch sets closed once stream ends, the window never writes to the worker's stdin so it only
+    # ends when the window closes it or its process ends.
+    while stream.read(4096):
+        pass
+    closed.set()
+
+
+def _attach(name: str):
+    # Only the window process unlinks the shared memory. Before Python 3.13 attaching to it also
+    # registers it with this process's resource tracker, which would unlink it when the worker quits.
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def main() -> None:
+    name, options = sys.argv[1], argparse.Namespace(**json.loads(sys.argv[2]))
+    window_gone = threading.Event()
+    threading.Thread(target=_watch, args=(sys.stdin.buffer, window_gone), name='world._watch', daemon=True).start()
+    shm = _attach(name)
+    buf = shm.buf
+    try:
+        world = World(options)
+        publisher = _Publisher(buf)
+        controls = simulation.Controls(0, 0, 0, 0, False, False)
+        dt = world.game.dt
+
+        last_tick = time.perf_counter()
+        while True:
+            latest = _read_input(buf)
+            if latest is not None:
+                controls, quit = latest
+                if quit:
+                    break
+            if window_gone.is_set():
+                break # The window process was killed without asking us to quit, we'd be a ghost player.
+
+            now = time.perf_counter()
+            elapsed, last_tick = now - last_tick, now
+            world.update(controls, elapsed)
+            publisher.publish(world, time.perf_counter())
+
+            # Sleeps until the next tick is due, the window process draws in between.
+            time.sleep(max(0.0, dt - world.game.clock.accumulator - (time.perf_counter() - now)))
+
+        for stats in world.stats():
+            print(stats)
+        world.close()
+    finally:
+        publisher = None
+        buf.release()
+        shm.close()
+
+
+if __name__ == '__main__':
+    main()